@@ -1,38 +1,37 @@
+import time
 import streamlit as st
 import pandas as pd
-import re
-import unicodedata
 from io import BytesIO
-from rapidfuzz import fuzz
 import warnings
 
+from husky.accounts import (DEDUP_CUTOFF, GROUP_CUTOFF, GROUPING_MODES, INCREMENTAL_CAVEAT, SCORE_FLOOR, cleanup_accounts, incremental_cleanup,
+                            incremental_problem, load_state, save_state, score_accounts, state_from_full_run,
+                            state_matches)
+from husky.disk_cache import content_hash, make_key
+from husky.dtypes import compact_frame, memory_report, memory_usage
+from husky.jobs import render_jobs, submit, track_job
+from husky.result_cache import code_version
+from husky.rules import get_ruleset
+from husky.session_memory import SessionMemory
+from husky.text import TEXT_ENGINES, clean_column
+
 warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
 
 st.set_page_config(page_title="🧼 CRM Account Cleanup", layout="wide")
 st.title("🔍 CRM Account Cleanup & Deduplication Tool")
 
-# === Cleaning Functions ===
-def clean_name(name):
-    if pd.isna(name):
-        return ""
-    name = unicodedata.normalize("NFKD", str(name))
-    name = name.encode("ascii", "ignore").decode("utf-8")
-    name = name.lower()
-    name = re.sub(r'[^\w\s]', '', name)
-    name = re.sub(r'\b(inc|llc|ltd|co|corporation|company|limited|group|plc|gmbh|sa|bv|global|sarl|sro|kg|ltda|s de rl|operations|applied to life|automotive)\b', '', name)
-    name = re.sub(r'\s+', ' ', name).strip()
-    return name
-
-def classify_sou(sou):
-    if pd.isna(sou): return "OTHER"
-    sou = sou.lower()
-    if "hot runners" in sou or "hrc" in sou:
-        return "HOT RUNNERS"
-    elif "beverage" in sou or "packaging" in sou:
-        return "PACKAGING"
-    elif "msp" in sou or "csm" in sou:
-        return "OTHER PACKAGING"
-    return "OTHER"
+# Scores and outputs are kept per session within a memory budget (husky/session_memory.py)
+memory = SessionMemory(st.session_state)
+st.sidebar.caption(memory.report())
+
+
+# === Background jobs (husky/jobs.py) ===
+@st.fragment(run_every="3s")
+def show_jobs():
+    render_jobs(st, "accounts", "cleaned_accounts")
+
+
+show_jobs()
 
 def detect_header_row(file, sheet_name, required_cols):
     for i in range(10):
@@ -59,101 +58,146 @@ if uploaded_file:
         st.stop()
 
     full_df = pd.read_excel(uploaded_file, sheet_name=sheet_name, header=header_row)
+    mem_before = memory_usage(full_df)
+    full_df = compact_frame(full_df)
+    st.caption(memory_report(mem_before, memory_usage(full_df)))
     total_rows = len(full_df)
 
     # Select row range
     st.subheader("📊 Row Range Selection")
     start_row = st.number_input("Start row (0-based):", min_value=0, max_value=total_rows - 1, value=0)
     end_row = st.number_input("End row (exclusive):", min_value=start_row + 1, max_value=total_rows, value=min(start_row + 5000, total_rows))
+    engine = st.selectbox("⚙️ Name cleaning engine:", TEXT_ENGINES, help="Both engines give identical results; 'arrow' runs whole-column kernels.")
+
+    # Pair scores are computed once per file / sheet / row range and kept in the
+    # session; moving a cutoff slider only re-applies it to the stored scores.
+    st.subheader("🎚️ Similarity cutoffs")
+    group_cutoff = st.slider("Group names scoring above (step 3):", SCORE_FLOOR, 99, GROUP_CUTOFF)
+    dedup_cutoff = st.slider("Treat as duplicates above (step 4, same Country):", SCORE_FLOOR, 99, DEDUP_CUTOFF)
+    grouping = st.selectbox("🧩 Account grouping (step 3):", GROUPING_MODES,
+                            help="'first row': each ungrouped row takes the later rows matching it (depends on row "
+                                 "order). 'connected components': rows linked by any chain of matches form one group, "
+                                 "named after its most frequent Customer (or most frequent) name; only names sharing "
+                                 "a first word, sound-alike word or sorted prefix within their SOU Category are "
+                                 "compared, which is much faster on large files.")
+
+    # Incremental mode: only accounts that are new or whose row checksum changed
+    # since the last run saved under the same name are cleaned and matched again
+    incremental = st.checkbox("♻️ Incremental mode", help="Reuses the last run saved under this name; accounts are "
+                              "matched by '(Do Not Modify) Account' and '(Do Not Modify) Row Checksum'. "
+                              + INCREMENTAL_CAVEAT)
+    state_name = sheet_name
+    if incremental:
+        state_name = st.text_input("Saved run name:", value=sheet_name)
+        problem = incremental_problem(full_df)
+        if problem:
+            st.warning(f"⚠️ Incremental mode unavailable: {problem}. Running a full cleanup.")
+            incremental = False
+    run_key = (content_hash(uploaded_file.getvalue()), sheet_name, header_row, start_row, end_row, incremental)
+
+    # A full cleanup can run as a background job that survives a refresh or a closed tab
+    background = not incremental and st.checkbox(
+        "🕒 Run in background", help="The cleanup continues if the page is refreshed; its output stays downloadable "
+                                    "from the job list above.")
+    if background:
+        if st.button("🔄 Run Cleanup"):
+            job_id = submit("accounts", "husky.accounts:cleanup_job", {
+                "df": full_df.iloc[start_row:end_row].reset_index(drop=True),
+                "group_cutoff": group_cutoff, "dedup_cutoff": dedup_cutoff, "grouping": grouping, "engine": engine,
+                "checkpoint_key": make_key(code_version(__file__), run_key),
+            }, label=f"{uploaded_file.name} / {sheet_name}: rows {start_row}-{end_row}")
+            track_job(st, job_id)
+            st.success(f"✅ Job `{job_id}` queued — progress is shown in the job list above.")
+        st.stop()
 
     if st.button("🔄 Run Cleanup"):
         df = full_df.iloc[start_row:end_row].reset_index(drop=True)
+        state = load_state(state_name) if incremental else None
+
+        if state_matches(state, group_cutoff, dedup_cutoff, grouping):
+            # Steps 1-6 for new / changed accounts only (husky/accounts.py)
+            t0 = time.perf_counter()
+            final_df, rows, clusters, stats = incremental_cleanup(df, state, engine)
+            save_state(state_name, rows, clusters, group_cutoff, dedup_cutoff, grouping)
+            st.caption(
+                f"♻️ Incremental run in {time.perf_counter() - t0:.2f}s — {stats['reused']:,} accounts reused, "
+                f"{stats['new']:,} new, {stats['changed']:,} changed ({stats['re-matched']:,} re-matched), "
+                f"{stats['removed']:,} removed since the last run"
+            )
+            if stats["new"] or stats["changed"] or stats["removed"]:
+                st.info(f"ℹ️ {INCREMENTAL_CAVEAT}")
+            memory["account_scores"] = {"key": run_key, "df": df, "final_df": final_df,
+                                        "cutoffs": (group_cutoff, dedup_cutoff, grouping)}
+        else:
+            if incremental:
+                st.caption(f"♻️ No saved run '{state_name}' with cutoffs {group_cutoff} / {dedup_cutoff} and "
+                           f"'{grouping}' grouping yet — running a full cleanup.")
+
+            # Step 1: Clean names
+            t0 = time.perf_counter()
+            df['Cleaned Name'] = clean_column(df['Account Name'], "account", engine)
+            st.caption(f"🧽 Cleaned {len(df):,} names in {time.perf_counter() - t0:.2f}s ({engine} engine)")
+
+            # Step 2: SOU category (rule table "sou_category" in husky/rules.json)
+            df['SOU Category'] = get_ruleset("sou_category").apply(df)
+
+            # Pair scores for steps 3 (same SOU Category) and 4 (same Country); progress is checkpointed
+            # to disk, so rerunning the same file and rows after an interruption resumes (husky/checkpoint.py)
+            t0 = time.perf_counter()
+            progress = st.progress(0.0, text="Scoring pairs...")
+            resumed = [0]
+
+            def show_progress(done, total, resumed_blocks):
+                resumed[0] = resumed_blocks
+                progress.progress(done / total, text=f"{done:,}/{total:,} blocks scored")
+
+            sou_pairs, country_pairs = score_accounts(df, checkpoint_key=make_key(code_version(__file__), run_key),
+                                                      on_progress=show_progress, grouping=grouping)
+            progress.empty()
+            if resumed[0]:
+                st.caption(f"♻️ Resumed from a checkpoint: {resumed[0]:,} blocks were already scored")
+            st.caption(f"📐 Scored {len(sou_pairs) + len(country_pairs):,} similar pairs (≥ {SCORE_FLOOR}) in {time.perf_counter() - t0:.2f}s")
+            memory["account_scores"] = {"key": run_key, "df": df, "pairs": (sou_pairs, country_pairs),
+                                        "grouping": grouping}
+            if incremental:
+                rows, clusters = state_from_full_run(df, sou_pairs, country_pairs, group_cutoff, dedup_cutoff, grouping)
+                save_state(state_name, rows, clusters, group_cutoff, dedup_cutoff, grouping)
+
+    scored = memory.get("account_scores")
+    if scored is not None and scored["key"] == run_key:
+        df = scored["df"]
+
+        # Steps 3-6: group, deduplicate, reorder, drop system columns (husky/accounts.py)
+        t0 = time.perf_counter()
+        if "final_df" in scored:
+            # Incremental runs are tied to the cutoffs and grouping of the saved run
+            if scored["cutoffs"] != (group_cutoff, dedup_cutoff, grouping):
+                st.info("🎚️ Cutoffs or grouping changed since the incremental run — click 'Run Cleanup' again.")
+                st.stop()
+            final_df = scored["final_df"]
+        else:
+            # The step 3 pairs were scored for the grouping's blocks (husky/accounts.py: group_blocks)
+            if scored["grouping"] != grouping:
+                st.info("🧩 Grouping changed since the pairs were scored — click 'Run Cleanup' again.")
+                st.stop()
+            final_df = cleanup_accounts(df, *scored["pairs"], group_cutoff=group_cutoff, dedup_cutoff=dedup_cutoff,
+                                        grouping=grouping)
+        st.caption(
+            f"🎚️ Cutoffs {group_cutoff} / {dedup_cutoff} applied in {time.perf_counter() - t0:.2f}s — "
+            f"{final_df['Account Group Name Cleaned'].nunique():,} groups, {len(df) - len(final_df):,} duplicates removed"
+        )
+        st.dataframe(final_df.head(50), use_container_width=True)
 
-        # Step 1: Clean names
-        df['Cleaned Name'] = df['Account Name'].apply(clean_name)
-
-        # Step 2: SOU category
-        df['SOU Category'] = df['SOU'].apply(classify_sou)
-
-        # Step 3: Group names by fuzzy match
-        group_names = [''] * len(df)
-        assigned = set()
-
-        for i in range(len(df)):
-            if i in assigned:
-                continue
-            base_name = df.loc[i, 'Cleaned Name']
-            base_sou = df.loc[i, 'SOU Category']
-            base_prefix = " ".join(base_name.split()[:2])
-            group_names[i] = base_prefix
-            assigned.add(i)
-
-            for j in range(i + 1, len(df)):
-                if j in assigned:
-                    continue
-                if df.loc[j, 'SOU Category'] != base_sou:
-                    continue
-                score = fuzz.token_set_ratio(base_name, df.loc[j, 'Cleaned Name'])
-                if score > 85:
-                    group_names[j] = base_prefix
-                    assigned.add(j)
-
-        df['Account Group Name Cleaned'] = group_names
-
-        # Step 4: Deduplicate by Cleaned Name + Country
-        deduped = []
-        skip = set()
-
-        for i in range(len(df)):
-            if i in skip:
-                continue
-            current = df.iloc[i]
-            current_name = current['Cleaned Name']
-            current_country = current['Country']
-            similar = [i]
-
-            for j in range(i + 1, len(df)):
-                if df.iloc[j]['Country'] != current_country:
-                    continue
-                score = fuzz.token_set_ratio(current_name, df.iloc[j]['Cleaned Name'])
-                if score > 90:
-                    similar.append(j)
-                    skip.add(j)
-
-            group = df.iloc[similar]
-            customers = group[group['Business Type'] == 'Customer']
-            best = customers.iloc[0] if not customers.empty else group.iloc[0]
-            deduped.append(best)
-
-        final_df = pd.DataFrame(deduped)
-
-        # Step 5: Reorder columns
-        preferred_start = [
-            'Account Name',
-            'Account Group Name Cleaned',
-            'Business Type',
-            'Country',
-            'SOU Category',
-            'SOU',
-            'Owner'
-        ]
-        front = [col for col in preferred_start if col in final_df.columns]
-        others = [col for col in final_df.columns if col not in front]
-        final_df = final_df[front + others]
-
-        # Step 6: Drop unwanted system columns
-        cols_to_drop = ['(Do Not Modify) Account', '(Do Not Modify) Row Checksum']
-        final_df = final_df.drop(columns=[col for col in cols_to_drop if col in final_df.columns])
-
-        # Step 7: Export cleaned Excel
-        output = BytesIO()
-        final_df.to_excel(output, index=False, engine='openpyxl')
-        output.seek(0)
+        # Step 7: Export cleaned Excel (built when the download is clicked)
+        def export():
+            output = BytesIO()
+            final_df.to_excel(output, index=False, engine='openpyxl')
+            return output.getvalue()
 
         st.success(f"✅ Cleanup complete! Processed {len(df)} rows → deduplicated to {len(final_df)} rows.")
         st.download_button(
             label="⬇️ Download Cleaned Excel",
-            data=output.getvalue(),
+            data=memory.download("cleaned_accounts.xlsx", (run_key, group_cutoff, dedup_cutoff, grouping), export),
             file_name="cleaned_accounts.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
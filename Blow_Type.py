@@ -10,22 +10,25 @@
 # Output column is inserted immediately after "Product Description".
 
 import io
+import time
 import pandas as pd
 import streamlit as st
 
-LINEAR_BLOWER_SUPPLIER_KEYWORDS = {
-    "1BLOW", "CHUMPOWER", "SIAPI", "SIDE INDIA"  # add more keywords if needed
-}
-
-SINGLE_STAGE_SUPPLIER_KEYWORDS = {
-    "AOKI", "NISSEI", "ASB"   # as requested
-}
-
-NEW_COL = "Product Type Focus (Single Stage/ Linear Blower)"
+from husky.batch import OUTPUT_MODES, results_workbook, run_sheets, summary
+from husky.blow_type import REQUIRED_COLUMNS, classify_blow_type
+from husky.disk_cache import content_hash
+from husky.dtypes import compact_frame, memory_report, memory_usage
+from husky.session_memory import SessionMemory
+from husky.stages import frame_fingerprint
+from husky.upload_cache import cache_caption, load_sheet
 
 st.set_page_config(page_title="Product Type Classifier", page_icon="🧪", layout="wide")
 st.title("🧪 Product Type Classifier")
 
+# Results and outputs are kept per session within a memory budget (husky/session_memory.py)
+memory = SessionMemory(st.session_state)
+st.sidebar.caption(memory.report())
+
 st.markdown(
     "Upload a XLSX with **Supplier Cleaned Final** and **Product Description**. "
     "The app adds **Product Type Focus (Single Stage/ Linear Blower)** based on your rules."
@@ -43,45 +46,48 @@ def pick_sheet_uploader(label: str):
         else:
             xf = pd.ExcelFile(f)
             sheet = st.selectbox(f"Select sheet for **{f.name}**", xf.sheet_names, key=f"sheet_{f.name}")
-            df = xf.parse(sheet_name=sheet)
-            info = f"Loaded Excel: **{f.name}** — Sheet: **{sheet}**"
+            df, cache_status = load_sheet(f, sheet)
+            info = f"Loaded Excel: **{f.name}** — {cache_caption(cache_status, sheet)}"
     return df, info
 
-def classify_row(supplier, description) -> str:
-    # safe normalize
-    s = str(supplier).upper() if pd.notna(supplier) else ""
-    d = str(description).upper() if pd.notna(description) else ""
-
-    # SIPA special rule first
-    if "SIPA" in s:
-        if ("LINEA" in d) or ("XTRA" in d) or ("SFL" in d):
-            return "Linear Blower"
-        if "ECS" in d:
-            return "Single Stage"
-        # if SIPA but no keyword, fall through to generic contains checks
-
-    # Contains-match for Single Stage (AOKI/NISSEI/ASB)
-    if any(k in s for k in SINGLE_STAGE_SUPPLIER_KEYWORDS):
-        return "Single Stage"
-
-    # Contains-match for Linear Blower
-    if any(k in s for k in LINEAR_BLOWER_SUPPLIER_KEYWORDS):
-        return "Linear Blower"
-
-    # No decision
-    return ""
-
+# All sheets / all files: each sheet gets its own header detection in a worker (husky/batch.py)
+if st.checkbox("📚 Process all sheets / all uploaded files"):
+    files = st.file_uploader("Upload file(s) (XLSX)", type=["xlsx"], accept_multiple_files=True)
+    if files:
+        output_mode = st.radio("Output", OUTPUT_MODES, horizontal=True)
+        batch_key = tuple(content_hash(f.getvalue()) for f in files)
+        if st.button("Classify all sheets"):
+            progress = st.progress(0.0, text="Starting workers...")
+            t0 = time.perf_counter()
+            results = run_sheets(
+                files, "husky.blow_type:classify_blow_type", REQUIRED_COLUMNS,
+                on_done=lambda r, done, total: progress.progress(done / total, text=f"{done}/{total} sheets — {r['file']} / {r['sheet']}"),
+            )
+            memory["blow_type_batch"] = {"key": batch_key, "results": results, "seconds": time.perf_counter() - t0}
 
-def insert_next_to(df: pd.DataFrame, after_col: str, new_col: str, values) -> pd.DataFrame:
-    out = df.copy()
-    pos = out.columns.get_loc(after_col) + 1
-    out.insert(pos, new_col, values)
-    return out
+        batch = memory.get("blow_type_batch")
+        if batch is not None and batch["key"] == batch_key:
+            st.success(f"Done! {len(batch['results'])} sheets in {batch['seconds']:.2f}s.")
+            st.dataframe(summary(batch["results"]), use_container_width=True, hide_index=True)
+            st.download_button(
+                "⬇️ Download Excel",
+                data=memory.download("product_type_classified.xlsx", (batch_key, output_mode),
+                                     lambda: results_workbook(batch["results"], output_mode, merged_name="Classified")),
+                file_name="product_type_classified.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                use_container_width=True
+            )
+    else:
+        st.info("Upload files to begin.")
+    st.stop()
 
 df, info = pick_sheet_uploader("Upload file (CSV/XLSX)")
 if df is not None:
     st.caption(info)
-    missing = [c for c in ["Supplier Cleaned Final", "Product Description"] if c not in df.columns]
+    mem_before = memory_usage(df)
+    df = compact_frame(df)
+    st.caption(memory_report(mem_before, memory_usage(df)))
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
     if missing:
         st.error(f"Missing required column(s): {', '.join(missing)}")
     else:
@@ -90,23 +96,24 @@ if df is not None:
 
         if st.button("Classify"):
             with st.spinner("Classifying..."):
-                vals = [classify_row(r["Supplier Cleaned Final"], r["Product Description"]) for _, r in df.iterrows()]
-                result = insert_next_to(df, "Product Description", NEW_COL, vals)
+                result = classify_blow_type(df)
 
             st.success("Done! Column added next to Product Description.")
             st.dataframe(result.head(50), use_container_width=True)
 
-            # Download as Excel
-            with io.BytesIO() as buf:
-                with pd.ExcelWriter(buf, engine="openpyxl") as writer:
-                    result.to_excel(writer, index=False, sheet_name="Classified")
-                data = buf.getvalue()
+            # Download as Excel (built on click; no rerun, so the result stays on the page)
+            def export():
+                with io.BytesIO() as buf:
+                    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+                        result.to_excel(writer, index=False, sheet_name="Classified")
+                    return buf.getvalue()
 
             st.download_button(
                 "⬇️ Download Excel",
-                data=data,
+                data=memory.download("product_type_classified.xlsx", frame_fingerprint(result), export),
                 file_name="product_type_classified.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                on_click="ignore",
                 use_container_width=True
             )
 else:
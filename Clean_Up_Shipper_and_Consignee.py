@@ -1,103 +1,27 @@
+import time
 import streamlit as st
 import pandas as pd
-import re
 import os
-import unicodedata
 from io import BytesIO
-from rapidfuzz import fuzz
 from openpyxl import load_workbook
 from openpyxl.styles import PatternFill
 
+from husky.batch import OUTPUT_MODES, results_workbook, run_sheets, summary
+from husky.blocking import BLOCKING_MODES, MAX_BLOCK
+from husky.dtypes import compact_frame, memory_report, memory_usage
+from husky.result_cache import RESULT_CACHE_HIT, get_result, has_result, put_result, result_key
+from husky.clustering import CLUSTER_CUTOFF, SCORE_FLOOR, assign_buyers_and_suppliers, score_buyers_and_suppliers
+from husky.disk_cache import content_hash
+from husky.session_memory import SessionMemory
+from husky.text import TEXT_ENGINES
+from husky.upload_cache import cache_caption, load_sheet
+
 st.set_page_config(page_title="🧼 Brand Clustering", layout="wide")
 st.title("🔍 Buyer & Supplier Brand Clustering Tool")
 
-# === Cleaning Functions ===
-def clean_name(name):
-    if pd.isna(name):
-        return ""
-    name = str(name)
-    name = unicodedata.normalize("NFKD", name)
-    name = name.encode("ascii", "ignore").decode("utf-8")
-    name = name.lower()
-    name = re.sub(r'[^a-z0-9 ]', '', name)
-    name = re.sub(r'\b(inc|ltd|corp|co|company|limited|group|plc|gmbh|sa|bv|canada|austria|division of .*)\b', '', name)
-    name = re.sub(r'\s+', ' ', name).strip()
-    return name
-
-def extract_brand(name):
-    words = name.split()
-    return words[0] if words else ""
-
-# === Priority brand map ===
-priority_brands = {
-    'ARBURG': 'ARBURG',
-    'SERAC': 'SERAC',
-    'KHS': 'KHS',
-    'KRONES': 'KRONES',
-    'SHIBUYA': 'SHIBUYA',
-    'SIDEL': 'SIDEL',
-    'BMB': 'BMB',
-    'SIPA': 'SIPA',
-    'ENGEL': 'ENGEL',
-    'NETSTAL': 'NETSTAL',
-    'SACMI': 'SACMI',
-    'HUAYAN': 'HUAYAN',
-    'DEMAG': 'Sumitomo (SHI) Demag',
-    'SUMITOMO': 'Sumitomo (SHI) Demag',
-    'SIAPI':'SIAPI',
-    'Nissei':'Nissei ASB',
-    'ASB':'Nissei ASB',
-    'SAPI':'SIAPI'
-}
-
-def apply_priority(name):
-    upper_name = str(name).upper()
-    for keyword, result in priority_brands.items():
-        if keyword in upper_name:
-            return result
-    return None  # No override
-
-def cluster_names(df, entity_col, cleaned_col, brand_col, final_col):
-    df[cleaned_col] = df[entity_col].fillna('').apply(clean_name)
-    df[brand_col] = df[cleaned_col].apply(extract_brand)
-
-    results = []
-    for brand, group in df.groupby(brand_col):
-        group = group.sort_values(cleaned_col).reset_index(drop=True)
-        master_list = []
-        cleaned_names = []
-
-        for index, row in group.iterrows():
-            current_original = row[entity_col]
-            current_clean = row[cleaned_col]
-
-            # Priority rule check
-            priority_match = apply_priority(current_original)
-            if priority_match:
-                cleaned_names.append(priority_match)
-                continue
-
-            found_match = False
-            best_score = 0
-            best_master_original = None
-
-            for master_original, master_clean in master_list:
-                score = fuzz.token_set_ratio(master_clean, current_clean)
-                if score > 80 and score > best_score:
-                    best_score = score
-                    best_master_original = master_original
-                    found_match = True
-
-            if found_match:
-                cleaned_names.append(best_master_original)
-            else:
-                cleaned_names.append(current_original)
-                master_list.append((current_original, current_clean))
-
-        group[final_col] = cleaned_names
-        results.append(group)
-
-    return pd.concat(results, ignore_index=True)
+# Results and outputs are kept per session within a memory budget (husky/session_memory.py)
+memory = SessionMemory(st.session_state)
+st.sidebar.caption(memory.report())
 
 # === Auto header detection ===
 def detect_header_row(file, sheet_name, required_columns):
@@ -110,12 +34,56 @@ def detect_header_row(file, sheet_name, required_columns):
             continue
     return None
 
+# === All sheets / all files (husky/batch.py) ===
+# Every sheet goes to a worker process with its own header detection
+if st.checkbox("📚 Process all sheets / all uploaded files"):
+    uploaded_files = st.file_uploader("📂 Upload Excel file(s)", type=["xlsx"], accept_multiple_files=True)
+    if uploaded_files:
+        engine = st.selectbox("⚙️ Name cleaning engine:", TEXT_ENGINES, help="Both engines give identical results; 'arrow' runs whole-column kernels.")
+        threshold = st.slider("🎚️ Cluster names scoring above:", SCORE_FLOOR, 99, CLUSTER_CUTOFF)
+        blocking = st.selectbox("🧱 Candidate blocking:", BLOCKING_MODES, help=(
+            "brand: compare names sharing their first cleaned word (original behaviour). "
+            "multi-key: compare names sharing their first word, a phonetic code or a sorted-token prefix; "
+            f"blocks over {MAX_BLOCK} distinct names are skipped for that key."))
+        output_mode = st.radio("🗂️ Output:", OUTPUT_MODES, horizontal=True)
+        batch_key = (tuple(content_hash(f.getvalue()) for f in uploaded_files), engine, threshold, blocking)
+
+        if st.button("🔄 Cluster all sheets"):
+            progress = st.progress(0.0, text="Starting workers...")
+            t0 = time.perf_counter()
+            results = run_sheets(
+                uploaded_files, "husky.clustering:cluster_buyers_and_suppliers", ['Buyer', 'Supplier'],
+                {"engine": engine, "threshold": threshold, "blocking": blocking},
+                on_done=lambda r, done, total: progress.progress(done / total, text=f"{done}/{total} sheets — {r['file']} / {r['sheet']}"),
+            )
+            memory["cluster_batch"] = {"key": batch_key, "results": results, "seconds": time.perf_counter() - t0}
+
+        batch = memory.get("cluster_batch")
+        if batch is not None and batch["key"] == batch_key:
+            st.caption(f"⏱️ {len(batch['results'])} sheets in {batch['seconds']:.2f}s")
+            st.dataframe(summary(batch["results"]), use_container_width=True, hide_index=True)
+            st.download_button(
+                label="⬇️ Download Cleaned Excel",
+                data=memory.download("cleaned_file.xlsx", (batch_key, output_mode), lambda: results_workbook(
+                    batch["results"], output_mode, ["Buyer Cleaned Final", "Supplier Cleaned Final"], merged_name="Clustered")),
+                file_name="cleaned_file.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
+    st.stop()
+
 # === Upload file ===
 uploaded_file = st.file_uploader("📂 Upload Excel file", type=["xlsx"])
 
 if uploaded_file:
     xls = pd.ExcelFile(uploaded_file)
     sheet_name = st.selectbox("📑 Select sheet to process:", xls.sheet_names)
+    engine = st.selectbox("⚙️ Name cleaning engine:", TEXT_ENGINES, help="Both engines give identical results; 'arrow' runs whole-column kernels.")
+    threshold = st.slider("🎚️ Cluster names scoring above:", SCORE_FLOOR, 99, CLUSTER_CUTOFF,
+                          help="Scores are computed once per file; moving the slider only re-applies the cutoff.")
+    blocking = st.selectbox("🧱 Candidate blocking:", BLOCKING_MODES, help=(
+        "brand: compare names sharing their first cleaned word (original behaviour). "
+        "multi-key: compare names sharing their first word, a phonetic code or a sorted-token prefix; "
+        f"blocks over {MAX_BLOCK} distinct names are skipped for that key."))
 
     required_columns = ['Buyer', 'Supplier']
     header_row = detect_header_row(uploaded_file, sheet_name, required_columns)
@@ -124,56 +92,72 @@ if uploaded_file:
         st.error("❌ Could not find both 'Buyer' and 'Supplier' columns in the first 10 rows.")
         st.stop()
 
-    # Read full sheet with detected header
-    df = pd.read_excel(uploaded_file, sheet_name=sheet_name, header=header_row)
-
-    # Step 1: Cluster Buyer names
-    st.write("🔄 Clustering Buyer names...")
-    df = cluster_names(df, 'Buyer', 'Buyer Cleaned', 'Buyer Brand', 'Buyer Cleaned Final')
-
-    # Step 2: Cluster Supplier names
-    st.write("🔄 Clustering Supplier names...")
-    df = cluster_names(df, 'Supplier', 'Supplier Cleaned', 'Supplier Brand', 'Supplier Cleaned Final')
-
-    # Step 3: Reorder & drop temp columns
-    cols = df.columns.tolist()
-
-    if 'Buyer' in cols and 'Buyer Cleaned Final' in cols:
-        cols.insert(cols.index('Buyer') + 1, cols.pop(cols.index('Buyer Cleaned Final')))
-    if 'Supplier' in cols and 'Supplier Cleaned Final' in cols:
-        cols.insert(cols.index('Supplier') + 1, cols.pop(cols.index('Supplier Cleaned Final')))
-
-    # Remove temp/generated columns
-    for col_to_drop in ['Buyer Cleaned', 'Supplier Cleaned', 'Buyer Brand', 'Supplier Brand']:
-        if col_to_drop in df.columns:
-            df.drop(columns=col_to_drop, inplace=True)
-
-    df = df[[col for col in cols if col in df.columns]]
+    # === Result cache (same file, sheet and code version -> same workbook) ===
+    cache_key = result_key(__file__, [(uploaded_file, sheet_name, header_row)], {"threshold": threshold, "blocking": blocking})
+    if has_result(cache_key):
+        st.success("✅ Clustering complete!")
+        st.caption(RESULT_CACHE_HIT)
+        st.download_button(
+            label="⬇️ Download Cleaned Excel",
+            data=lambda: get_result(cache_key),
+            file_name="cleaned_file.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+        st.stop()
 
-    # Final sort
-    if 'Buyer Cleaned Final' in df.columns and 'Supplier Cleaned Final' in df.columns:
-        df = df.sort_values(['Buyer Cleaned Final', 'Supplier Cleaned Final'])
+    # Read full sheet with detected header (via the shared Parquet cache)
+    df, cache_status = load_sheet(uploaded_file, sheet_name, header_row)
+    st.caption(cache_caption(cache_status, sheet_name))
+    mem_before = memory_usage(df)
+    df = compact_frame(df)
+    st.caption(memory_report(mem_before, memory_usage(df)))
+
+    # Steps 1-2: Clean Buyer / Supplier names and score the pairs inside each
+    # block - once per file, kept in the session for threshold changes
+    run_key = (content_hash(uploaded_file.getvalue()), sheet_name, header_row, blocking)
+    scored = memory.get("cluster_scores")
+    if scored is None or scored["key"] != run_key:
+        st.write("🔄 Scoring Buyer and Supplier names...")
+        t0 = time.perf_counter()
+        scored = {"key": run_key, "scores": score_buyers_and_suppliers(df, engine, blocking)}
+        memory["cluster_scores"] = scored
+        st.caption(f"⏱️ Scoring took {time.perf_counter() - t0:.2f}s ({engine} engine, {blocking} blocking)")
+    with st.expander("🧱 Block sizes (distinct names per block)"):
+        for label, side in zip(["Buyer", "Supplier"], scored["scores"]):
+            st.markdown(f"**{label}** — {side['overridden']:,} rows with a priority brand override, not scored")
+            st.dataframe(side["blocks"], use_container_width=True, hide_index=True)
+
+    # Step 3: Apply the threshold, reorder, drop temp columns & sort
+    t0 = time.perf_counter()
+    df = assign_buyers_and_suppliers(scored["scores"], threshold)
+    st.caption(
+        f"🎚️ Threshold {threshold} applied in {time.perf_counter() - t0:.2f}s — "
+        f"{df['Buyer'].nunique():,} buyers → {df['Buyer Cleaned Final'].nunique():,} clusters, "
+        f"{df['Supplier'].nunique():,} suppliers → {df['Supplier Cleaned Final'].nunique():,} clusters"
+    )
+    st.dataframe(df.head(50), use_container_width=True)
 
-    # === Write to Excel with highlight ===
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Clustered')
-        workbook = writer.book
-        worksheet = writer.sheets['Clustered']
+    # === Write to Excel with highlight (built when the download is clicked) ===
+    def export():
+        output = BytesIO()
+        with pd.ExcelWriter(output, engine='openpyxl') as writer:
+            df.to_excel(writer, index=False, sheet_name='Clustered')
+            worksheet = writer.sheets['Clustered']
 
-        # Highlight "Buyer Cleaned Final" and "Supplier Cleaned Final"
-        highlight_fill = PatternFill(start_color="FFF9C4", end_color="FFF9C4", fill_type="solid")
-        for col_idx, col in enumerate(df.columns, start=1):
-            if col in ["Buyer Cleaned Final", "Supplier Cleaned Final"]:
-                worksheet.cell(row=1, column=col_idx).fill = highlight_fill
+            # Highlight "Buyer Cleaned Final" and "Supplier Cleaned Final"
+            highlight_fill = PatternFill(start_color="FFF9C4", end_color="FFF9C4", fill_type="solid")
+            for col_idx, col in enumerate(df.columns, start=1):
+                if col in ["Buyer Cleaned Final", "Supplier Cleaned Final"]:
+                    worksheet.cell(row=1, column=col_idx).fill = highlight_fill
 
-    output.seek(0)
+        put_result(cache_key, output.getvalue())
+        return output.getvalue()
 
     # === Download button ===
     st.success("✅ Clustering complete!")
     st.download_button(
         label="⬇️ Download Cleaned Excel",
-        data=output.getvalue(),
+        data=memory.download("cleaned_file.xlsx", (run_key, threshold), export),
         file_name="cleaned_file.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
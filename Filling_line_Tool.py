@@ -1,13 +1,23 @@
 import streamlit as st
 import pandas as pd
-import re
-import difflib
 from io import BytesIO
 from openpyxl.styles import PatternFill, Alignment
 
+from husky.dtypes import compact_frame, memory_report, memory_usage
+from husky.filling_line import detect_applications, match_product_lines
+from husky.preview import render_preview
+from husky.regions import build_region_dict, match_regions
+from husky.rules import get_ruleset
+from husky.session_memory import SessionMemory
+from husky.stages import frame_fingerprint
+
 st.set_page_config(page_title="🧠 Product Line Detector", layout="wide")
 st.title("🔍 Detect Product and Product Line from Description")
 
+# Results and outputs are kept per session within a memory budget (husky/session_memory.py)
+memory = SessionMemory(st.session_state)
+st.sidebar.caption(memory.report())
+
 # === Upload files ===
 data_file = st.file_uploader("📥 Upload Data File", type=["xlsx", "csv"])
 match_file = st.file_uploader("📄 Upload Match File (Pattern to Lines)", type=["xlsx", "csv"])
@@ -28,48 +38,6 @@ match_df = load_sheet(match_file, "Match File")
 region_df = load_sheet(region_file, "Region File") if region_file else None
 
 
-# === Application Keywords ===
-# Lowercased version of application keywords for reliable matching
-application_keywords_raw = [
-    'water', 'milk', 'beer', 'juice', 'soft drink', 'carbonated', 'tea', 'coffee', 'energy drink',
-    'wine', 'soda', 'syrup', 'yogurt', 'liquid', 'beverage', 'dairy', 'cocktail', 'liqueur',
-    'mineral', 'spring', 'flavored', 'seltzer',
-    'молока', 'вода', 'сок', 'пиво'
-    , 'напиток', 'газированный','ГАЗИРОВАННЫХ',"НАПИТКОВ "
-    'agua', 'leche', 'cerveza', 'zumo', 'bebida', 'gaseosa',
-    'süt', 'bira', 'meyve suyu', 'içecek',
-    'paani', 'doodh', 'juice', 'sharab', 'cold drink'
-]
-application_keywords = [kw.lower() for kw in application_keywords_raw]
-
-def detect_application(text):
-    text = str(text).lower()
-    for keyword in application_keywords:
-        if keyword in text:
-            return keyword
-    return ""
-
-
-def classify_product_line(row):
-    value = row.get('Value', 0)
-    line = str(row.get('Product Line', '')).lower()
-
-    if value < 200000:
-        return "Other"
-    if any(x in line for x in ['pet', 'aseptic']):
-        return "FILLING LINE - PET"
-    elif any(x in line for x in ['glass']):
-        return "FILLING LINE - Glass"
-    elif any(x in line for x in ['can']):
-        return "FILLING LINE - Can"
-    elif any(x in line for x in ['keg']):
-        return "FILLING LINE - Keg"
-    elif 'fill' in line:
-        return "FILLING LINE - Unspecified"
-
-    return "Other"
-
-
 if data_file and match_file:
     if data_file.name.endswith(".csv"):
         data_df = pd.read_csv(data_file)
@@ -84,68 +52,28 @@ if data_file and match_file:
     data_df.columns = data_df.columns.str.strip()
     match_df.columns = match_df.columns.str.strip()
 
+    mem_before = memory_usage(data_df)
+    data_df = compact_frame(data_df)
+    st.caption(memory_report(mem_before, memory_usage(data_df)))
+
     if region_file and "Buyer Country" in data_df.columns:
         if region_file.name.endswith(".csv"):
             region_df = pd.read_csv(region_file)
         else:
             region_df = pd.read_excel(region_file)
 
-        region_df.columns = region_df.columns.str.strip()
-        region_df = region_df[['Country', 'Region']].dropna()
-
-
-        def normalize(text):
-            return re.sub(r'\s+', ' ', str(text).strip().lower())
-
-
-        region_dict = {normalize(c): r for c, r in zip(region_df['Country'], region_df['Region'])}
-
-
-        def fuzzy_region_match(buyer_country):
-            if pd.isna(buyer_country):
-                return ""
-
-            upper_buyer = str(buyer_country).upper()
-
-            # === Priority keyword rules ===
-            if "KINGDOM" in upper_buyer:
-                return "West Europe"
-            if "OF AM" in upper_buyer or "UNITED STATES" in upper_buyer:
-                return "North America"
-            if "EMIRATES" in upper_buyer:
-                return "Middle East"
-
-            norm_buying = normalize(buyer_country)
-
-            # Fuzzy match (80%)
-            matches = difflib.get_close_matches(norm_buying, region_dict.keys(), n=1, cutoff=0.8)
-            if matches:
-                return region_dict[matches[0]]
-
-            # Try first 5-letter match
-            for key in region_dict:
-                if norm_buying[:5] == key[:5]:
-                    return region_dict[key]
-
-            return ""
-
-
-        data_df["Buyer Region"] = data_df["Buyer Country"].apply(fuzzy_region_match)
+        region_dict = build_region_dict(region_df)
+        data_df["Buyer Region"] = match_regions(data_df["Buyer Country"], region_dict)
 
     # === Product Matching ===
-    data_df["Product"] = ""
-    data_df["Product Line"] = ""
-
-    for _, row in match_df.iterrows():
-        pattern = str(row["Pattern"]).strip().upper()
-        line = str(row["Lines"]).strip()
-        mask = (data_df["Product Line"] == "") & data_df["Product Description"].str.upper().str.contains(pattern, na=False)
-        data_df.loc[mask, "Product"] = pattern
-        data_df.loc[mask, "Product Line"] = line
+    # First match-file pattern per distinct description (husky/filling_line.py)
+    data_df["Product"], data_df["Product Line"] = match_product_lines(data_df["Product Description"], match_df)
 
     # === Application and Classification ===
-    data_df["Application"] = data_df["Product Description"].apply(detect_application)
-    data_df["Product Line Classification"] = data_df.apply(classify_product_line, axis=1)
+    # Application keywords compiled into one matcher, first keyword in list order wins
+    data_df["Application"] = detect_applications(data_df["Product Description"])
+    # Value < 200,000 / PET / Glass / Can / Keg / fill rules: "filling_line_classification" in husky/rules.json
+    data_df["Product Line Classification"] = get_ruleset("filling_line_classification").apply(data_df)
 
     # === Reorder Columns ===
     cols = list(data_df.columns)
@@ -165,7 +93,10 @@ if data_file and match_file:
 
     # === Display preview ===
     st.success("✅ Matching complete! Preview below:")
-    st.dataframe(data_df)
+    # One page at a time, sliced on the server (husky/preview.py)
+    result_key = frame_fingerprint(data_df)
+    render_preview(st, memory, data_df, "product_line_preview", result_key,
+                   new_columns=["Product", "Product Line", "Application", "Product Line Classification", "Buyer Region"])
 
     # === Excel Export with Highlight and Formatting ===
     def to_excel_with_header_highlight(df):
@@ -205,10 +136,10 @@ if data_file and match_file:
         output.seek(0)
         return output.getvalue()
 
-    excel_data = to_excel_with_header_highlight(data_df)
     st.download_button(
         label="📥 Download Result as Excel (Highlighted)",
-        data=excel_data,
+        data=memory.download("processed_product_lines_highlighted.xlsx", result_key,
+                             lambda: to_excel_with_header_highlight(data_df)),
         file_name="processed_product_lines_highlighted.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
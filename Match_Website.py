@@ -1,139 +1,37 @@
 # app.py
 
 import io
-import re
+import time
 import pandas as pd
 import streamlit as st
-from rapidfuzz import fuzz, process
+
+from husky.ngram_index import recall_at
+from husky.result_cache import RESULT_CACHE_HIT, get_result, has_result, put_result, result_key
+from husky.session_memory import SessionMemory
+from husky.text import TEXT_ENGINES
+from husky.websites import FUZZY_MODES, add_company_website, match_counts, score_targets
 
 # -----------------------
 # Utilities
 # -----------------------
-COMMON_SUFFIXES = {
-    "inc","inc.","ltd","ltd.","llc","llc.","co","co.","corp","corp.",
-    "corporation","company","limited","sa","ag","bv","pty","pte","kg","kgaa",
-    "gmbh","plc","srl","oy","ab","aps","sasu","sas","spa","spzoo","sro",
-    "bvba","nv","kft","kk","kabushiki","kaisha","pte.","ltd.","pty","ltd"
-}
-
-def normalize_name(s: str) -> str:
-    if pd.isna(s):
-        return ""
-    s = str(s).lower()
-    s = re.sub(r"[^a-z0-9\s]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    words = [w for w in s.split() if w not in COMMON_SUFFIXES]
-    return " ".join(words).strip()
-
-def first4prefix(name: str) -> str:
-    return normalize_name(name).replace(" ", "")[:4]
-
 def pick_sheet_uploader(label: str):
     f = st.file_uploader(label, type=["csv", "xlsx", "xls"])
     df = None
     info = ""
+    source = None  # (file, sheet, header) for the result cache key
     if f is not None:
         filename = f.name.lower()
         if filename.endswith(".csv"):
             df = pd.read_csv(f)
             info = f"Loaded CSV: **{f.name}**"
+            source = (f, None, 0)
         else:
             xf = pd.ExcelFile(f)
             sheet = st.selectbox(f"Select sheet for **{f.name}**", xf.sheet_names, key=f"sheet_{f.name}")
             df = xf.parse(sheet_name=sheet)
             info = f"Loaded Excel: **{f.name}** — Sheet: **{sheet}**"
-    return df, info
-
-def build_reference_maps(ref_df: pd.DataFrame, col_company: str, col_website: str):
-    ref_df = ref_df.copy()
-    ref_df["_norm"] = ref_df[col_company].apply(normalize_name)
-    ref_df["_prefix4"] = ref_df[col_company].apply(first4prefix)
-
-    # exact normalized -> website (first non-null)
-    exact_map = {}
-    for _, r in ref_df.iterrows():
-        nm = r["_norm"]
-        web = r[col_website]
-        if nm and pd.notna(web) and nm not in exact_map:
-            exact_map[nm] = str(web)
-
-    # prefix buckets for fallback
-    prefix_map = {}
-    for _, r in ref_df.iterrows():
-        p4 = r["_prefix4"]
-        if not p4:
-            continue
-        web = str(r[col_website]) if pd.notna(r[col_website]) else ""
-        prefix_map.setdefault(p4, []).append((r["_norm"], web))
-
-    # for fuzzy
-    name_list = ref_df["_norm"].tolist()
-    website_by_norm = {}
-    for _, r in ref_df.iterrows():
-        nm = r["_norm"]
-        web = r[col_website]
-        if nm and pd.notna(web) and nm not in website_by_norm:
-            website_by_norm[nm] = str(web)
-
-    return exact_map, prefix_map, name_list, website_by_norm
-
-def match_fuzzy_then_prefix(target_name: str, exact_map, prefix_map, name_list, website_by_norm, threshold: int):
-    nm = normalize_name(target_name)
-    if not nm:
-        return None
-
-    # 1) Exact normalized
-    if nm in exact_map:
-        return exact_map[nm]
-
-    # 2) Fuzzy (ordered letters) >= threshold
-    best = process.extractOne(nm, name_list, scorer=fuzz.ratio)
-    if best:
-        best_name, score, _ = best
-        if score >= threshold:
-            web = website_by_norm.get(best_name)
-            if web:
-                return web
-
-    # 3) First 4 letters fallback
-    p4 = first4prefix(target_name)
-    if p4 and p4 in prefix_map:
-        candidates = prefix_map[p4]  # list of (norm_name, website)
-        # choose best by similarity to break ties
-        best_web, best_score = None, -1
-        for cnorm, web in candidates:
-            score = fuzz.ratio(nm, cnorm)
-            if score > best_score and web:
-                best_web, best_score = web, score
-        if best_web:
-            return best_web
-
-    # no match
-    return None
-
-def add_company_website(target_df: pd.DataFrame,
-                        ref_df: pd.DataFrame,
-                        target_company_col: str,
-                        ref_company_col: str,
-                        ref_website_col: str,
-                        threshold: int = 70) -> pd.DataFrame:
-
-    exact_map, prefix_map, name_list, website_by_norm = build_reference_maps(
-        ref_df, ref_company_col, ref_website_col
-    )
-
-    out = target_df.copy()
-    # compute websites
-    websites = []
-    for _, name in out[target_company_col].items():
-        websites.append(
-            match_fuzzy_then_prefix(name, exact_map, prefix_map, name_list, website_by_norm, threshold)
-        )
-
-    # insert Company Website right after Company Name
-    out.insert(out.columns.get_loc(target_company_col) + 1, "Company Website", websites)
-
-    return out
+            source = (f, sheet, 0)
+    return df, info, source
 
 def to_excel_bytes(df: pd.DataFrame) -> bytes:
     with io.BytesIO() as buffer:
@@ -147,6 +45,10 @@ def to_excel_bytes(df: pd.DataFrame) -> bytes:
 st.set_page_config(page_title="Company Website Matcher", page_icon="🔎", layout="wide")
 st.title("🔎 Company Website Matcher")
 
+# Results and outputs are kept per session within a memory budget (husky/session_memory.py)
+memory = SessionMemory(st.session_state)
+st.sidebar.caption(memory.report())
+
 with st.expander("Instructions", expanded=False):
     st.markdown(
         """
@@ -160,8 +62,8 @@ with st.expander("Instructions", expanded=False):
 
 # File inputs
 st.subheader("1) Upload files")
-ref_df, ref_info = pick_sheet_uploader("Upload **Reference** file (CSV/XLSX)")
-tgt_df, tgt_info = pick_sheet_uploader("Upload **Target** file (CSV/XLSX)")
+ref_df, ref_info, ref_source = pick_sheet_uploader("Upload **Reference** file (CSV/XLSX)")
+tgt_df, tgt_info, tgt_source = pick_sheet_uploader("Upload **Target** file (CSV/XLSX)")
 
 if ref_df is not None:
     st.caption(ref_info)
@@ -185,25 +87,85 @@ if (ref_df is not None) and (tgt_df is not None):
 
     st.subheader("3) Fuzzy threshold")
     threshold = st.slider("Similarity threshold (used before 1st-4-letters fallback)", 50, 95, 70, 1)
+    engine = st.selectbox("Name normalization engine", TEXT_ENGINES, help="Both engines give identical results; 'arrow' runs whole-column kernels.")
+    fuzzy_mode = st.selectbox("Fuzzy lookup", FUZZY_MODES, help="'brute force' scores every reference name (the original matches); 'trigram index' re-scores only the top-k most similar reference names, which is faster but can miss some matches.")
+    top_k = 50
+    recall_sample = 0
+    if fuzzy_mode == "trigram index":
+        top_k = st.number_input("Candidates per name (top-k)", min_value=5, max_value=1000, value=50, step=5)
+        if st.checkbox("Report recall against brute force", value=True):
+            recall_sample = st.number_input("Names to sample for the recall check", min_value=10, max_value=5000, value=300, step=10)
 
     st.subheader("4) Run")
+    # Candidates are scored once per inputs/settings and kept in the session;
+    # moving the threshold slider afterwards only re-applies the cutoff.
+    # The normalization engine and recall sample do not change the matches.
+    run_settings = {
+        "ref_company_col": ref_company_col, "ref_website_col": ref_website_col,
+        "tgt_company_col": tgt_company_col,
+        "fuzzy_mode": fuzzy_mode, "top_k": int(top_k) if fuzzy_mode == "trigram index" else None,
+    }
+    run_key = result_key(__file__, [ref_source, tgt_source], run_settings)
+    cache_key = result_key(__file__, [ref_source, tgt_source], {**run_settings, "threshold": threshold})
+
     if st.button("Match & Generate"):
+        if has_result(cache_key):
+            st.success("Done!")
+            st.caption(RESULT_CACHE_HIT)
+            st.dataframe(pd.read_excel(io.BytesIO(get_result(cache_key)), nrows=50), use_container_width=True)
+            st.download_button(
+                label="⬇️ Download as Excel",
+                data=lambda: get_result(cache_key),
+                on_click="ignore",
+                file_name="company_website_matched.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                use_container_width=True
+            )
+            st.stop()
+
         with st.spinner("Matching..."):
-            result = add_company_website(
+            t0 = time.perf_counter()
+            scores = score_targets(
                 target_df=tgt_df,
                 ref_df=ref_df,
                 target_company_col=tgt_company_col,
                 ref_company_col=ref_company_col,
                 ref_website_col=ref_website_col,
-                threshold=threshold
+                engine=engine,
+                fuzzy_mode=fuzzy_mode,
+                top_k=int(top_k),
+                recall_sample=int(recall_sample)
+            )
+        memory["website_scores"] = {"key": run_key, "scores": scores}
+        st.success(f"Done! ({time.perf_counter() - t0:.2f}s, {engine} engine, {fuzzy_mode})")
+
+    scored = memory.get("website_scores")
+    if scored is not None and scored["key"] == run_key:
+        scores = scored["scores"]
+        t0 = time.perf_counter()
+        result = add_company_website(tgt_df, ref_df, tgt_company_col, ref_company_col, ref_website_col,
+                                     threshold=threshold, scores=scores)
+        counts = match_counts(scores, threshold)
+        st.caption(
+            f"🎚️ Threshold {threshold} applied in {time.perf_counter() - t0:.3f}s — "
+            + ", ".join(f"{label}: {n:,}" for label, n in counts.items())
+        )
+        recall = scores.attrs.get("fuzzy_recall")
+        if recall:
+            st.caption(
+                f"🎯 Trigram index recall vs brute force: {recall_at(recall, threshold):.1%} on {recall['queries']} sampled names "
+                f"— {recall['index_ms']:.2f} ms vs {recall['brute_ms']:.2f} ms per name"
             )
-
-        st.success("Done!")
         st.dataframe(result.head(50), use_container_width=True)
 
+        def export():
+            output = to_excel_bytes(result)
+            put_result(cache_key, output)
+            return output
+
         st.download_button(
             label="⬇️ Download as Excel",
-            data=to_excel_bytes(result),
+            data=memory.download("company_website_matched.xlsx", cache_key, export),
             file_name="company_website_matched.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             use_container_width=True
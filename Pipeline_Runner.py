@@ -0,0 +1,131 @@
+import streamlit as st
+import pandas as pd
+
+from husky.dtypes import compact_frame, memory_report, memory_usage
+from husky.imm import NUMERIC_COLS, build_buyer_map, compile_patterns, load_patterns, pattern_errors_message, to_styled_excel
+from husky.jobs import render_jobs, submit_pipeline, track_job
+from husky.pipeline import load_stages, plan_levels, run_pipeline
+from husky.regions import build_region_dict
+from husky.session_memory import SessionMemory
+from husky.stages import frame_fingerprint
+from husky.text import TEXT_ENGINES
+from husky.upload_cache import cache_caption, load_sheet
+
+st.set_page_config(page_title="🔗 Pipeline Runner", layout="wide")
+st.title("🔗 Trade Data Pipeline Runner")
+
+# Results and outputs are kept per session within a memory budget (husky/session_memory.py)
+memory = SessionMemory(st.session_state)
+st.sidebar.caption(memory.report())
+st.markdown(
+    "Runs brand clustering, IMM extraction, blow type classification and region mapping "
+    "on one in-memory table and writes a single Excel file at the end. "
+    "Stages and their order are configured in `husky/pipeline.json`."
+)
+
+
+# === Background jobs ===
+@st.fragment(run_every="3s")
+def show_jobs():
+    render_jobs(st, "pipeline", "pipeline_output")
+
+
+show_jobs()
+
+# === Upload files ===
+input_file = st.file_uploader("📄 Upload trade data Excel (must include 'Buyer' and 'Supplier')", type=["xlsx"])
+patterns_file = st.file_uploader("📥 Upload regex pattern Excel (regex.xlsx) — IMM extraction", type=["xlsx"])
+buyer_app_file = st.file_uploader("🔍 Upload Buyer → Application match file (optional)", type=["xlsx"])
+region_file = st.file_uploader("🌍 Upload Country → Region match file — region mapping", type=["xlsx"])
+
+
+# === Helper: load with sheet selection ===
+def load_excel_with_sheet_selector(file, label):
+    if not file:
+        return None
+    xls = pd.ExcelFile(file)
+    sheet = st.selectbox(f"📑 Select sheet for {label}", xls.sheet_names, key=label)
+    df, cache_status = load_sheet(file, sheet)
+    st.caption(cache_caption(cache_status, sheet))
+    return df
+
+
+input_df = load_excel_with_sheet_selector(input_file, "Input File")
+patterns_df = load_excel_with_sheet_selector(patterns_file, "Regex Pattern File")
+buyer_df = load_excel_with_sheet_selector(buyer_app_file, "Buyer Application File")
+region_df = load_excel_with_sheet_selector(region_file, "Region File")
+
+if input_df is not None:
+    df = compact_frame(input_df)
+    st.caption(memory_report(memory_usage(input_df), memory_usage(df)))
+
+    resources = {
+        "machine_patterns": load_patterns(patterns_df) if patterns_df is not None else None,
+        "buyer_map": build_buyer_map(buyer_df),
+        "region_dict": build_region_dict(region_df) if region_df is not None else None,
+    }
+    if resources["machine_patterns"]:
+        pattern_errors = compile_patterns(resources["machine_patterns"])[1]
+        if pattern_errors:
+            st.warning(pattern_errors_message(pattern_errors))
+
+    # Stages whose lookup files are missing cannot be selected
+    stages = load_stages()
+    available = [s for s in stages if not s.missing_resources(resources)]
+    for stage in stages:
+        if stage not in available:
+            st.caption(f"⏭️ {stage.label}: upload the {', '.join(stage.missing_resources(resources))} file to enable")
+
+    labels = {s.label: s for s in available}
+    chosen = st.multiselect("🧩 Stages to run:", list(labels), default=list(labels))
+    engine = st.selectbox("⚙️ Name cleaning engine:", TEXT_ENGINES, help="Both engines give identical results; 'arrow' runs whole-column kernels.")
+
+    selected = [labels[label] for label in chosen]
+    for stage in selected:
+        if "engine" in stage.params:
+            stage.params["engine"] = engine
+
+    if selected:
+        plan = " → ".join(" ‖ ".join(s.name for s in level) for level in plan_levels(selected))
+        st.caption(f"📋 Plan: {plan}  (‖ = run concurrently)")
+
+    background = st.checkbox("🕒 Run in background", value=True,
+                             help="The run continues if the page is refreshed; its output stays downloadable from the job list.")
+
+    run = selected and st.button("▶️ Run pipeline")
+    if run and background:
+        produced = [col for stage in selected for col in stage.produces]
+        job_id = submit_pipeline(df, selected, resources, highlight_cols=produced,
+                                 label=f"{input_file.name}: {', '.join(s.name for s in selected)}")
+        track_job(st, job_id)
+        st.success(f"✅ Job `{job_id}` queued — progress is shown in the job list above.")
+
+    elif run:
+        progress = st.empty()
+        done = []
+
+        def report(stage, seconds):
+            done.append(f"✅ {stage.label} — {seconds:.2f}s")
+            progress.markdown("\n\n".join(done))
+
+        try:
+            with st.spinner("Running pipeline..."):
+                result, timings = run_pipeline(df, selected, resources, on_stage=report)
+        except Exception as e:
+            st.error(f"❌ An error occurred: {e}")
+            st.stop()
+
+        st.success(f"✅ Pipeline complete in {sum(timings.values()):.2f}s of stage time")
+        st.dataframe(result.head(50), use_container_width=True)
+
+        produced = [col for stage in selected for col in stage.produces]
+        st.download_button(
+            label="⬇️ Download Processed File",
+            data=memory.download("pipeline_output.xlsx", frame_fingerprint(result),
+                                 lambda: to_styled_excel(result, highlight_cols=produced, numeric_cols=NUMERIC_COLS)),
+            file_name="pipeline_output.xlsx",
+            on_click="ignore",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+else:
+    st.info("Upload a trade data file to begin.")
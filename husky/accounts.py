@@ -0,0 +1,482 @@
+"""CRM account grouping and de-duplication (Account_clean_up.py).
+
+Pair scores are computed once per run (``score_accounts``) and the 85 / 90
+cutoffs are applied afterwards, so a different cutoff only replays the
+grouping over the stored pairs. ``incremental_cleanup`` reuses a saved run
+and only cleans and matches accounts that are new or changed since; its
+output is an approximation of a full run (see ``INCREMENTAL_CAVEAT``).
+
+Step 3 has two groupings. "first row" is the original scan: each row not
+yet grouped opens a group and takes every later row matching it, so the
+groups depend on the row order. "connected components" puts rows linked
+by any chain of matches (within their SOU Category) in one group and
+labels it from one representative member, which does not depend on the
+row order. Its pairs are only scored inside the multi-key blocks
+(husky/blocking.py) of each SOU Category instead of between all names of
+the category, so the scoring grows with the block sizes rather than with
+the square of the category size; pairs sharing no block key are never
+linked.
+"""
+
+import json
+import re
+import time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+from husky.blocking import multi_key_blocks
+from husky.checkpoint import Checkpoint
+from husky.disk_cache import CACHE_ROOT
+from husky.dtypes import category_blocks
+from husky.rules import get_ruleset
+from husky.similarity import PairScores
+from husky.text import clean_column
+
+GROUP_CUTOFF = 85
+DEDUP_CUTOFF = 90
+SCORE_FLOOR = 70  # lowest cutoff the stored pairs can serve
+GROUPING_MODES = ("first row", "connected components")
+
+INCREMENTAL_CAVEAT = (
+    "Incremental output can differ from a full cleanup of the same file: existing groups and duplicate clusters "
+    "are kept, new and changed accounts only join them (or start their own), and removed accounts do not split "
+    "or merge what was built around them. Run a full cleanup (incremental mode off) for the exact result."
+)
+
+PREFERRED_START = [
+    'Account Name',
+    'Account Group Name Cleaned',
+    'Business Type',
+    'Country',
+    'SOU Category',
+    'SOU',
+    'Owner'
+]
+SYSTEM_COLUMNS = ['(Do Not Modify) Account', '(Do Not Modify) Row Checksum']
+
+
+def group_blocks(df, grouping="first row"):
+    """Position arrays scored for step 3: each SOU Category, or its multi-key blocks for "connected components"."""
+    _, sou_blocks = category_blocks(df['SOU Category'])
+    if grouping != "connected components":
+        return list(sou_blocks.values())
+    names = df['Cleaned Name'].to_numpy(dtype=object)
+    blocks = []
+    for positions in sou_blocks.values():
+        within, _ = multi_key_blocks(names[positions].tolist())
+        blocks.extend(positions[block] for block in within)
+    return blocks
+
+
+def score_accounts(df, floor=SCORE_FLOOR, checkpoint_key=None, on_progress=None, grouping="first row"):
+    """Scores of 'Cleaned Name' pairs within the step 3 blocks (``group_blocks``) and within each Country.
+
+    With a ``checkpoint_key`` (a fingerprint of the run's inputs) both passes
+    save their progress block by block and a rerun with the same key resumes
+    them; the checkpoints are removed once both are done. ``on_progress``
+    gets ``(blocks done, blocks total, blocks resumed)`` over both passes.
+    """
+    names = df['Cleaned Name'].tolist()
+    sou_blocks = group_blocks(df, grouping)
+    _, country_blocks = category_blocks(df['Country'])
+    checkpoints = [None, None]
+    if checkpoint_key is not None:
+        sou_part = "sou_multikey" if grouping == "connected components" else "sou"
+        checkpoints = [Checkpoint(f"account_pairs_{part}", checkpoint_key) for part in (sou_part, "country")]
+    total = len(sou_blocks) + len(country_blocks)
+
+    def progress(offset):
+        if on_progress is None:
+            return None
+        return lambda done, _: on_progress(offset + done, total,
+                                           sum(c.resumed for c in checkpoints if c is not None))
+
+    sou_pairs = PairScores.within_blocks(names, sou_blocks, fuzz.token_set_ratio, floor,
+                                         checkpoint=checkpoints[0], on_progress=progress(0))
+    country_pairs = PairScores.within_blocks(names, country_blocks.values(), fuzz.token_set_ratio, floor,
+                                             checkpoint=checkpoints[1], on_progress=progress(len(sou_blocks)))
+    for checkpoint in checkpoints:
+        if checkpoint is not None:
+            checkpoint.clear()
+    return sou_pairs, country_pairs
+
+
+def _check_cutoff(pairs, cutoff):
+    if cutoff < pairs.floor:
+        raise ValueError(f"Cutoff {cutoff} is below the stored score floor {pairs.floor}")
+
+
+def group_prefix(name):
+    return " ".join(name.split()[:2])
+
+
+# Step 3: Group names by fuzzy match (only rows of the same SOU Category are compared)
+def group_bases(n, sou_pairs, cutoff=GROUP_CUTOFF):
+    """Position of the row whose name each row's group is based on."""
+    _check_cutoff(sou_pairs, cutoff)
+    bases = [-1] * n
+
+    for i in range(n):
+        if bases[i] >= 0:
+            continue
+        bases[i] = i
+
+        for j in sou_pairs.later(i, cutoff).tolist():
+            if bases[j] < 0:
+                bases[j] = i
+
+    return bases
+
+
+def group_representatives(names, is_customer, sou_pairs, cutoff=GROUP_CUTOFF):
+    """Position of the representative of each row's connected component.
+
+    The representative is picked among the Customer members of the group
+    (all members when there is none): the most frequent cleaned name, ties
+    going to the alphabetically first name, then to its first row. One
+    representative is computed per group and shared by all its members.
+    """
+    _check_cutoff(sou_pairs, cutoff)
+    members = pd.DataFrame({
+        "group": sou_pairs.components(cutoff),
+        "name": pd.Series(names, dtype=object).fillna(""),
+        "customer": np.asarray(is_customer, dtype=bool),
+        "position": np.arange(len(names)),
+    })
+    has_customer = members.groupby("group")["customer"].transform("any")
+    pool = members[members["customer"] | ~has_customer]
+    counts = pool.groupby(["group", "name"], sort=False).agg(count=("position", "size"), first=("position", "min"))
+    counts = counts.reset_index().sort_values(["group", "count", "name"], ascending=[True, False, True])
+    representatives = counts.drop_duplicates("group").set_index("group")["first"]
+    return representatives.reindex(members["group"]).to_numpy()
+
+
+def group_accounts(names, sou_pairs, cutoff=GROUP_CUTOFF, grouping="first row", is_customer=None):
+    if grouping == "connected components":
+        bases = group_representatives(names, is_customer, sou_pairs, cutoff)
+    else:
+        bases = group_bases(len(names), sou_pairs, cutoff)
+    return [group_prefix(names[base]) for base in bases]
+
+
+# Step 4: Deduplicate by Cleaned Name + Country (blocked on Country)
+def dedup_clusters(n, country_pairs, cutoff=DEDUP_CUTOFF):
+    """``(representative, members)`` per duplicate cluster, in row order.
+
+    A row already claimed by an earlier cluster is still listed by any later
+    representative it matches, exactly as the original loop did.
+    """
+    _check_cutoff(country_pairs, cutoff)
+    clusters = []
+    skip = set()
+
+    for i in range(n):
+        if i in skip:
+            continue
+        similar = [i] + country_pairs.later(i, cutoff).tolist()
+        skip.update(similar[1:])
+        clusters.append((i, similar))
+
+    return clusters
+
+
+def keep_row(members, is_customer):
+    # First Customer of the group, else its first row
+    return next((j for j in members if is_customer[j]), members[0])
+
+
+def dedup_accounts(df, country_pairs, cutoff=DEDUP_CUTOFF):
+    is_customer = (df['Business Type'] == 'Customer').to_numpy()
+    keep = [keep_row(members, is_customer) for _, members in dedup_clusters(len(df), country_pairs, cutoff)]
+    return df.iloc[keep]
+
+
+def finalize_accounts(final_df):
+    # Step 5: Reorder columns
+    front = [col for col in PREFERRED_START if col in final_df.columns]
+    others = [col for col in final_df.columns if col not in front]
+    final_df = final_df[front + others]
+
+    # Step 6: Drop unwanted system columns
+    return final_df.drop(columns=[col for col in SYSTEM_COLUMNS if col in final_df.columns])
+
+
+def cleanup_accounts(df, sou_pairs, country_pairs, group_cutoff=GROUP_CUTOFF, dedup_cutoff=DEDUP_CUTOFF,
+                     grouping="first row"):
+    """Steps 3-6 on a frame that already has 'Cleaned Name' and 'SOU Category'."""
+    df = df.copy()
+    is_customer = (df['Business Type'] == 'Customer').to_numpy()
+    df['Account Group Name Cleaned'] = group_accounts(df['Cleaned Name'].tolist(), sou_pairs, group_cutoff,
+                                                      grouping, is_customer)
+    return finalize_accounts(dedup_accounts(df, country_pairs, dedup_cutoff))
+
+
+def cleanup_job(df, group_cutoff=GROUP_CUTOFF, dedup_cutoff=DEDUP_CUTOFF, grouping="first row", engine="python",
+                checkpoint_key=None, report=None):
+    """Steps 1-7 as a background job (husky/jobs.py): the cleaned workbook's bytes."""
+    report = report or (lambda **fields: None)
+    df = df.copy()
+    report(stage="Cleaning names")
+    df['Cleaned Name'] = clean_column(df['Account Name'], "account", engine)
+    df['SOU Category'] = get_ruleset("sou_category").apply(df)
+
+    report(stage="Scoring pairs")
+    sou_pairs, country_pairs = score_accounts(
+        df, checkpoint_key=checkpoint_key, grouping=grouping,
+        on_progress=lambda done, total, _: report(progress=0.9 * done / total, message=f"{done:,}/{total:,} blocks"))
+
+    report(stage="Grouping and de-duplicating")
+    final_df = cleanup_accounts(df, sou_pairs, country_pairs, group_cutoff, dedup_cutoff, grouping)
+    report(stage="Writing Excel", message=f"{len(df):,} rows → {len(final_df):,} rows")
+    output = BytesIO()
+    final_df.to_excel(output, index=False, engine='openpyxl')
+    return output.getvalue()
+
+
+# === Incremental mode ===
+# The previous run is stored per state name as three files: one row per
+# account (id, checksum, cleaned name, SOU Category, Country, Customer flag,
+# the account its group is based on and the representative of its duplicate
+# cluster), the duplicate clusters in output order with the account kept for
+# each, and the cutoffs used. Unchanged accounts reuse all of it; new or
+# changed accounts are cleaned and matched against the stored group bases and
+# cluster representatives only. With the "connected components" grouping
+# the stored base is the group representative and a new account joins the
+# group whose representative it matches best.
+
+ID_COLUMN, CHECKSUM_COLUMN = SYSTEM_COLUMNS
+STATE_DIR = CACHE_ROOT / "accounts"
+STATE_VERSION = 1
+
+
+def _state_path(name):
+    return STATE_DIR / re.sub(r"[^\w.-]", "_", str(name))
+
+
+def incremental_problem(df):
+    """Why ``df`` cannot be processed incrementally, or None."""
+    missing = [col for col in SYSTEM_COLUMNS if col not in df.columns]
+    if missing:
+        return f"missing column(s) {', '.join(missing)}"
+    ids = df[ID_COLUMN]
+    if ids.isna().any() or ids.astype(str).duplicated().any():
+        return f"'{ID_COLUMN}' has blank or duplicate values"
+    return None
+
+
+def load_state(name):
+    path = _state_path(name)
+    try:
+        with open(path / "meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != STATE_VERSION:
+            return None
+        rows = pd.read_parquet(path / "rows.parquet")
+        clusters = pd.read_parquet(path / "clusters.parquet")
+    except (FileNotFoundError, ValueError, OSError):
+        return None
+    return {"meta": meta, "rows": rows, "clusters": clusters}
+
+
+def save_state(name, rows, clusters, group_cutoff, dedup_cutoff, grouping="first row"):
+    path = _state_path(name)
+    path.mkdir(parents=True, exist_ok=True)
+    rows.to_parquet(path / "rows.parquet", index=False)
+    clusters.to_parquet(path / "clusters.parquet", index=False)
+    meta = {"version": STATE_VERSION, "group_cutoff": group_cutoff, "dedup_cutoff": dedup_cutoff,
+            "grouping": grouping, "accounts": len(rows), "saved": time.time()}
+    with open(path / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+def state_matches(state, group_cutoff, dedup_cutoff, grouping="first row"):
+    return (state is not None and state["meta"]["group_cutoff"] == group_cutoff
+            and state["meta"]["dedup_cutoff"] == dedup_cutoff
+            and state["meta"].get("grouping", "first row") == grouping)
+
+
+def _countries(df):
+    # Rows without a Country are never compared in step 4
+    return df['Country'].astype(str).where(df['Country'].notna(), None).to_numpy(dtype=object)
+
+
+def _state_rows(df, base_ids, rep_ids):
+    return pd.DataFrame({
+        "account": df[ID_COLUMN].astype(str).to_numpy(),
+        "checksum": df[CHECKSUM_COLUMN].astype(str).to_numpy(),
+        "cleaned": df['Cleaned Name'].to_numpy(dtype=object),
+        "sou_category": df['SOU Category'].astype(str).to_numpy(),
+        "country": _countries(df),
+        "base": np.asarray(base_ids, dtype=object),
+        "rep": np.asarray(rep_ids, dtype=object),
+        "present": True,
+    })
+
+
+def state_from_full_run(df, sou_pairs, country_pairs, group_cutoff=GROUP_CUTOFF, dedup_cutoff=DEDUP_CUTOFF,
+                        grouping="first row"):
+    """State rows and clusters describing a full (non-incremental) run on ``df``."""
+    is_customer = (df['Business Type'] == 'Customer').to_numpy()
+    if grouping == "connected components":
+        bases = group_representatives(df['Cleaned Name'].tolist(), is_customer, sou_pairs, group_cutoff)
+    else:
+        bases = np.asarray(group_bases(len(df), sou_pairs, group_cutoff))
+    clusters = dedup_clusters(len(df), country_pairs, dedup_cutoff)
+    reps = np.full(len(df), -1)
+    for rep, members in clusters:
+        for j in members:
+            if reps[j] < 0:
+                reps[j] = rep  # first cluster to claim the row
+    ids = df[ID_COLUMN].astype(str).to_numpy()
+    cluster_table = pd.DataFrame({
+        "rep": [ids[rep] for rep, _ in clusters],
+        "kept": [ids[keep_row(members, is_customer)] for _, members in clusters],
+    })
+    return _state_rows(df, ids[bases], ids[reps]), cluster_table
+
+
+def _first_match(name, candidates, cutoff):
+    """Index of the first candidate name scoring above ``cutoff``, or None."""
+    if not candidates:
+        return None
+    scores = process.cdist([name], candidates, scorer=fuzz.token_set_ratio, dtype=np.float64)[0]
+    hits = np.flatnonzero(scores > cutoff)
+    return int(hits[0]) if len(hits) else None
+
+
+def _best_match(name, candidates, cutoff):
+    """Index of the best-scoring candidate name above ``cutoff`` (first on ties), or None."""
+    if not candidates:
+        return None
+    scores = process.cdist([name], candidates, scorer=fuzz.token_set_ratio, dtype=np.float64)[0]
+    best = int(np.argmax(scores))
+    return best if scores[best] > cutoff else None
+
+
+def incremental_cleanup(df, state, engine="python"):
+    """Steps 1-6 on ``df`` reusing ``state``; returns ``(final_df, rows, clusters, stats)``.
+
+    Cutoffs are the ones stored in the state (see ``state_matches``). New
+    and changed accounts are matched against the stored group bases and
+    cluster representatives only, so the result is not guaranteed to equal
+    ``cleanup_accounts`` on the same rows once accounts were added, changed
+    or removed: a full run may group or keep rows differently (e.g. a new
+    account that would have been an earlier group's base, or a removed one
+    that linked two groups). It equals the full run when nothing changed.
+    """
+    group_cutoff = state["meta"]["group_cutoff"]
+    dedup_cutoff = state["meta"]["dedup_cutoff"]
+    group_match = _best_match if state["meta"].get("grouping") == "connected components" else _first_match
+    prev = state["rows"].set_index("account")
+    present = prev.index[prev["present"]]
+    ids = df[ID_COLUMN].astype(str)
+    checksums = df[CHECKSUM_COLUMN].astype(str)
+    known = ids.isin(prev.index).to_numpy()
+    unchanged = known.copy()
+    unchanged[known] = (prev.loc[ids[known], "checksum"].to_numpy() == checksums[known].to_numpy())
+    changed = int((known & ~unchanged).sum())
+
+    # A changed account no longer stands for its old group / cluster: the
+    # unchanged accounts based on it are matched again as well
+    retired = pd.Index(ids[known & ~unchanged])
+    if len(retired):
+        stored = prev.loc[ids[unchanged]]
+        unchanged[unchanged] = ~(stored["base"].isin(retired) | stored["rep"].isin(retired)).to_numpy()
+    fresh = np.flatnonzero(~unchanged)
+
+    # Steps 1-2 only for new / changed accounts
+    df = df.copy()
+    cleaned = pd.Series(prev["cleaned"].reindex(ids).to_numpy(), index=df.index, dtype=object)
+    sou = pd.Series(prev["sou_category"].reindex(ids).to_numpy(), index=df.index, dtype=object)
+    if len(fresh):
+        subset = df.iloc[fresh]
+        cleaned.iloc[fresh] = clean_column(subset['Account Name'], "account", engine).to_numpy()
+        sou.iloc[fresh] = get_ruleset("sou_category").apply(subset).to_numpy()
+    df['Cleaned Name'] = cleaned
+    df['SOU Category'] = sou
+
+    # Stored groups / clusters that still have an unchanged member (an account
+    # that left the file can still be a group base or representative)
+    kept_rows = prev.loc[ids[unchanged]]
+    live_bases = set(kept_rows["base"])
+    live_reps = set(kept_rows["rep"])
+    bases = pd.Series(kept_rows["base"].to_numpy(), index=ids[unchanged].to_numpy())
+    reps = pd.Series(kept_rows["rep"].to_numpy(), index=ids[unchanged].to_numpy())
+
+    # Group bases by SOU Category and cluster representatives by Country, in stored order
+    base_lists, rep_lists, names = {}, {}, dict(zip(prev.index, prev["cleaned"]))
+    for account, row in prev.iterrows():
+        if account in live_bases:
+            base_lists.setdefault(row["sou_category"], []).append(account)
+        if account in live_reps and pd.notna(row["country"]):
+            rep_lists.setdefault(row["country"], []).append(account)
+    new_clusters = []
+
+    # Steps 3-4 for new / changed accounts: first stored group base / cluster
+    # representative above the cutoff, else the account starts its own
+    countries = _countries(df)
+    for i in fresh:
+        account, name = ids.iloc[i], cleaned.iloc[i]
+        names[account] = name
+
+        candidates = base_lists.setdefault(sou.iloc[i], [])
+        hit = group_match(name, [names[a] for a in candidates], group_cutoff)
+        if hit is None:
+            candidates.append(account)
+            bases[account] = account
+        else:
+            bases[account] = candidates[hit]
+
+        country = countries[i]
+        candidates = rep_lists.setdefault(country, []) if country is not None else []
+        hit = _first_match(name, [names[a] for a in candidates], dedup_cutoff)
+        if hit is None:
+            if country is not None:
+                candidates.append(account)
+            reps[account] = account
+            new_clusters.append(account)
+        else:
+            reps[account] = candidates[hit]
+
+    bases, reps = bases.reindex(ids).to_numpy(), reps.reindex(ids).to_numpy()
+
+    # Members in stored order first, then new accounts in file order
+    stored_order = pd.Series(np.arange(len(prev)), index=prev.index)
+    order = np.lexsort((np.arange(len(df)), stored_order.reindex(ids).fillna(len(prev)).to_numpy()))
+    members = {}
+    for i in order:
+        members.setdefault(reps[i], []).append(i)
+
+    # Kept account per cluster: reused when the cluster is untouched
+    touched = set(reps[fresh]) | set(prev.loc[present.difference(ids[unchanged]), "rep"])
+    is_customer = (df['Business Type'] == 'Customer').to_numpy()
+    position = pd.Series(np.arange(len(df)), index=ids.to_numpy())
+    keep, cluster_reps, cluster_kept = [], [], []
+    stored_clusters = state["clusters"][~state["clusters"]["rep"].isin(retired)]
+    for rep, kept in zip(stored_clusters["rep"].tolist() + new_clusters,
+                         stored_clusters["kept"].tolist() + [None] * len(new_clusters)):
+        if rep not in members:
+            continue  # every member was removed or moved
+        row = position[kept] if rep not in touched and kept in position.index else keep_row(members[rep], is_customer)
+        keep.append(row)
+        cluster_reps.append(rep)
+        cluster_kept.append(ids.iloc[row])
+
+    group_names = [group_prefix(names[base]) for base in bases]
+    df['Account Group Name Cleaned'] = group_names
+    final_df = finalize_accounts(df.iloc[keep])
+
+    rows = _state_rows(df, bases, reps).iloc[order].reset_index(drop=True)
+    # Bases / representatives that left the file are kept for their names
+    gone = prev.loc[sorted((set(bases) | set(reps)) - set(ids), key=prev.index.get_loc)]
+    if len(gone):
+        gone = gone.reset_index().assign(present=False)[rows.columns]
+        rows = pd.concat([rows, gone], ignore_index=True)
+    clusters = pd.DataFrame({"rep": cluster_reps, "kept": cluster_kept})
+
+    stats = {"reused": int(unchanged.sum()), "new": int((~known).sum()), "changed": changed,
+             "re-matched": len(fresh), "removed": len(present.difference(ids))}
+    return final_df, rows, clusters, stats
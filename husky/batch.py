@@ -0,0 +1,165 @@
+"""Process every sheet of every uploaded workbook in one run.
+
+Vendor workbooks often hold one sheet per month or per country. ``run_sheets``
+sends each (file, sheet) to a worker process, which detects that sheet's own
+header row, reads it through the shared Parquet cache and applies the tool's
+function ("module:function", as in husky/pipeline.json). Sheets without the
+required columns are skipped and reported rather than failing the run.
+
+The results are either merged into one frame with 'Source File' / 'Source
+Sheet' columns in front (``merge_results``), or written one output sheet per
+input sheet (``write_workbook``).
+"""
+
+import importlib
+import io
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+from openpyxl.styles import PatternFill
+
+from husky.disk_cache import file_bytes
+from husky.dtypes import compact_frame
+from husky.upload_cache import load_sheet, sheet_names
+
+SOURCE_FILE = "Source File"
+SOURCE_SHEET = "Source Sheet"
+OUTPUT_MODES = ("one merged sheet", "one sheet per input sheet")
+MAX_WORKERS = int(os.environ.get("HUSKY_BATCH_WORKERS", "0")) or None  # None: one per CPU
+
+
+def detect_header(data: bytes, sheet, required_columns, max_rows=10):
+    for header_row in range(max_rows):
+        try:
+            df_sample = pd.read_excel(io.BytesIO(data), sheet_name=sheet, header=header_row, nrows=1)
+            if all(col in df_sample.columns for col in required_columns):
+                return header_row
+        except Exception:
+            continue
+    return None
+
+
+def list_sheets(files):
+    """``(file name, bytes, sheet)`` for every sheet of every uploaded xlsx."""
+    jobs = []
+    for file in files:
+        data = file_bytes(file)
+        for sheet in sheet_names(data):
+            jobs.append((getattr(file, "name", str(file)), data, sheet))
+    return jobs
+
+
+def _run_sheet(function, data, sheet, required_columns, kwargs):
+    t0 = time.perf_counter()
+    header = detect_header(data, sheet, required_columns)
+    if header is None:
+        return {"header": None, "df": None, "seconds": time.perf_counter() - t0,
+                "error": f"no {', '.join(required_columns)} header in the first 10 rows"}
+    df, _ = load_sheet(data, sheet, header)
+    module, name = function.split(":")
+    out = getattr(importlib.import_module(module), name)(compact_frame(df), **kwargs)
+    return {"header": header, "df": out, "seconds": time.perf_counter() - t0, "error": None}
+
+
+def run_sheets(files, function, required_columns, kwargs=None, max_workers=MAX_WORKERS, on_done=None):
+    """Apply ``function(df, **kwargs)`` to every sheet; returns one result dict per sheet, in upload order.
+
+    Each dict has 'file', 'sheet', 'header', 'df' (None when skipped),
+    'error' and 'seconds'. ``on_done(result, finished, total)`` is called as
+    sheets finish.
+    """
+    kwargs = kwargs or {}
+    jobs = list_sheets(files)
+    results = [None] * len(jobs)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_run_sheet, function, data, sheet, list(required_columns), kwargs): i
+                   for i, (_, data, sheet) in enumerate(jobs)}
+        for finished, future in enumerate(as_completed(futures), start=1):
+            i = futures[future]
+            file_name, _, sheet = jobs[i]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"header": None, "df": None, "seconds": 0.0, "error": f"{type(e).__name__}: {e}"}
+            results[i] = {"file": file_name, "sheet": sheet, **result}
+            if on_done is not None:
+                on_done(results[i], finished, len(jobs))
+    return results
+
+
+def summary(results) -> pd.DataFrame:
+    return pd.DataFrame([{
+        "File": r["file"], "Sheet": r["sheet"],
+        "Header row": r["header"] + 1 if r["header"] is not None else None,
+        "Rows": len(r["df"]) if r["df"] is not None else 0,
+        "Seconds": round(r["seconds"], 2),
+        "Status": r["error"] or "✅ processed",
+    } for r in results])
+
+
+def merge_results(results) -> pd.DataFrame:
+    """Processed sheets stacked in upload order, with their source in the first two columns."""
+    frames = []
+    for r in results:
+        if r["df"] is None:
+            continue
+        df = r["df"].copy()
+        df.insert(0, SOURCE_SHEET, r["sheet"])
+        df.insert(0, SOURCE_FILE, r["file"])
+        frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=[SOURCE_FILE, SOURCE_SHEET])
+    # Categoricals with different categories per sheet would fall back to object anyway
+    frames = [f.astype({c: object for c in f.columns if isinstance(f[c].dtype, pd.CategoricalDtype)}) for f in frames]
+    return pd.concat(frames, ignore_index=True, sort=False)
+
+
+def output_sheet_names(results):
+    """Excel-safe, unique output sheet names; the file name is only added with several files."""
+    several_files = len({r["file"] for r in results}) > 1
+    names, used = [], set()
+    for r in results:
+        stem = re.sub(r"\.xlsx?$", "", r["file"], flags=re.I)
+        name = f"{stem} - {r['sheet']}" if several_files else str(r["sheet"])
+        name = re.sub(r"[\[\]:*?/\\]", "_", name)[:31]
+        base, n = name, 2
+        while name.lower() in used:
+            suffix = f" ({n})"
+            name, n = base[:31 - len(suffix)] + suffix, n + 1
+        used.add(name.lower())
+        names.append(name)
+    return names
+
+
+def write_workbook(sheets, highlight_cols=(), numeric_cols=()) -> bytes:
+    """xlsx bytes with one sheet per ``{name: df}`` item, headers highlighted as in the single-sheet exports."""
+    highlight_fill = PatternFill(start_color="FFF9C4", end_color="FFF9C4", fill_type="solid")  # Light yellow
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, index=False, sheet_name=name)
+            ws = writer.sheets[name]
+            for col_idx, col in enumerate(df.columns, start=1):
+                if col in highlight_cols:
+                    ws.cell(row=1, column=col_idx).fill = highlight_fill
+                if col in numeric_cols:
+                    for (cell,) in ws.iter_rows(min_row=2, min_col=col_idx, max_col=col_idx):
+                        if isinstance(cell.value, (int, float)):
+                            cell.number_format = '#,##0'
+    return output.getvalue()
+
+
+def results_workbook(results, mode, highlight_cols=(), numeric_cols=(), merged_name="Merged") -> bytes:
+    """The batch output in ``mode``; a 'Summary' sheet (``summary``) stands in when every sheet was skipped."""
+    processed = [r for r in results if r["df"] is not None]
+    if mode == OUTPUT_MODES[0]:
+        sheets = {merged_name: merge_results(processed)}
+    else:
+        sheets = dict(zip(output_sheet_names(processed), (r["df"] for r in processed)))
+    if not sheets:
+        # openpyxl cannot save a workbook without a visible sheet
+        sheets = {"Summary": summary(results)}
+    return write_workbook(sheets, highlight_cols, numeric_cols)
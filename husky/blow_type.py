@@ -0,0 +1,63 @@
+"""Product Type Focus (Single Stage / Linear Blower) rules from Blow_Type.py.
+
+- Supplier Cleaned Final in {1BLOW SAS, CHUMPOWER MACHINERY, SIAPI, SIDE INDIA} => Linear Blower
+- Supplier Cleaned Final in {AOKI TECHNICAL LABORATORY INC, NISSEI ASB} => Single Stage
+- Supplier Cleaned Final == SIPA:
+      If Product Description contains 'Linear' or 'XTRA' => Linear Blower
+      If Product Description contains 'ECS'            => Single Stage
+- Otherwise blank
+"""
+
+import pandas as pd
+
+LINEAR_BLOWER_SUPPLIER_KEYWORDS = {
+    "1BLOW", "CHUMPOWER", "SIAPI", "SIDE INDIA"  # add more keywords if needed
+}
+
+SINGLE_STAGE_SUPPLIER_KEYWORDS = {
+    "AOKI", "NISSEI", "ASB"   # as requested
+}
+
+NEW_COL = "Product Type Focus (Single Stage/ Linear Blower)"
+REQUIRED_COLUMNS = ["Supplier Cleaned Final", "Product Description"]
+
+
+def classify_row(supplier, description) -> str:
+    # safe normalize
+    s = str(supplier).upper() if pd.notna(supplier) else ""
+    d = str(description).upper() if pd.notna(description) else ""
+
+    # SIPA special rule first
+    if "SIPA" in s:
+        if ("LINEA" in d) or ("XTRA" in d) or ("SFL" in d):
+            return "Linear Blower"
+        if "ECS" in d:
+            return "Single Stage"
+        # if SIPA but no keyword, fall through to generic contains checks
+
+    # Contains-match for Single Stage (AOKI/NISSEI/ASB)
+    if any(k in s for k in SINGLE_STAGE_SUPPLIER_KEYWORDS):
+        return "Single Stage"
+
+    # Contains-match for Linear Blower
+    if any(k in s for k in LINEAR_BLOWER_SUPPLIER_KEYWORDS):
+        return "Linear Blower"
+
+    # No decision
+    return ""
+
+
+def insert_next_to(df: pd.DataFrame, after_col: str, new_col: str, values) -> pd.DataFrame:
+    out = df.copy()
+    pos = out.columns.get_loc(after_col) + 1
+    out.insert(pos, new_col, values)
+    return out
+
+
+def classify_blow_type(df: pd.DataFrame) -> pd.DataFrame:
+    """Copy of ``df`` with NEW_COL inserted immediately after 'Product Description'."""
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing required column(s): {', '.join(missing)}")
+    vals = [classify_row(s, d) for s, d in zip(df["Supplier Cleaned Final"], df["Product Description"])]
+    return insert_next_to(df, "Product Description", NEW_COL, vals)
@@ -0,0 +1,84 @@
+"""Resumable long matching stages.
+
+A long loop (business-type matching over the distinct lookup companies,
+pair scoring block by block) saves what it has finished to local disk as it
+goes: how many items are done and their partial results. A ``Checkpoint``
+is keyed by a fingerprint of the stage's inputs, so rerunning the same
+stage on the same inputs after a crash or a closed browser tab continues
+after the last saved batch. A different input gives a different key and
+starts from scratch. The checkpoint is removed once the stage finishes.
+
+Saves are atomic (temp file + rename) and happen at most every
+``HUSKY_CHECKPOINT_SECONDS`` (the last batch is always saved).
+"""
+
+import os
+import pickle
+import tempfile
+import time
+
+from husky.disk_cache import CACHE_ROOT
+
+CHECKPOINT_DIR = CACHE_ROOT / "checkpoints"
+INTERVAL = float(os.environ.get("HUSKY_CHECKPOINT_SECONDS", "30"))
+BATCH = 500  # items between save checks
+
+
+class Checkpoint:
+    def __init__(self, name: str, key: str, interval=INTERVAL):
+        self.path = CHECKPOINT_DIR / f"{name}-{key}.pkl"
+        self.interval = interval
+        self.resumed = 0  # items restored by the last ``load``
+        self._saved_at = time.monotonic()
+
+    def load(self):
+        """``(done, state)`` of the last save, or ``(0, None)``."""
+        try:
+            with open(self.path, "rb") as f:
+                done, state = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+            done, state = 0, None
+        self.resumed = done
+        return done, state
+
+    def save(self, done, state, force=False):
+        """Store progress if ``interval`` seconds passed since the last save (or ``force``)."""
+        if not force and time.monotonic() - self._saved_at < self.interval:
+            return
+        try:
+            CHECKPOINT_DIR.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=CHECKPOINT_DIR, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    pickle.dump((done, state), f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, self.path)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+        except OSError:
+            pass  # a full or read-only disk only costs the resume
+        self._saved_at = time.monotonic()
+
+    def clear(self):
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def resumable_map(function, items, checkpoint=None, batch=BATCH, on_progress=None):
+    """``[function(item) for item in items]``, resuming from and saving to ``checkpoint`` batch by batch."""
+    items = list(items)
+    results = []
+    if checkpoint is not None:
+        _, saved = checkpoint.load()
+        if saved is not None and len(saved) <= len(items):
+            results = saved
+        checkpoint.resumed = len(results)
+    for start in range(len(results), len(items), batch):
+        results.extend(function(item) for item in items[start:start + batch])
+        if checkpoint is not None:
+            checkpoint.save(len(results), results, force=len(results) == len(items))
+        if on_progress is not None:
+            on_progress(len(results), len(items))
+    return results
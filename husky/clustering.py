@@ -0,0 +1,171 @@
+"""Buyer / Supplier brand clustering (Clean_Up_Shipper_and_Consignee.py).
+
+Rows whose original name carries a priority brand keyword take that brand
+and are never compared (they never become cluster masters either), so the
+overrides are found first, once per distinct name, and those rows are left
+out of blocking and pair scoring.
+"""
+
+import numpy as np
+from rapidfuzz import fuzz
+
+from husky.blocking import BLOCK_KEYS, MAX_BLOCK, brand_blocks_report, multi_key_blocks
+from husky.dtypes import map_distinct
+from husky.rules import get_ruleset
+from husky.similarity import PairScores
+from husky.text import clean_column
+
+CLUSTER_CUTOFF = 80
+SCORE_FLOOR = 70  # lowest threshold the stored pair scores can serve
+
+TEMP_COLUMNS = ['Buyer Cleaned', 'Supplier Cleaned', 'Buyer Brand', 'Supplier Brand']
+
+
+# === Cleaning Functions ===
+def extract_brand(name):
+    words = name.split()
+    return words[0] if words else ""
+
+
+# === Priority brand map ===
+# Keyword -> brand overrides live in the "priority_brands" rule table (husky/rules.json),
+# compiled into one matcher and run once per distinct name
+def apply_priority(names):
+    return map_distinct(names, get_ruleset("priority_brands").keyword_lookup("Name"), batch=True)
+
+
+def score_clusters(df, entity_col, cleaned_col, brand_col, engine="python", floor=SCORE_FLOOR,
+                   blocking="brand", block_keys=BLOCK_KEYS, max_block=MAX_BLOCK):
+    """Clean and group ``entity_col`` and score the name pairs inside every block once.
+
+    ``blocking="brand"`` compares names within their brand group (first
+    cleaned word) and clusters group by group, as the original tool did.
+    ``"multi-key"`` compares names sharing any of ``block_keys`` (husky/blocking.py)
+    and clusters all rows in one pass, sorted by cleaned name.
+
+    Rows with a priority brand override are left out of the blocks. The
+    returned dict is everything ``assign_clusters`` needs to apply any
+    threshold >= ``floor``; 'blocks' is the block-size report of the
+    scored rows and 'overridden' the number of rows with an override.
+    """
+    df = df.reset_index(drop=True)
+    df[cleaned_col] = clean_column(df[entity_col], "brand", engine)
+    df[brand_col] = df[cleaned_col].apply(extract_brand)
+    priority = apply_priority(df[entity_col]).tolist()
+
+    if blocking == "multi-key":
+        order = df.sort_values(cleaned_col, kind="stable").index.tolist()
+        bounds = [(0, len(order))] if order else []
+        frame = df.iloc[order].reset_index(drop=True)
+        cleaned = frame[cleaned_col].tolist()
+        fuzzy = np.flatnonzero([not priority[i] for i in order])
+        blocks, report = multi_key_blocks([cleaned[i] for i in fuzzy], block_keys, max_block)
+        blocks = [fuzzy[b] for b in blocks]
+    else:
+        # Rows laid out group by group, sorted by cleaned name inside each group
+        order, bounds = [], []
+        for brand, group in df.groupby(brand_col):
+            group = group.sort_values(cleaned_col)
+            bounds.append((len(order), len(order) + len(group)))
+            order.extend(group.index)
+
+        frame = df.iloc[order].reset_index(drop=True)
+        cleaned = frame[cleaned_col].tolist()
+        fuzzy = np.array([not priority[i] for i in order], dtype=bool)
+        blocks = [lo + np.flatnonzero(fuzzy[lo:hi]) for lo, hi in bounds]
+        brands = frame[brand_col].tolist()
+        report = brand_blocks_report([cleaned[i] for i in np.flatnonzero(fuzzy)],
+                                     [brands[i] for i in np.flatnonzero(fuzzy)])
+    return {
+        "frame": frame,
+        "order": np.asarray(order, dtype=np.int64),
+        "bounds": bounds,
+        "priority": [priority[i] for i in order],
+        "pairs": PairScores.within_blocks(cleaned, blocks, fuzz.token_set_ratio, floor),
+        "entity_col": entity_col,
+        "blocks": report,
+        "overridden": sum(1 for p in priority if p),
+    }
+
+
+def assign_clusters(scored, final_col, threshold=CLUSTER_CUTOFF):
+    """Pick each row's master name: the best-scoring earlier master above ``threshold``."""
+    pairs = scored["pairs"]
+    if threshold < pairs.floor:
+        raise ValueError(f"Threshold {threshold} is below the stored score floor {pairs.floor}")
+    originals = scored["frame"][scored["entity_col"]].tolist()
+    priority = scored["priority"]
+    cleaned_names = [None] * len(originals)
+
+    for lo, hi in scored["bounds"]:
+        masters = set()
+        for index in range(lo, hi):
+            # Priority rule check
+            if priority[index]:
+                cleaned_names[index] = priority[index]
+                continue
+
+            best_score = 0
+            best_master = None
+            for master, score in zip(*pairs.earlier(index, threshold)):
+                if master in masters and score > best_score:
+                    best_score = score
+                    best_master = master
+
+            if best_master is not None:
+                cleaned_names[index] = originals[best_master]
+            else:
+                cleaned_names[index] = originals[index]
+                masters.add(index)
+
+    out = scored["frame"].copy()
+    out[final_col] = cleaned_names
+    return out
+
+
+def cluster_names(df, entity_col, cleaned_col, brand_col, final_col, engine="python", threshold=CLUSTER_CUTOFF,
+                  blocking="brand"):
+    scored = score_clusters(df, entity_col, cleaned_col, brand_col, engine, blocking=blocking)
+    return assign_clusters(scored, final_col, threshold)
+
+
+def score_buyers_and_suppliers(df, engine="python", blocking="brand"):
+    """Pair scores for Buyer, then Supplier (laid out in the Buyer clustering's row order)."""
+    buyers = score_clusters(df, 'Buyer', 'Buyer Cleaned', 'Buyer Brand', engine, blocking=blocking)
+    suppliers = score_clusters(buyers["frame"], 'Supplier', 'Supplier Cleaned', 'Supplier Brand', engine,
+                               blocking=blocking)
+    return buyers, suppliers
+
+
+def assign_buyers_and_suppliers(scored, threshold=CLUSTER_CUTOFF):
+    """Apply ``threshold`` to both clusterings, then reorder, drop temp columns and sort."""
+    buyers, suppliers = scored
+    buyer_final = assign_clusters(buyers, 'Buyer Cleaned Final', threshold)['Buyer Cleaned Final'].to_numpy()
+    frame = suppliers["frame"].copy()
+    frame.insert(frame.columns.get_loc('Supplier Cleaned'), 'Buyer Cleaned Final', buyer_final[suppliers["order"]])
+    df = assign_clusters({**suppliers, "frame": frame}, 'Supplier Cleaned Final', threshold)
+    return finalize_clusters(df)
+
+
+def cluster_buyers_and_suppliers(df, engine="python", threshold=CLUSTER_CUTOFF, blocking="brand"):
+    """Add 'Buyer/Supplier Cleaned Final' next to their source columns and sort by them."""
+    return assign_buyers_and_suppliers(score_buyers_and_suppliers(df, engine, blocking), threshold)
+
+
+def finalize_clusters(df):
+    # Reorder & drop temp columns
+    cols = df.columns.tolist()
+
+    if 'Buyer' in cols and 'Buyer Cleaned Final' in cols:
+        cols.insert(cols.index('Buyer') + 1, cols.pop(cols.index('Buyer Cleaned Final')))
+    if 'Supplier' in cols and 'Supplier Cleaned Final' in cols:
+        cols.insert(cols.index('Supplier') + 1, cols.pop(cols.index('Supplier Cleaned Final')))
+
+    # Remove temp/generated columns
+    df = df.drop(columns=[col for col in TEMP_COLUMNS if col in df.columns])
+    df = df[[col for col in cols if col in df.columns]]
+
+    # Final sort
+    if 'Buyer Cleaned Final' in df.columns and 'Supplier Cleaned Final' in df.columns:
+        df = df.sort_values(['Buyer Cleaned Final', 'Supplier Cleaned Final'])
+    return df
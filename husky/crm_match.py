@@ -0,0 +1,217 @@
+"""CRM business-type matching for lookup companies (Matching_Classification_Tool.py).
+
+The original matcher walked every CRM row for every lookup row and skipped
+those with a different 4-letter prefix. ``build_crm_blocks`` groups the CRM
+rows by prefix once, in file order, so each lookup only visits its own block;
+the decision rules are unchanged. Distinct (name, country, prefix) triples
+are matched once, in batches that can be checkpointed (husky/checkpoint.py).
+
+The A/B/C/D/F/N classification and the output workbook live here too, so
+the whole run can also go to a background job (``matching_job``).
+"""
+
+import re
+from io import BytesIO
+
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.styles import Font, PatternFill
+from rapidfuzz import fuzz
+
+from husky.checkpoint import Checkpoint, resumable_map
+from husky.result_cache import put_result
+
+
+def get_prefix(name):
+    return re.sub(r'\s+', '', name)[:4]
+
+
+def get_threshold(name_len):
+    return 88 if name_len <= 12 else 80 if name_len <= 20 else 70
+
+
+def build_crm_blocks(db):
+    """Prefix -> ``(country, business type, cleaned account name, cleaned group name)`` rows in CRM order."""
+    blocks = {}
+    rows = zip(db['Prefix'], db['Country'], db['Business Type'], db['Cleaned Account Name'], db['Cleaned Group Name'])
+    for prefix, country, db_type, account, group in rows:
+        blocks.setdefault(prefix, []).append((str(country).strip().lower(), str(db_type).strip(), account, group))
+    return blocks
+
+
+def match_business_type(cleaned_name, country, prefix, blocks):
+    if not prefix.strip():
+        return "Not in CRM"
+
+    best_score = 0
+    same_country_type = None
+    other_region_customer = False
+    threshold = get_threshold(len(cleaned_name))
+
+    # 'Cleaned Name' is a copy of 'Cleaned Account Name', so two scores cover all three
+    for db_country, db_type, account, group in blocks.get(prefix, ()):
+        score = max(fuzz.token_set_ratio(cleaned_name, account), fuzz.token_set_ratio(cleaned_name, group))
+
+        if score >= 90 and (not country or db_country == country):
+            return db_type
+        if score >= 90 and db_country != country and db_type == "Customer":
+            other_region_customer = True
+        if score >= threshold and db_country == country and same_country_type is None:
+            same_country_type = db_type
+        if score > best_score:
+            best_score = score
+
+    if same_country_type:
+        return same_country_type
+    if other_region_customer:
+        return "Not in CRM (Customer in other region)"
+    if best_score >= (threshold - 5):
+        return "Other"
+    return "Not in CRM"
+
+
+def lookup_countries(lookup):
+    if 'Buying country' not in lookup.columns:
+        return pd.Series("", index=lookup.index)
+    return lookup['Buying country'].astype(object).map(lambda c: str(c).strip().lower())
+
+
+def match_business_types(lookup, blocks, checkpoint=None, on_progress=None):
+    """'Business Type Matched' for every lookup row ('Cleaned Company Name' and 'Prefix' already set).
+
+    With a ``checkpoint`` the distinct triples matched so far are saved as
+    the loop goes and a rerun resumes after them; it is removed when done.
+    ``on_progress`` gets ``(triples done, triples total)``.
+    """
+    keys = list(zip(lookup['Cleaned Company Name'], lookup_countries(lookup), lookup['Prefix']))
+    distinct = list(dict.fromkeys(keys))
+    types = resumable_map(lambda key: match_business_type(*key, blocks), distinct, checkpoint, on_progress=on_progress)
+    if checkpoint is not None:
+        checkpoint.clear()
+    matched = dict(zip(distinct, types))
+    return pd.Series([matched[key] for key in keys], index=lookup.index, dtype=object)
+
+
+# === Classification ===
+def year_columns(lookup):
+    """Year columns, sorted numerically."""
+    return sorted([col for col in lookup.columns if str(col).isdigit()], key=lambda x: int(x))
+
+
+def classify_company(row, years):
+    """A/B/C/D/F/N class of one lookup row ('Business Type Matched' set); ``years`` from ``year_columns``."""
+    num_years = len(years)
+    last_year = years[-1]
+    business_type = str(row.get("Business Type Matched", "")).strip().lower()
+    company_name = str(row.get("Company name", "")).strip().lower()
+    values = [row.get(y, 0) if pd.notna(row.get(y)) else 0 for y in years]
+    grand_total = sum(values)
+    last_year_value = row.get(last_year) or 0
+
+    if any(kw in business_type for kw in ["customer", "logistics", "trading"]) or \
+       any(kw in company_name for kw in ["logistics", "freight", "trading", "forwarding", "export"]):
+        return "D"
+    if "prospect" in business_type:
+        return "P"
+    if last_year_value > 20000:
+        if all(v == 0 for v in values[:-1]) or (max(values[:-1]) < 5000 and last_year_value > 30000):
+            return "B"
+    if last_year_value > 0:
+        non_zero = [v for v in values if v > 0]
+        if len(non_zero) >= 2 and all(non_zero[i] >= non_zero[i - 1] for i in range(1, len(non_zero))):
+            if grand_total >= num_years * 10000 or (last_year_value > 20000 and last_year_value >= 0.6 * grand_total):
+                return "C"
+    if grand_total >= num_years * 30000 and last_year_value > 30000:
+        return "A"
+    if (grand_total >= num_years * 30000 and last_year_value <= 30000) or \
+       (last_year_value > 0 and sum(1 for v in values if v > 0) >= 0.8 * num_years and grand_total >= 20000 * num_years):
+        return "F"
+    return "N"
+
+
+def classify_companies(lookup, business_types):
+    return lookup.assign(**{'Business Type Matched': business_types}).apply(
+        classify_company, axis=1, args=(year_columns(lookup),))
+
+
+def assemble_lookup(lookup, regions, business_types, classification):
+    """The output table (stage results are shared, so this works on a copy)."""
+    lookup = lookup.copy()
+    if regions is not None:
+        # Move the matched column to the right of "Buying country"
+        insert_pos = lookup.columns.get_loc("Buying country") + 1
+        lookup.insert(insert_pos, "Buying country Region", regions)
+    lookup['Business Type Matched'] = business_types
+    lookup['Classification'] = classification
+    lookup.drop(columns=["Cleaned Company Name", "Prefix"], inplace=True, errors="ignore")
+    return lookup
+
+
+def lookup_workbook(lookup) -> bytes:
+    """The output workbook: classification legend on top, year / total columns comma-formatted."""
+    temp_output = BytesIO()
+    lookup.to_excel(temp_output, index=False, engine='openpyxl')
+    temp_output.seek(0)
+
+    wb = load_workbook(temp_output)
+    ws = wb.active
+
+    # Insert classification rules
+    description = (
+        "Classification (PET Preform ONLY):\n"
+        "D = Customer/Logistics/Trading\n"
+        "P = Prospect in CRM\n"
+        "B = New and sudden growth >20K in latest year\n"
+        "C = Increasing trend + (Total >10K/year or (60% in latest year > 20k))\n"
+        "A = High-performing (Total >30K/year and latest year >30K)\n"
+        "F = Stable or reduced recently (Total > 30k/year and latest year <30k)\n"
+        "N = Not interesting to focus"
+    )
+
+    ws.insert_rows(1)
+    end_col = min(10, ws.max_column)
+    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=end_col)
+    ws.cell(row=1, column=1).value = description
+    ws.cell(row=1, column=1).fill = PatternFill(start_color="FFFACD", end_color="FFFACD", fill_type="solid")
+    ws.cell(row=1, column=1).font = Font(bold=True)
+
+    # Highlight headers
+    header_row = 2
+
+    # Collect all numeric-type columns (years and grand total or any number columns)
+    numeric_columns = []
+    for col_idx in range(1, ws.max_column + 1):
+        header = ws.cell(row=header_row, column=col_idx).value
+        if header is None:
+            continue
+        if re.match(r"^\d{4}$", str(header)) or "total" in str(header).lower():
+            numeric_columns.append(col_idx)
+
+    # Apply comma-style number format
+    for col_idx in numeric_columns:
+        for row in range(header_row + 1, ws.max_row + 1):
+            cell = ws.cell(row=row, column=col_idx)
+            if isinstance(cell.value, (int, float)):
+                cell.number_format = '#,##0'
+
+    final_output = BytesIO()
+    wb.save(final_output)
+    return final_output.getvalue()
+
+
+def matching_job(db, lookup, regions=None, checkpoint_key=None, cache_key=None, report=None):
+    """Business-type matching, classification and the workbook as a background job (husky/jobs.py)."""
+    report = report or (lambda **fields: None)
+    report(stage="Matching business types")
+    checkpoint = Checkpoint("business_types", checkpoint_key) if checkpoint_key else None
+    business_types = match_business_types(
+        lookup, build_crm_blocks(db), checkpoint,
+        on_progress=lambda done, total: report(progress=0.9 * done / total,
+                                               message=f"{done:,}/{total:,} distinct companies"))
+    report(stage="Classifying companies")
+    classification = classify_companies(lookup, business_types)
+    report(stage="Writing Excel")
+    data = lookup_workbook(assemble_lookup(lookup, regions, business_types, classification))
+    if cache_key:
+        put_result(cache_key, data)
+    return data
@@ -0,0 +1,95 @@
+"""Small on-disk LRU cache shared by the upload and result caches.
+
+Entries are single files named after their key. A file's modification time
+doubles as its last-access time (it is touched on every hit), and the oldest
+entries are removed once the directory grows past ``max_bytes``.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+CACHE_ROOT = Path(os.environ.get("HUSKY_CACHE_DIR", Path.home() / ".cache" / "husky"))
+
+
+def make_key(*parts) -> str:
+    """Stable hex key for any JSON-serializable parts."""
+    blob = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_bytes(file) -> bytes:
+    """Contents of an uploaded file, a path, or raw bytes."""
+    if isinstance(file, (bytes, bytearray)):
+        return bytes(file)
+    if hasattr(file, "getvalue"):
+        return file.getvalue()
+    with open(file, "rb") as f:
+        return f.read()
+
+
+class DiskCache:
+    def __init__(self, name: str, max_bytes: int, suffix: str = ""):
+        self.directory = CACHE_ROOT / name
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}{self.suffix}"
+
+    def get(self, key: str):
+        """Path of the cached entry (marked as recently used), or None."""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except OSError:  # missing, or the cache directory is unusable
+            return None
+        return path
+
+    def put(self, key: str, write) -> Path:
+        """Create an entry by calling ``write(tmp_path)``; the file is moved in atomically."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            write(tmp)
+            os.replace(tmp, self.path(key))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.evict()
+        return self.path(key)
+
+    def entries(self):
+        """(path, size, mtime) of every entry, least recently used first."""
+        if not self.directory.exists():
+            return []
+        found = []
+        for path in self.directory.glob(f"*{self.suffix}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            found.append((path, stat.st_size, stat.st_mtime))
+        return sorted(found, key=lambda e: e[2])
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
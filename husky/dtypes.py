@@ -0,0 +1,113 @@
+"""Compact dtypes for the trade and CRM frames.
+
+Columns such as ``Country`` or ``Supplier`` hold a few hundred distinct
+values across millions of rows; storing them as ``category`` keeps one copy of
+each string plus small integer codes. Numeric columns are downcast only when
+the conversion is lossless, so exported values do not change.
+"""
+
+import numpy as np
+import pandas as pd
+
+CATEGORY_COLUMNS = (
+    "Country", "Buyer Country", "Supplier Country", "Supplier", "SOU", "SOU Category",
+    "Business Type", "Buyer Region", "Trade Direction", "Data Source", "Buying country",
+)
+NUMERIC_COLUMNS = ("Year", "Value", "Quantity")
+
+# Only convert when distinct values are at most this share of the rows
+MAX_UNIQUE_RATIO = 0.5
+
+
+def memory_usage(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True).sum())
+
+
+def _downcast(s: pd.Series) -> pd.Series:
+    if pd.api.types.is_integer_dtype(s) and not pd.api.types.is_extension_array_dtype(s):
+        if s.empty:
+            return s
+        lo, hi = s.min(), s.max()
+        for dtype in (np.int16, np.int32) if s.name == "Year" else (np.int32,):
+            info = np.iinfo(dtype)
+            if info.min <= lo and hi <= info.max:
+                return s.astype(dtype)
+        return s
+    if pd.api.types.is_float_dtype(s) and s.dtype != np.float32:
+        small = s.astype(np.float32)
+        if small.astype(s.dtype).equals(s):
+            return small
+    return s
+
+
+def compact_frame(df: pd.DataFrame,
+                  category_columns=CATEGORY_COLUMNS,
+                  numeric_columns=NUMERIC_COLUMNS) -> pd.DataFrame:
+    """Return ``df`` with repetitive text columns as categoricals and numbers downcast."""
+    out = df.copy()
+    n = len(out)
+    for col in category_columns:
+        if col not in out.columns:
+            continue
+        s = out[col]
+        if isinstance(s.dtype, pd.CategoricalDtype) or not (s.dtype == object or pd.api.types.is_string_dtype(s)):
+            continue
+        if n and s.nunique(dropna=True) <= n * MAX_UNIQUE_RATIO:
+            out[col] = s.astype("category")
+    for col in numeric_columns:
+        if col in out.columns:
+            out[col] = _downcast(out[col])
+    return out
+
+
+def memory_report(before: int, after: int) -> str:
+    saved = (1 - after / before) * 100 if before else 0.0
+    return f"🧮 Memory: {before / 1e6:,.1f} MB → {after / 1e6:,.1f} MB ({saved:.0f}% less)"
+
+
+def map_distinct(series: pd.Series, func, batch: bool = False) -> pd.Series:
+    """Apply ``func`` once per distinct value (category code) and broadcast the results.
+
+    Equivalent to ``series.apply(func)`` but the work scales with the number of
+    distinct values instead of the number of rows. Missing values are passed to
+    ``func`` as-is, once per kind of missing value (NaN, None, ...). With ``batch=True`` ``func`` receives the list of
+    distinct values and returns a list of results.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy().astype(np.int64)
+        uniques = list(series.cat.categories)
+    else:
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        uniques = list(uniques)
+    missing = np.flatnonzero(codes == -1)
+    if len(missing):
+        slots = {}
+        for pos, value in zip(missing, series.to_numpy(dtype=object)[missing]):
+            if type(value) not in slots:
+                slots[type(value)] = len(uniques)
+                uniques.append(value)
+            codes[pos] = slots[type(value)]
+    results = func(uniques) if batch else [func(u) for u in uniques]
+    values = np.empty(len(uniques), dtype=object)
+    values[:] = list(results)
+    return pd.Series(values[codes], index=series.index, dtype=object)
+
+
+def category_blocks(series: pd.Series):
+    """Category codes per row plus the sorted row positions of each code.
+
+    Rows with a missing value get code ``-1`` and no block, matching the
+    ``a != b`` semantics of the row-by-row loops (NaN never equals NaN).
+    """
+    codes = series.astype("category").cat.codes.to_numpy()
+    blocks = pd.Series(np.arange(len(codes))).groupby(codes).indices
+    blocks.pop(-1, None)
+    return codes, blocks
+
+
+def later_in_block(blocks, codes, i):
+    """Positions after ``i`` that share its category code."""
+    block = blocks.get(codes[i])
+    if block is None:
+        return []
+    return block[np.searchsorted(block, i, side="right"):].tolist()
@@ -0,0 +1,321 @@
+"""Output-equivalence harness: frozen reference implementations vs the current engines.
+
+Every check runs the oracle from husky/reference.py and each candidate engine
+on the same data, diffs the output columns row by row and reports the
+mismatch count next to the speed-up. Data is generated (``--rows``) or read
+from recorded Excel / CSV files:
+
+    python -m husky.equivalence
+    python -m husky.equivalence --only accounts cluster_names --rows 300
+    python -m husky.equivalence --trade trade.xlsx --patterns regex.xlsx --crm crm.xlsx:Accounts
+
+Engines marked approximate (the trigram index) are reported but may differ;
+any mismatch from an exact engine makes the exit status 1.
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from husky import reference
+from husky.text import TEXT_ENGINES
+
+WEBSITE_THRESHOLD = 70
+
+
+# === Diffing ===
+def diff_frames(expected: pd.DataFrame, got: pd.DataFrame, columns=None) -> pd.DataFrame:
+    """One row per differing cell (row position, column, expected, got); missing on both sides counts as equal."""
+    columns = list(expected.columns) if columns is None else list(columns)
+    n = min(len(expected), len(got))
+    diffs = []
+    if len(expected) != len(got):
+        diffs.append({"row": -1, "column": "<row count>", "expected": len(expected), "got": len(got)})
+    for col in columns:
+        if col not in got.columns:
+            diffs.append({"row": -1, "column": col, "expected": "<column>", "got": "<missing>"})
+            continue
+        e = expected[col].astype(object).to_numpy()[:n]
+        g = got[col].astype(object).to_numpy()[:n]
+        same = (e == g) | (pd.isna(e) & pd.isna(g))
+        for i in np.flatnonzero(~same):
+            diffs.append({"row": int(i), "column": col, "expected": e[i], "got": g[i]})
+    return pd.DataFrame(diffs, columns=["row", "column", "expected", "got"])
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    if isinstance(out, pd.Series):
+        out = out.to_frame("value")
+    return out, time.perf_counter() - t0
+
+
+# === Checks ===
+# Each check takes the datasets and returns (reference callable, {engine: (callable, exact)});
+# every callable returns a frame (or series) with the columns to compare.
+def check_cluster_names(data):
+    from husky.clustering import cluster_names
+
+    cols = ['Buyer', 'Buyer Cleaned', 'Buyer Brand', 'Buyer Cleaned Final']
+    trade = data["trade"]
+
+    def ref():
+        return reference.cluster_names(trade.copy(), 'Buyer', 'Buyer Cleaned', 'Buyer Brand', 'Buyer Cleaned Final')[cols]
+
+    def engine(name):
+        return lambda: cluster_names(trade.copy(), 'Buyer', 'Buyer Cleaned', 'Buyer Brand', 'Buyer Cleaned Final', name)[cols]
+
+    return ref, {f"{name} text + stored pair scores": (engine(name), True) for name in TEXT_ENGINES}
+
+
+def check_match_business_type(data):
+    from husky.crm_match import build_crm_blocks, get_prefix, match_business_types
+    from husky.text import clean_column
+
+    db, lookup = data["crm"], data["lookup"]
+
+    def engine(name):
+        def run():
+            crm = db.copy()
+            crm['Cleaned Account Name'] = clean_column(crm['Account Name'], "crm", name)
+            crm['Cleaned Group Name'] = clean_column(crm['Account Group Name Cleaned'], "crm", name)
+            crm['Prefix'] = crm['Cleaned Account Name'].apply(get_prefix)
+            targets = lookup.copy()
+            targets['Cleaned Company Name'] = clean_column(targets['Company name'], "crm", name)
+            targets['Prefix'] = targets['Cleaned Company Name'].apply(get_prefix)
+            return match_business_types(targets, build_crm_blocks(crm))
+        return run
+
+    return (lambda: reference.match_business_types(db, lookup),
+            {f"{name} text + prefix blocks": (engine(name), True) for name in TEXT_ENGINES})
+
+
+def check_match_fuzzy_then_prefix(data):
+    from husky.websites import FUZZY_MODES, add_company_website
+
+    refs, targets = data["websites"], data["targets"]
+    args = (targets, refs, "Company Name", "Company Name", "Website")
+
+    def ref():
+        return reference.add_company_website(*args, threshold=WEBSITE_THRESHOLD)[["Company Website"]]
+
+    def engine(name, mode):
+        return lambda: add_company_website(*args, threshold=WEBSITE_THRESHOLD, engine=name, fuzzy_mode=mode)[["Company Website"]]
+
+    # The trigram index only re-scores its top-k candidates, so it is approximate
+    return ref, {f"{name} text + {mode}": (engine(name, mode), mode == "brute force")
+                 for name in TEXT_ENGINES for mode in FUZZY_MODES}
+
+
+def check_extract_model(data):
+    from husky.imm import compile_patterns, extract_model
+
+    descriptions, patterns = data["trade"]["Product Description"], data["patterns"]
+
+    def ref():
+        return descriptions.apply(reference.extract_model, args=(patterns,))
+
+    def compiled():
+        return descriptions.apply(extract_model, args=(compile_patterns(patterns)[0],))
+
+    return ref, {"compiled patterns": (compiled, True)}
+
+
+def check_accounts(data):
+    from husky.accounts import cleanup_accounts, incremental_cleanup, score_accounts, state_from_full_run
+    from husky.rules import get_ruleset
+    from husky.text import clean_column
+
+    crm = data["crm"]
+
+    def prepare(name):
+        df = crm.reset_index(drop=True).copy()
+        df['Cleaned Name'] = clean_column(df['Account Name'], "account", name)
+        df['SOU Category'] = get_ruleset("sou_category").apply(df)
+        return df
+
+    def engine(name):
+        def run():
+            df = prepare(name)
+            return cleanup_accounts(df, *score_accounts(df))
+        return run
+
+    # An incremental run over the unchanged file must reproduce the full run
+    df = prepare("python")
+    rows, clusters = state_from_full_run(df, *score_accounts(df))
+    state = {"meta": {"group_cutoff": 85, "dedup_cutoff": 90}, "rows": rows.assign(present=True), "clusters": clusters}
+
+    candidates = {f"{name} text + stored pair scores": (engine(name), True) for name in TEXT_ENGINES}
+    candidates["incremental rerun (unchanged)"] = (lambda: incremental_cleanup(crm, state)[0], True)
+    return lambda: reference.cleanup_accounts(crm), candidates
+
+
+def check_filling_line(data):
+    from husky.filling_line import detect_applications, match_product_lines
+
+    trade = data["trade"][["Product Description"]]
+    match_df = pd.DataFrame({"Pattern": ["can", "GLASS", "E-MAC", "PET|ASEPTIC", "KEG", "FILL"],
+                             "Lines": ["Can line", "Glass line", "", "PET line", "Keg line", "Filling line"]})
+
+    def ref():
+        out = reference.match_products(trade, match_df)
+        out["Application"] = trade["Product Description"].apply(reference.detect_application)
+        return out[["Product", "Product Line", "Application"]]
+
+    def distinct():
+        out = trade.copy()
+        out["Product"], out["Product Line"] = match_product_lines(trade["Product Description"], match_df)
+        out["Application"] = detect_applications(trade["Product Description"])
+        return out[["Product", "Product Line", "Application"]]
+
+    return ref, {"distinct values + keyword matcher": (distinct, True)}
+
+
+CHECKS = {
+    "cluster_names": (check_cluster_names, ["trade"]),
+    "match_business_type": (check_match_business_type, ["crm", "lookup"]),
+    "match_fuzzy_then_prefix": (check_match_fuzzy_then_prefix, ["websites", "targets"]),
+    "extract_model": (check_extract_model, ["trade", "patterns"]),
+    "accounts": (check_accounts, ["crm"]),
+    "filling_line": (check_filling_line, ["trade"]),
+}
+
+
+REPORT_COLUMNS = ["check", "engine", "exact", "rows", "mismatched rows", "mismatched cells",
+                  "reference s", "engine s", "speed-up"]
+
+
+def run_checks(data, only=None, show=5):
+    """Report frame (one row per check and engine) and the first ``show`` differing cells per engine."""
+    rows, examples = [], {}
+    for name, (check, needs) in CHECKS.items():
+        if only and name not in only:
+            continue
+        missing = [key for key in needs if data.get(key) is None]
+        if missing:
+            rows.append({"check": name, "engine": f"skipped (no {', '.join(missing)} data)"})
+            continue
+        ref, candidates = check(data)
+        expected, ref_s = _timed(ref)
+        for engine, (fn, exact) in candidates.items():
+            got, engine_s = _timed(fn)
+            diffs = diff_frames(expected.reset_index(drop=True), got.reset_index(drop=True))
+            rows.append({
+                "check": name, "engine": engine, "exact": exact, "rows": len(expected),
+                "mismatched rows": diffs["row"].nunique(), "mismatched cells": len(diffs),
+                "reference s": round(ref_s, 3), "engine s": round(engine_s, 3),
+                "speed-up": round(ref_s / engine_s, 1) if engine_s else np.inf,
+            })
+            if len(diffs):
+                examples[(name, engine)] = diffs.head(show)
+    return pd.DataFrame(rows, columns=REPORT_COLUMNS).convert_dtypes(), examples
+
+
+# === Datasets ===
+_WORDS = ["Acme", "Berry", "Global", "Silgan", "Alpla", "Amcor", "Retal", "Plastipak", "Coca Cola", "Femsa",
+          "Nestle", "Danone", "Serac", "Krones", "Sidel", "Engel", "Netstal", "Arburg", "Huayan", "Nissei",
+          "Polimeros", "Envases", "Packaging", "Closures", "Medical", "Trading", "Logistics", "Plasticos"]
+_SUFFIXES = ["", "", " Inc", " Ltd.", " GmbH", " S.A.", " de Mexico", " Co.", " Group", " LLC", " S de RL"]
+# Blanks are NaN, as read_excel gives them (None would compare equal to None in the oracles)
+_COUNTRIES = ["Mexico", "Germany", "USA", "China", "Brazil", "United Kingdom", np.nan]
+
+
+def _names(rng, n, typo=0.15):
+    names = []
+    for _ in range(n):
+        name = " ".join(rng.choice(_WORDS, size=rng.integers(1, 4))) + rng.choice(_SUFFIXES)
+        if rng.random() < typo and len(name) > 4:
+            i = rng.integers(0, len(name) - 1)
+            name = name[:i] + name[i + 1:]
+        if rng.random() < 0.3:
+            name = name.upper()
+        names.append(name if rng.random() > 0.03 else np.nan)
+    return names
+
+
+def generated_data(rows=500, seed=0):
+    rng = np.random.default_rng(seed)
+    pool = _names(rng, max(rows // 3, 10))  # repeated names, like real exports
+    models = ["E-MAC 50/80", "ELION 1750-390", "ALLROUNDER 470 E 1500-400", "XFORM 350", "HY-300", "KW 250",
+              "AL-500-7", "ASB-70DPH", "SE180EV", "NO MODEL"]
+    # Filling line / application words come from their own stream so the other columns stay as they were
+    uses = np.random.default_rng(seed + 1).choice(
+        ["", "", " FOR WATER BOTTLES", " MILK AND JUICE", " CAN FILLING LINE BEER", " Glass filler - cerveza",
+         " ЛИНИЯ ДЛЯ ПИВО И СОК", " keg washer", " PET ASEPTIC TEA", " içecek dolum"], rows)
+    trade = pd.DataFrame({
+        "Buyer": rng.choice(np.array(pool, dtype=object), rows),
+        "Supplier": rng.choice(np.array(pool, dtype=object), rows),
+        "Product Description": [f"INJECTION MOLDING MACHINE {m}  USED{use}"
+                                for m, use in zip(rng.choice(models, rows), uses)],
+    })
+    patterns = [r"(E-MAC)\s?(\d+)/(\d+)", r"(ELION)\s?(\d+-\d+)", r"(ALLROUNDER)\s?(\d+\s?E)\s?(\d+-\d+)",
+                r"(XFORM)\s?(\d+)", r"(HY)-?(\d+)", r"(SE)(\d+)(EV)", r"(KW)\s?(\d+)", r"(AL)-(\d+)-(\d+)",
+                r"(ASB)-(\d+\w+)", r"([unclosed", r"MACHINE"]
+    crm = pd.DataFrame({
+        "(Do Not Modify) Account": [f"acc-{i}" for i in range(rows)],
+        "(Do Not Modify) Row Checksum": [f"ck-{i}" for i in range(rows)],
+        "Account Name": rng.choice(np.array(pool, dtype=object), rows),
+        "Account Group Name Cleaned": rng.choice(np.array(pool, dtype=object), rows),
+        "Country": rng.choice(np.array(_COUNTRIES, dtype=object), rows),
+        "Business Type": rng.choice(["Customer", "Prospect", "Competitor", "Other"], rows),
+        "SOU": rng.choice(["Hot Runners HRC", "PET Systems", "Medical", "Beverage", "MSP"], rows),
+    })
+    lookup = pd.DataFrame({
+        "Company name": _names(rng, rows),
+        "Buying country": rng.choice(np.array(_COUNTRIES, dtype=object), rows),
+    })
+    refs = pd.DataFrame({"Company Name": pool, "Website": [f"www.site{i}.com" if i % 7 else np.nan for i in range(len(pool))]})
+    targets = pd.DataFrame({"Company Name": _names(rng, rows)})
+    return {"trade": trade, "patterns": patterns, "crm": crm, "lookup": lookup, "websites": refs, "targets": targets}
+
+
+def read_recorded(path, rows=None):
+    """``file.xlsx``, ``file.xlsx:Sheet`` or ``file.csv`` (first ``rows`` rows)."""
+    path, _, sheet = path.partition(":") if not path[1:3] == ":\\" else (path, "", "")
+    if path.lower().endswith(".csv"):
+        df = pd.read_csv(path, nrows=rows)
+    else:
+        df = pd.read_excel(path, sheet_name=sheet or 0, nrows=rows)
+    df.columns = df.columns.str.strip() if df.columns.dtype == object else df.columns
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=list(CHECKS), help="checks to run (default: all)")
+    parser.add_argument("--rows", type=int, default=500, help="generated rows / rows read from recorded files")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--show", type=int, default=5, help="differing cells to print per engine")
+    for key, what in [("trade", "Buyer / Supplier / Product Description"), ("patterns", "regex pattern file"),
+                      ("crm", "CRM accounts"), ("lookup", "Company name / Country lookup"),
+                      ("websites", "Company Name / Website reference"), ("targets", "Company Name targets")]:
+        parser.add_argument(f"--{key}", help=f"recorded {what} file")
+    args = parser.parse_args(argv)
+
+    data = generated_data(args.rows, args.seed)
+    recorded = {key: getattr(args, key) for key in ["trade", "patterns", "crm", "lookup", "websites", "targets"]}
+    if any(recorded.values()):
+        # Recorded data replaces the generated data entirely, so checks
+        # missing a file are skipped rather than mixing the two
+        data = {key: read_recorded(path, args.rows) if path else None for key, path in recorded.items()}
+        if data["patterns"] is not None:
+            from husky.imm import load_patterns
+            data["patterns"] = load_patterns(data["patterns"])
+        if data["lookup"] is not None and "Country" in data["lookup"].columns:
+            data["lookup"] = data["lookup"].rename(columns={"Country": "Buying country"})
+
+    report, examples = run_checks(data, args.only, args.show)
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.max_colwidth", 40):
+        print(report.astype(object).where(report.notna(), "").to_string(index=False))
+        for (check, engine), diffs in examples.items():
+            print(f"\n{check} / {engine}:")
+            print(diffs.to_string(index=False))
+    failed = report["exact"].fillna(False) & report["mismatched cells"].fillna(0).gt(0)
+    return 1 if failed.any() else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,81 @@
+"""Product, Product Line and Application columns for Filling_line_Tool.py.
+
+Both steps work on the distinct descriptions (``map_distinct``) rather than
+on every row:
+
+- Product / Product Line: the match file's patterns in file order, each
+  claiming the descriptions no earlier pattern gave a line to.
+- Application: the first keyword of ``APPLICATION_KEYWORDS`` (list order,
+  not text order) found in the lowercased description, else blank. All
+  keywords are compiled into one lookahead alternation: at every position
+  it reports the first listed keyword starting there, so the lowest-ranked
+  keyword reported anywhere is the first listed keyword in the text.
+
+Product Line Classification is the "filling_line_classification" rule table
+(husky/rules.json).
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from husky.dtypes import map_distinct
+
+# Lowercased version of application keywords for reliable matching
+# (kept as shipped: "НАПИТКОВ " and 'agua' have no comma between them and form one keyword)
+APPLICATION_KEYWORDS_RAW = [
+    'water', 'milk', 'beer', 'juice', 'soft drink', 'carbonated', 'tea', 'coffee', 'energy drink',
+    'wine', 'soda', 'syrup', 'yogurt', 'liquid', 'beverage', 'dairy', 'cocktail', 'liqueur',
+    'mineral', 'spring', 'flavored', 'seltzer',
+    'молока', 'вода', 'сок', 'пиво'
+    , 'напиток', 'газированный','ГАЗИРОВАННЫХ',"НАПИТКОВ "
+    'agua', 'leche', 'cerveza', 'zumo', 'bebida', 'gaseosa',
+    'süt', 'bira', 'meyve suyu', 'içecek',
+    'paani', 'doodh', 'juice', 'sharab', 'cold drink'
+]
+APPLICATION_KEYWORDS = [kw.lower() for kw in APPLICATION_KEYWORDS_RAW]
+
+
+def keyword_matcher(keywords):
+    """One regex reporting, at every position, the first listed keyword that starts there."""
+    return re.compile("(?=(" + "|".join(re.escape(k) for k in keywords) + "))")
+
+
+def detect_applications(descriptions: pd.Series, keywords=APPLICATION_KEYWORDS) -> pd.Series:
+    """First keyword of ``keywords`` contained in each lowercased description, else ""."""
+    matcher = keyword_matcher(keywords)
+    rank = {}
+    for i, keyword in enumerate(keywords):
+        rank.setdefault(keyword, i)
+
+    def first_keyword(values):
+        found = pd.Series([str(v).lower() for v in values], dtype=object).str.findall(matcher)
+        return [keywords[min(rank[k] for k in hits)] if hits else "" for hits in found]
+
+    return map_distinct(descriptions, first_keyword, batch=True)
+
+
+def match_product_lines(descriptions: pd.Series, match_df: pd.DataFrame):
+    """``(Product, Product Line)``: the first match-file pattern (regex, upper-cased) found in each description."""
+    patterns = [str(p).strip().upper() for p in match_df["Pattern"]]
+    lines = [str(line).strip() for line in match_df["Lines"]]
+
+    def first_pattern(values):
+        # Position of the deciding pattern per value (-1: none); a pattern with a
+        # blank line leaves the value open for the next patterns, as the loop did
+        upper = pd.Series(values, dtype=object).str.upper()
+        chosen = np.full(len(values), -1)
+        open_ = np.ones(len(values), dtype=bool)
+        for i, (pattern, line) in enumerate(zip(patterns, lines)):
+            mask = open_ & upper.str.contains(pattern, na=False).to_numpy(dtype=bool)
+            chosen[mask] = i
+            if line != "":
+                open_ &= ~mask
+        return chosen.tolist()
+
+    chosen = map_distinct(descriptions, first_pattern, batch=True).to_numpy(dtype=np.int64)
+    product = np.array(patterns + [""], dtype=object)[chosen]
+    line = np.array(lines + [""], dtype=object)[chosen]
+    return (pd.Series(product, index=descriptions.index, dtype=object),
+            pd.Series(line, index=descriptions.index, dtype=object))
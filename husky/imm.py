@@ -0,0 +1,335 @@
+"""IMM machine model, tonnage and buyer application extraction.
+
+Buyer Potential Application comes from the Buyer -> Application file,
+compiled once per run by ``build_buyer_index``: the exact (upper-cased)
+names, the same names normalized like the brand clustering
+(``clean_column(..., "brand")``), and the normalized names grouped by first
+word. Each distinct buyer takes the first of: its exact name, its normalized
+name, the best ``fuzz.token_sort_ratio`` match >= ``BUYER_FUZZY_CUTOFF``
+among the file names sharing its first word. Buyers with none of these get
+the "buyer_application_fallback" rules.
+"""
+
+import re
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.styles import PatternFill
+from rapidfuzz import fuzz
+
+from husky.blocking import first_token
+from husky.dtypes import map_distinct
+from husky.regions import add_buyer_region
+from husky.rules import get_ruleset
+from husky.similarity import sparse_scores
+from husky.text import clean_column
+
+FINAL_ORDER = [
+    "Buyer", "Buyer Cleaned Final", "Buyer Potential Application", "Product Type Focus (Packaging/PET)",
+    "Application Sub Category",
+    "Buyer Country", "Buyer Region", "Supplier", "Supplier Cleaned Final", "Supplier Country",
+    "HS Code", "Product Description", "Product", "Model", "Model Series", "Tonnage", "Tonnage Range",
+    "Quantity", "Application", "Unit", "Value", "Trade Direction", "Date", "Year", "Data Source"
+]
+
+HIGHLIGHT_COLS = [
+    "Buyer Potential Application", "Product Type Focus (Packaging/PET)",
+    "Model", "Model Series", "Tonnage", "Tonnage Range"
+]
+NUMERIC_COLS = ["Tonnage", "Quantity", "Value", "Tonnage Range"]
+BUYER_FUZZY_CUTOFF = 90  # None: exact and normalized names only
+
+
+def load_patterns(patterns_df: pd.DataFrame) -> list:
+    patterns_df = patterns_df.copy()
+    patterns_df.columns = patterns_df.columns.str.strip()
+    return patterns_df['Pattern'].dropna().tolist()
+
+
+def compile_patterns(machine_patterns):
+    """``(compiled, errors)``: patterns that compile, and ``(position, pattern, message)`` for those that don't."""
+    compiled, errors = [], []
+    for i, pattern in enumerate(machine_patterns):
+        try:
+            compiled.append(re.compile(pattern))
+        except (re.error, TypeError) as e:
+            errors.append((i, pattern, str(e)))
+    return compiled, errors
+
+
+def pattern_errors_message(errors) -> str:
+    listed = "; ".join(f"#{i + 1} {pattern!r} ({message})" for i, pattern, message in errors)
+    return f"⚠️ {len(errors)} invalid regex pattern(s) skipped: {listed}"
+
+
+def build_buyer_map(buyer_df) -> dict:
+    if buyer_df is None:
+        return {}
+    buyer_df = buyer_df.copy()
+    buyer_df.columns = buyer_df.columns.str.strip()
+    # Blank Buyer cells would become several NaN keys, which Series.map rejects
+    buyer_df = buyer_df.dropna(subset=['Buyer'])
+    return dict(zip(buyer_df['Buyer'].str.upper().str.strip(), buyer_df['Buyer Potential Application']))
+
+
+# === Model extraction ===
+def model_text(description):
+    return str(description).upper().replace("  ", " ")
+
+
+def extract_model(description, machine_patterns):
+    """Model from the first pattern with capture groups that matches; ``machine_patterns`` are compiled."""
+    text = model_text(description)
+    for pattern in machine_patterns:
+        match = pattern.search(text)
+        if match:
+            groups = match.groups()
+            if not groups:
+                continue
+            series = groups[0].strip().title()
+            parts = [g.strip() for g in groups[1:] if g and g.strip()]
+            if not parts:
+                return series
+            if len(parts) == 1:
+                part = parts[0]
+                if "/" in part:
+                    return f"{series} {'-'.join(part.split('/'))}"
+                split_parts = re.findall(r'\d+[A-Z]?|\d{3,5}', part)
+                return f"{series} {'-'.join(split_parts)}" if split_parts else f"{series} {part}"
+            else:
+                cleaned_parts = [re.sub(r"\s+", "", p) for p in parts]
+                return f"{series} {'-'.join(cleaned_parts)}"
+    return ""
+
+
+def extract_model_series(model):
+    model = str(model).strip()
+    if not model:
+        return ""
+
+    # Match characters before the first number (optional space or hyphen included)
+    match = re.match(r'^([A-Za-z\- ]+)', model)
+    if match:
+        series = match.group(1).strip().replace("-", " ")
+        return re.sub(r'\s+', ' ', series).title()
+    return ""
+
+
+# === Tonnage extraction ===
+def extract_tonnage(row):
+    model = str(row.get("Model", "")).upper()
+    supplier = str(row.get("Supplier", "")).upper()
+    if not model:
+        return ""
+    try:
+        if "NETSTAL" in supplier:
+            m = re.search(r'(\d+)-\d+', model)
+            return round(int(m.group(1)) / 10, 1) if m else ""
+        elif any(s in supplier for s in ["DEMAG", "SUMITOMO", "UBE"]):
+            m = re.search(r'(\d{2,5})', model)
+            return int(m.group(1)) if m else ""
+        elif "ENGEL" in supplier:
+            numbers = re.findall(r'\d{2,5}', model)
+            if len(numbers) >= 2:
+                return round(int(numbers[1]), 1)
+        elif "ARBURG" in supplier:
+            m = re.findall(r'\d{3,5}', model)
+            return round(int(m[1]) / 10, 1) if len(m) >= 2 else ""
+        elif "BMB" in supplier:
+            m = re.search(r'(\d{2,5})', model)
+            return int(m.group(1)) * 10 if m else ""
+        elif any(s in supplier for s in ["AOKI", "NAIGAI"]):
+            m = re.search(r'AL[-\s]?[\dA-Z]+[-\s]?(\d{2,4})', model)
+            return int(m.group(1)) * 10 if m else ""
+        elif any(s in supplier for s in ["ASB", "NISSEI"]):
+            m = re.search(r'ASB[-\s]?(\d{2,4})', model)
+            if m:
+                return int(m.group(1))
+            m = re.search(r'(\d{2,4})', model)
+            return int(m.group(1)) if m else ""
+
+        # === New: HUAYAN and SACMI
+        elif any(s in supplier for s in ["HUAYAN", "SACMI"]):
+            m = re.search(r'[-\s]?(\d{2,4})', model)
+            return int(m.group(1)) if m else ""
+
+        # === New: SIPA XFORM and XTREME
+        elif "SIPA" in supplier or "XFORM" in model or "XTREME" in model:
+            if "XFORM" in model:
+                m = re.search(r'XFORM[-\s]?(\d{3,4})', model)
+                return int(m.group(1)) if m else ""
+            elif "XTREME" in model:
+                return ""  # XTREME is cavity-based, no tonnage
+
+    except Exception:
+        return ""
+    return ""
+
+
+def classify_tonnage_range(tonnage_str):
+    try:
+        if pd.isna(tonnage_str):
+            return ""
+        tonnage = float(str(tonnage_str).replace(",", ""))
+        if tonnage < 300:
+            return "Small (<300)"
+        elif 300 <= tonnage <= 799:
+            return "Medium (300–799)"
+        elif tonnage >= 800:
+            return "Large (800+)"
+    except:
+        return ""
+
+
+# === Buyer Application Matching ===
+def build_buyer_index(buyer_map) -> dict:
+    """Exact, normalized and first-word indexes over ``buyer_map`` (see the module docstring).
+
+    Every index points into 'apps' (the map's applications in file order).
+    A normalized name shared by several file names keeps the first one with
+    an application; names with a blank application are only matched exactly.
+    """
+    names = list(buyer_map.keys())
+    apps = list(buyer_map.values())
+    normalized_names = clean_column(pd.Series(names, dtype=object), "brand").tolist()
+    normalized = {}
+    for position, (name, app) in enumerate(zip(normalized_names, apps)):
+        if name and not pd.isna(app) and str(app).strip():
+            normalized.setdefault(name, position)
+    blocks = {}
+    for name, position in normalized.items():
+        block = blocks.setdefault(first_token(name), ([], []))
+        block[0].append(name)
+        block[1].append(position)
+    return {"apps": apps, "exact": {name: i for i, name in enumerate(names)}, "normalized": normalized,
+            "blocks": blocks}
+
+
+def buyer_app_positions(buyers, index, cutoff=BUYER_FUZZY_CUTOFF) -> list:
+    """Position in ``index['apps']`` for each (upper-cased) buyer name, -1 when nothing matches."""
+    positions = [index["exact"].get(b, -1) for b in buyers]
+    todo = [i for i, p in enumerate(positions) if p < 0]
+    normalized = clean_column(pd.Series([buyers[i] for i in todo], dtype=object), "brand").tolist()
+
+    # Fuzzy candidates: the normalized names not in the file, grouped by first word
+    pending = {}
+    for i, name in zip(todo, normalized):
+        if name in index["normalized"]:
+            positions[i] = index["normalized"][name]
+        elif name and cutoff is not None and first_token(name) in index["blocks"]:
+            rows, queries = pending.setdefault(first_token(name), ([], []))
+            rows.append(i)
+            queries.append(name)
+    for token, (rows, queries) in pending.items():
+        choices, choice_positions = index["blocks"][token]
+        # Best choice per buyer; ties go to the earlier name in the file
+        q, c, _ = sparse_scores(queries, choices, fuzz.token_sort_ratio, cutoff, top_k=1)
+        for qi, ci in zip(q.tolist(), c.tolist()):
+            positions[rows[qi]] = choice_positions[ci]
+    return positions
+
+
+def match_buyer_app(df, buyer_map, cutoff=BUYER_FUZZY_CUTOFF):
+    if "Buyer Cleaned Final" in df.columns:
+        buyers = df["Buyer Cleaned Final"].astype(str).str.strip().str.upper()
+    else:
+        buyers = pd.Series("", index=df.index)
+
+    # Fallback keyword rules ("buyer_application_fallback" in husky/rules.json)
+    fallback = get_ruleset("buyer_application_fallback").apply(df)
+    index = build_buyer_index(buyer_map)
+    positions = map_distinct(buyers, lambda values: buyer_app_positions(values, index, cutoff),
+                             batch=True).to_numpy(dtype=np.int64)
+    apps = np.array(index["apps"] + [np.nan], dtype=object)[positions]
+    return pd.Series(apps, index=df.index, dtype=object).where(positions >= 0, fallback)
+
+
+def _move_after(df, anchor, col):
+    cols = df.columns.tolist()
+    cols.insert(df.columns.get_loc(anchor) + 1, cols.pop(cols.index(col)))
+    return df[cols]
+
+
+def process_imm(df, machine_patterns, buyer_map=None, region_dict=None, buyer_cutoff=BUYER_FUZZY_CUTOFF):
+    """Add model, tonnage, buyer application and product type columns to a trade frame."""
+    buyer_map = buyer_map or {}
+    if "Product Description" not in df.columns:
+        raise ValueError("'Product Description' column not found.")
+    df = df.copy()
+
+    if "Tonnage" not in df.columns:
+        df.insert(0, "Tonnage", "")
+    if "Application" not in df.columns:
+        df.insert(0, "Application", "")
+
+    if region_dict is not None and "Buyer Country" in df.columns:
+        df = add_buyer_region(df, region_dict)
+
+    df["Tonnage Range"] = df["Tonnage"].apply(classify_tonnage_range)
+    compiled, _ = compile_patterns(machine_patterns)  # invalid patterns never matched
+    df["Model"] = df["Product Description"].apply(extract_model, args=(compiled,))
+    df["Model Series"] = df["Model"].apply(extract_model_series)
+    df["Tonnage"] = df.apply(extract_tonnage, axis=1)
+    df = _move_after(df, "Model Series", "Tonnage")
+
+    # Product Type / Application Sub Category rules: "imm_product_type" and
+    # "imm_application_sub_category" in husky/rules.json
+    if "Buyer" in df.columns and "Supplier" in df.columns:
+        df["Buyer Potential Application"] = match_buyer_app(df, buyer_map, buyer_cutoff)
+        # Fix blank Product Type Focus BEFORE calling assign_application_sub_category
+        # 1. Create Product Type column first
+        df["Product Type Focus (Packaging/PET)"] = get_ruleset("imm_product_type").apply(df)
+
+        # 2. Fix blank values (force PET if blank)
+        df["Product Type Focus (Packaging/PET)"] = df["Product Type Focus (Packaging/PET)"].fillna("").replace("",
+                                                                                                               "PET")
+
+        # 3. Now it's safe to calculate Application Sub Category
+        df["Application Sub Category"] = get_ruleset("imm_application_sub_category").apply(df)
+
+    if "Product Type Focus (Packaging/PET)" in df.columns and "Application Sub Category" in df.columns:
+        df = _move_after(df, "Product Type Focus (Packaging/PET)", "Application Sub Category")
+
+    # === Reorder Columns ===
+    # Keep any extra columns not listed in FINAL_ORDER
+    remaining = [col for col in df.columns if col not in FINAL_ORDER]
+    return df[[col for col in FINAL_ORDER if col in df.columns] + remaining]
+
+
+def to_styled_excel(df, highlight_cols=HIGHLIGHT_COLS, numeric_cols=NUMERIC_COLS) -> bytes:
+    """xlsx bytes with highlighted headers and '#,##0' number cells."""
+    # === Write DataFrame to BytesIO with openpyxl ===
+    output = BytesIO()
+    df.to_excel(output, index=False, engine='openpyxl')
+    output.seek(0)
+
+    # === Load workbook and apply styling ===
+    wb = load_workbook(output)
+    ws = wb.active
+
+    highlight_fill = PatternFill(start_color="FFF9C4", end_color="FFF9C4", fill_type="solid")  # Light yellow
+    number_format = '#,##0'
+
+    # Get header index mapping
+    header = {cell.value: idx + 1 for idx, cell in enumerate(ws[1])}
+
+    # === Highlight ONLY header cells ===
+    for col_name in highlight_cols:
+        if col_name in header:
+            col_idx = header[col_name]
+            ws.cell(row=1, column=col_idx).fill = highlight_fill
+
+    # === Format number cells in data rows ===
+    for row in ws.iter_rows(min_row=2, max_row=ws.max_row):
+        for col_name in numeric_cols:
+            if col_name in header:
+                cell = row[header[col_name] - 1]
+                if isinstance(cell.value, (int, float)):
+                    cell.number_format = number_format
+
+    # Save updated workbook to buffer
+    output = BytesIO()
+    wb.save(output)
+    return output.getvalue()
@@ -0,0 +1,278 @@
+"""Background jobs: long runs that outlive the Streamlit session.
+
+Pipeline runs, full CRM account clean-ups and CRM business-type matching
+can be submitted as jobs. A job is a ``"module:function"`` returning the
+output workbook bytes; it gets its keyword arguments plus ``report``, a
+callback that records the stage / progress and stops the job when it was
+cancelled. Jobs run in a process pool owned by the Streamlit server process,
+so a browser refresh or dropped websocket no longer kills them. Each job has a row
+in a small SQLite table (``jobs.db`` under the cache directory) holding its
+status, current stage and progress, and a directory with its pickled input
+and finished output. A session's job list only shows the jobs it submitted
+(``track_job``); the id of the last one is kept in the page URL
+(``?job=<id>``), which reconnects to it after a refresh.
+
+Cancellation is cooperative: a queued job is dropped from the pool (or never
+starts), a running job stops at its next ``report`` call.
+"""
+
+import importlib
+import os
+import pickle
+import shutil
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from husky.disk_cache import CACHE_ROOT
+
+JOBS_DIR = CACHE_ROOT / "jobs"
+DB_PATH = JOBS_DIR / "jobs.db"
+MAX_WORKERS = int(os.environ.get("HUSKY_JOB_WORKERS", "2"))
+KEEP_DAYS = float(os.environ.get("HUSKY_JOB_KEEP_DAYS", "7"))
+
+ACTIVE = ("queued", "running", "cancelling")
+FINISHED = ("done", "failed", "cancelled", "interrupted")
+JOB_IDS_KEY = "husky_job_ids"  # session state: ids of the jobs this session submitted
+
+_COLUMNS = ["id", "kind", "label", "status", "stage", "progress", "message", "output",
+            "created", "updated", "server_pid"]
+
+_pool = None
+_futures = {}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# === Job table ===
+def _connect():
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, kind TEXT, label TEXT, status TEXT, "
+        "stage TEXT, progress REAL, message TEXT, output TEXT, created REAL, updated REAL, server_pid INTEGER)"
+    )
+    return conn
+
+
+def _update(job_id, **fields):
+    fields["updated"] = time.time()
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    with _connect() as conn:
+        conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", [*fields.values(), job_id])
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def get_job(job_id):
+    with _connect() as conn:
+        row = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", [job_id]).fetchone()
+    if row is None:
+        return None
+    job = dict(zip(_COLUMNS, row))
+    # The server that owned the pool is gone: the job can never finish
+    if job["status"] in ACTIVE and job["server_pid"] != os.getpid() and not _pid_alive(job["server_pid"]):
+        _update(job_id, status="interrupted", message="The server restarted before the job finished.")
+        job["status"] = "interrupted"
+    return job
+
+
+def list_jobs(kind=None, ids=None, limit=20):
+    """The most recent jobs, newest first; only ``kind`` jobs and those in ``ids`` when given."""
+    where, params = [], []
+    if kind is not None:
+        where.append("kind = ?")
+        params.append(kind)
+    if ids is not None:
+        where.append(f"id IN ({', '.join('?' * len(ids))})")
+        params.extend(ids)
+    condition = f" WHERE {' AND '.join(where)}" if where else ""
+    with _connect() as conn:
+        found = [r[0] for r in conn.execute(f"SELECT id FROM jobs{condition} ORDER BY created DESC LIMIT ?",
+                                            [*params, limit])]
+    return [job for job in map(get_job, found) if job is not None]
+
+
+def job_dir(job_id):
+    return JOBS_DIR / job_id
+
+
+def read_output(job_id):
+    job = get_job(job_id)
+    if job is None or job["status"] != "done" or not job["output"]:
+        return None
+    with open(job["output"], "rb") as f:
+        return f.read()
+
+
+def cleanup(keep_days=KEEP_DAYS):
+    """Remove finished jobs older than ``keep_days``."""
+    cutoff = time.time() - keep_days * 86400
+    with _connect() as conn:
+        old = [r[0] for r in conn.execute(
+            f"SELECT id FROM jobs WHERE updated < ? AND status IN ({', '.join('?' * len(FINISHED))})",
+            [cutoff, *FINISHED])]
+        conn.executemany("DELETE FROM jobs WHERE id = ?", [[job_id] for job_id in old])
+    for job_id in old:
+        shutil.rmtree(job_dir(job_id), ignore_errors=True)
+
+
+# === Worker side ===
+def _check_cancelled(job_id):
+    job = get_job(job_id)
+    if job is None or job["status"] == "cancelling":
+        raise JobCancelled()
+
+
+def _start(job_id):
+    """Mark a queued job running; a job cancelled in the meantime is no longer 'queued' and stays cancelled."""
+    with _connect() as conn:
+        started = conn.execute("UPDATE jobs SET status = 'running', progress = 0.0, updated = ? "
+                               "WHERE id = ? AND status = 'queued'", [time.time(), job_id]).rowcount
+    if not started:
+        raise JobCancelled()
+
+
+def _run_job(job_id):
+    try:
+        _start(job_id)
+        with open(job_dir(job_id) / "input.pkl", "rb") as f:
+            payload = pickle.load(f)
+        module, name = payload["function"].split(":")
+        function = getattr(importlib.import_module(module), name)
+
+        def report(**fields):
+            # stage / progress / message; raises JobCancelled once the job is being cancelled
+            if fields:
+                _update(job_id, **fields)
+            _check_cancelled(job_id)
+
+        data = function(**payload["kwargs"], report=report)
+        output = job_dir(job_id) / "output.xlsx"
+        output.write_bytes(data)
+        _update(job_id, status="done", stage="Finished", progress=1.0, output=str(output))
+    except JobCancelled:
+        _update(job_id, status="cancelled", stage="Cancelled")
+    except Exception as e:
+        _update(job_id, status="failed", message=f"{type(e).__name__}: {e}")
+
+
+def pipeline_job(df, stages, resources, highlight_cols, report):
+    """A pipeline run (husky/pipeline.py) as a job: the styled output workbook."""
+    from husky.imm import NUMERIC_COLS, to_styled_excel
+    from husky.pipeline import run_pipeline
+
+    total = len(stages) + 1  # + export
+    done = []
+
+    def on_level(level):
+        report(stage=" ‖ ".join(stage.label for stage in level))
+
+    def on_stage(stage, seconds):
+        done.append(f"{stage.label} ({seconds:.1f}s)")
+        report(progress=len(done) / total, message=" · ".join(done))
+
+    result, _ = run_pipeline(df, stages, resources, on_stage=on_stage, on_level=on_level)
+    report(stage="Writing Excel")
+    return to_styled_excel(result, highlight_cols=highlight_cols, numeric_cols=NUMERIC_COLS)
+
+
+# === Server side ===
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+    return _pool
+
+
+def shutdown():
+    """Wait for the running jobs and stop the worker processes (the server keeps them for its lifetime)."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True)
+        _pool = None
+
+
+def submit(kind, function, kwargs, label):
+    """Queue ``function(**kwargs, report=...)`` (a ``"module:function"``) in the background; returns the job id."""
+    cleanup()
+    job_id = uuid.uuid4().hex[:12]
+    job_dir(job_id).mkdir(parents=True, exist_ok=True)
+    with open(job_dir(job_id) / "input.pkl", "wb") as f:
+        pickle.dump({"function": function, "kwargs": kwargs}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    now = time.time()
+    with _connect() as conn:
+        conn.execute(
+            f"INSERT INTO jobs ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+            [job_id, kind, label, "queued", "Waiting for a worker", 0.0, "", "", now, now, os.getpid()],
+        )
+    _futures[job_id] = _get_pool().submit(_run_job, job_id)
+    return job_id
+
+
+def submit_pipeline(df, stages, resources, highlight_cols=(), label="Pipeline run"):
+    """Queue a pipeline run in the background; returns the job id."""
+    return submit("pipeline", "husky.jobs:pipeline_job",
+                  {"df": df, "stages": stages, "resources": resources, "highlight_cols": list(highlight_cols)}, label)
+
+
+def cancel(job_id):
+    future = _futures.get(job_id)
+    if future is not None and future.cancel():
+        _update(job_id, status="cancelled", stage="Cancelled")
+        return
+    # Conditional, as in ``_start``: a job that finished meanwhile keeps its final status
+    with _connect() as conn:
+        conn.execute("UPDATE jobs SET status = 'cancelling', updated = ? "
+                     "WHERE id = ? AND status IN ('queued', 'running')", [time.time(), job_id])
+
+
+# === Job list (Streamlit is passed in, as in husky/preview.py) ===
+def track_job(st, job_id):
+    """List ``job_id`` in this session's jobs and put it in the page URL."""
+    st.session_state.setdefault(JOB_IDS_KEY, []).append(job_id)
+    st.query_params["job"] = job_id
+
+
+def render_jobs(st, kind, file_name):
+    """Status, progress, cancel and download buttons of this session's recent ``kind`` jobs.
+
+    Call it from an ``st.fragment(run_every=...)`` so it refreshes on its own.
+    """
+    ids = st.session_state.setdefault(JOB_IDS_KEY, [])
+    # a job id in the URL survives a refresh / reconnect
+    selected_id = st.query_params.get("job")
+    if selected_id and selected_id not in ids:
+        ids.append(selected_id)
+    jobs = list_jobs(kind, ids)
+    if not jobs:
+        return
+    st.subheader("🕒 Background jobs")
+    for job in jobs:
+        marker = "👉 " if job["id"] == selected_id else ""
+        st.markdown(f"{marker}**{job['label']}** — `{job['id']}` — {job['status']} · {job['stage']}")
+        if job["message"]:
+            st.caption(job["message"])
+        if job["status"] in ("queued", "running", "cancelling"):
+            st.progress(min(job["progress"] or 0.0, 1.0))
+            if job["status"] != "cancelling" and st.button("✖️ Cancel", key=f"cancel_{job['id']}"):
+                cancel(job["id"])
+        elif job["status"] == "done":
+            st.download_button(
+                label="⬇️ Download Processed File",
+                data=lambda job_id=job["id"]: read_output(job_id),
+                file_name=f"{file_name}_{job['id']}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                key=f"download_{job['id']}"
+            )
@@ -0,0 +1,331 @@
+"""Concurrent-session load test for the Streamlit tools.
+
+Drives each tool headlessly with Streamlit's ``AppTest`` on synthetic
+uploads: every session uploads its files, sets the tool's options and
+clicks its run button the way an analyst would (``SCENARIOS``), and waits
+for the background job when the run is one (husky/jobs.py). An exception
+on any script run counts as an error. Each
+``--sessions`` level runs in a fresh worker process, so the peak RSS is its
+own, with that many sessions on threads, as the Streamlit server runs them:
+
+    python -m husky.loadtest
+    python -m husky.loadtest --apps Account_clean_up.py Match_Website.py --sessions 1 4 8 --rows 5000
+
+Reported per scenario and level: session latency percentiles (upload to
+finished run or job), sessions per minute, errors and the peak RSS of the worker
+process (and of its largest child, for the tools that use process pools).
+Everything runs offline; the caches go to a temporary directory unless
+``--cache-dir`` is given. Downloads are built when the browser clicks them,
+which ``AppTest`` cannot do, so the numbers cover uploads and runs only.
+"""
+
+import argparse
+import io
+import os
+import resource
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+SESSION_TIMEOUT_S = 600
+JOB_POLL_S = 0.5
+PERCENTILES = (50, 90, 99)
+
+# Per scenario: uploader label -> synthetic file, widget label -> value, buttons clicked in order; "script"
+# when the scenario is not named after its tool, "job" when the click queues a background job
+SCENARIOS = {
+    "Clean_Up_Shipper_and_Consignee.py": {
+        "uploads": {"📂 Upload Excel file": "trade"},
+    },
+    "Blow_Type.py": {
+        "uploads": {"Upload file (CSV/XLSX)": "clustered"},
+        "clicks": ["Classify"],
+    },
+    "IMM_Clean_Up_Shipper_and_Consignee.py": {
+        "uploads": {"📥 Upload regex pattern Excel (regex.xlsx)": "patterns",
+                    "📄 Upload input Excel file": "clustered",
+                    "🔍 Upload Buyer → Application match file": "buyer_app",
+                    "🌍 Upload Country → Region match file": "regions"},
+    },
+    "Matching_Region.py": {
+        "uploads": {"📄 Upload Base File (must include 'Buyer Country')": "clustered",
+                    "🌍 Upload Region Match File (with 'Country' and 'Region')": "regions"},
+    },
+    "Filling_line_Tool.py": {
+        "uploads": {"📥 Upload Data File": "clustered",
+                    "📄 Upload Match File (Pattern to Lines)": "lines",
+                    "🌍 Upload Region File (Country to Region)": "regions"},
+    },
+    "Matching_Classification_Tool.py": {
+        "uploads": {"📂 Upload CRM Database File (Excel)": "crm",
+                    "📂 Upload Lookup File (Excel)": "lookup",
+                    "🌍 Upload Country-Region Mapping File (Excel)": "regions"},
+    },
+    "Account_clean_up.py": {
+        "uploads": {"📂 Upload CRM Excel File": "crm"},
+        "clicks": ["🔄 Run Cleanup"],
+    },
+    "Match_Website.py": {
+        "uploads": {"Upload **Reference** file (CSV/XLSX)": "websites",
+                    "Upload **Target** file (CSV/XLSX)": "targets"},
+        "clicks": ["Match & Generate"],
+    },
+    "Pipeline_Runner.py": {
+        "uploads": {"📄 Upload trade data Excel (must include 'Buyer' and 'Supplier')": "trade",
+                    "📥 Upload regex pattern Excel (regex.xlsx) — IMM extraction": "patterns",
+                    "🔍 Upload Buyer → Application match file (optional)": "buyer_app",
+                    "🌍 Upload Country → Region match file — region mapping": "regions"},
+        "clicks": ["▶️ Run pipeline"],
+        "job": True,  # "Run in background" is ticked by default
+    },
+}
+SCENARIOS["Pipeline_Runner.py (inline)"] = {
+    **SCENARIOS["Pipeline_Runner.py"],
+    "script": "Pipeline_Runner.py",
+    "settings": {"🕒 Run in background": False},
+    "job": False,
+}
+
+
+# === Synthetic uploads ===
+_DESCRIPTIONS = ["INJECTION MOLDING MACHINE ENGEL E-MAC 180/50", "NETSTAL ELION 1750-390 PET PREFORMS",
+                 "ARBURG ALLROUNDER 470 E 1500-400", "SIPA XFORM 350 PET", "HUAYAN HY-300", "SUMITOMO SE180EV",
+                 "BLOW MOULDING MACHINE KW 250", "AOKI AL-500-7 SINGLE STAGE", "NISSEI ASB-70DPH",
+                 "LINEAR BLOWER SFL 6 WATER BOTTLES", "CAN FILLING LINE BEER", "GLASS BOTTLE FILLER WATER",
+                 "KEG WASHING AND FILLING LINE", "SPARE PARTS FOR MOULD"]
+_REGIONS = {"Mexico": "LATAM", "Brazil": "LATAM", "Germany": "West Europe", "United Kingdom": "West Europe",
+            "USA": "North America", "China": "Asia"}
+
+
+def _xlsx(df: pd.DataFrame) -> bytes:
+    with io.BytesIO() as buffer:
+        df.to_excel(buffer, index=False)
+        return buffer.getvalue()
+
+
+def synthetic_files(rows=2000, seed=0) -> dict:
+    """Excel bytes for every upload in ``SCENARIOS`` (``rows`` trade / CRM rows)."""
+    from husky.equivalence import _COUNTRIES, _names, generated_data
+
+    rng = np.random.default_rng(seed)
+    data = generated_data(rows, seed)
+    pool = np.array(_names(rng, max(rows // 3, 10)), dtype=object)
+    countries = np.array(_COUNTRIES, dtype=object)
+    buyers = rng.choice(pool, rows)
+    suppliers = rng.choice(pool, rows)
+    trade = pd.DataFrame({
+        "Buyer": buyers,
+        "Buyer Country": rng.choice(countries, rows),
+        "Supplier": suppliers,
+        "Supplier Country": rng.choice(countries, rows),
+        "Product Description": rng.choice(np.array(_DESCRIPTIONS, dtype=object), rows),
+        "Quantity": rng.integers(1, 5, rows),
+        "Value": rng.choice([50000.0, 150000.0, 250000.5, 1e6, np.nan], rows),
+        "Date": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 700, rows), "D"),
+    })
+    # The output of the clean-up tool, as the downstream tools receive it
+    clustered = trade.copy()
+    clustered.insert(1, "Buyer Cleaned Final", buyers)
+    clustered.insert(4, "Supplier Cleaned Final", suppliers)
+    lookup = pd.DataFrame({"Company name": rng.choice(pool, rows), "Country": rng.choice(countries, rows)})
+    for year in (2022, 2023, 2024):
+        lookup[year] = rng.choice([0, 5000, 15000, 40000, np.nan], rows)
+    lookup["Grand Total"] = lookup[[2022, 2023, 2024]].sum(axis=1)
+    frames = {
+        "trade": trade,
+        "clustered": clustered,
+        "crm": data["crm"],
+        "lookup": lookup,
+        "patterns": pd.DataFrame({"Pattern": data["patterns"]}),
+        "buyer_app": pd.DataFrame({"Buyer": pool[:50],
+                                   "Buyer Potential Application": rng.choice(["Packaging", "Closures", "Medical"], 50)
+                                   if len(pool) >= 50 else "Packaging"}),
+        "regions": pd.DataFrame({"Country": list(_REGIONS), "Region": list(_REGIONS.values())}),
+        "lines": pd.DataFrame({"Pattern": ["CAN", "GLASS", "KEG", "PET"],
+                               "Lines": ["Can line", "Glass line", "Keg line", "PET line"]}),
+        "websites": data["websites"],
+        "targets": data["targets"],
+    }
+    return {name: _xlsx(df) for name, df in frames.items()}
+
+
+# === Sessions ===
+def _share_script_cache():
+    """Compile each tool once per process, as the server's shared ``ScriptCache`` does.
+
+    ``AppTest`` builds a new cache for every run, and compiling the same
+    script on several threads at once trips a CPython 3.11 ``ast`` bug
+    ("AST constructor recursion depth mismatch").
+    """
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    lock, compiled = threading.Lock(), {}
+    get_bytecode = ScriptCache.get_bytecode
+
+    def shared(self, script_path):
+        with lock:
+            if script_path not in compiled:
+                compiled[script_path] = get_bytecode(self, script_path)
+            return compiled[script_path]
+
+    ScriptCache.get_bytecode = shared
+
+
+def _wait_for_job(at, timeout):
+    """Poll the job the session queued (its id is in the page URL) until it ends; an error message or None."""
+    from husky.jobs import FINISHED, get_job
+
+    job_id = at.query_params.get("job")
+    job_id = job_id[0] if isinstance(job_id, list) and job_id else job_id
+    if not job_id:
+        return "no job was queued"
+    deadline = time.perf_counter() + timeout
+    while True:
+        job = get_job(job_id)
+        if job is None:
+            return f"job {job_id} not found"
+        if job["status"] in FINISHED:
+            return None if job["status"] == "done" else f"job {job['status']}: {job['message']}"
+        if time.perf_counter() > deadline:
+            return f"job still {job['status']} after {timeout:.0f}s"
+        time.sleep(JOB_POLL_S)
+
+
+def run_session(app: str, files: dict, timeout=SESSION_TIMEOUT_S) -> dict:
+    """One session of the ``app`` scenario; ``{"seconds", "error"}``."""
+    from streamlit.testing.v1 import AppTest
+
+    scenario = SCENARIOS[app]
+    problems = []
+
+    def run():
+        at.run()
+        # Every run counts: a crash on an intermediate render must not be hidden by a later one
+        problems.extend([e.message for e in at.exception] + [e.value for e in at.error])
+
+    t0 = time.perf_counter()
+    try:
+        at = AppTest.from_file(str(ROOT / scenario.get("script", app)), default_timeout=timeout)
+        run()
+        for label, name in scenario["uploads"].items():
+            uploader = next(u for u in at.get("file_uploader") if u.label == label)
+            uploader.set_value((f"{name}.xlsx", files[name], XLSX))
+        run()
+        for label, value in scenario.get("settings", {}).items():
+            next(w for w in at.checkbox if w.label == label).set_value(value)
+        for label in scenario.get("clicks", []):
+            run()
+            next(b for b in at.button if b.label == label).click()
+        run()
+        if scenario.get("job") and not problems:
+            problem = _wait_for_job(at, timeout)
+            if problem:
+                problems.append(problem)
+            run()  # the job list with the finished job
+        error = problems[0] if problems else None
+    except StopIteration:
+        error = problems[0] if problems else "widget not found (scenario out of date?)"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {"seconds": time.perf_counter() - t0, "error": error}
+
+
+def _rss_mb(who=resource.RUSAGE_SELF) -> float:
+    return resource.getrusage(who).ru_maxrss / 1024  # ru_maxrss is in KB on Linux
+
+
+def run_level(app: str, sessions: int, rows: int, seed=0, same_data=False, timeout=SESSION_TIMEOUT_S) -> dict:
+    """``sessions`` concurrent sessions of ``app`` (run in a worker process by ``main``)."""
+    from streamlit.logger import set_log_level
+
+    from husky import jobs
+
+    set_log_level("error")
+    _share_script_cache()
+
+    files = [synthetic_files(rows, seed if same_data else seed + i) for i in range(sessions)]
+    baseline = _rss_mb()
+    start = threading.Barrier(sessions)
+
+    def session(i):
+        start.wait()
+        return run_session(app, files[i], timeout)
+
+    t0 = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            results = list(pool.map(session, range(sessions)))
+    except Exception:
+        results = [{"seconds": time.perf_counter() - t0, "error": traceback.format_exc(limit=1)}] * sessions
+    wall = time.perf_counter() - t0
+    # Reap the background job workers: their RSS then counts as the child peak, and the level process can exit
+    jobs.shutdown()
+
+    seconds = np.array([r["seconds"] for r in results])
+    errors = [r["error"] for r in results if r["error"]]
+    return {
+        "App": app,
+        "Sessions": sessions,
+        **{f"p{p} s": round(float(np.percentile(seconds, p)), 2) for p in PERCENTILES},
+        "Max s": round(float(seconds.max()), 2),
+        "Sessions / min": round(60 * sessions / wall, 1) if wall else None,
+        "Errors": len(errors),
+        "Baseline RSS MB": round(baseline),
+        "Peak RSS MB": round(_rss_mb()),
+        "Peak child RSS MB": round(_rss_mb(resource.RUSAGE_CHILDREN)),
+        "First error": errors[0] if errors else "",
+    }
+
+
+def load_test(apps, levels, rows, seed=0, same_data=False, timeout=SESSION_TIMEOUT_S, on_level=None) -> pd.DataFrame:
+    """One report row per tool and concurrency level, each level in a fresh process."""
+    rows_out = []
+    for app in apps:
+        for sessions in levels:
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                row = pool.submit(run_level, app, sessions, rows, seed, same_data, timeout).result()
+            rows_out.append(row)
+            if on_level is not None:
+                on_level(row)
+    return pd.DataFrame(rows_out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apps", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS),
+                        help="tools to load (default: all)")
+    parser.add_argument("--sessions", nargs="+", type=int, default=[1, 2, 4, 8], help="concurrency levels")
+    parser.add_argument("--rows", type=int, default=2000, help="rows per synthetic trade / CRM upload")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--same-data", action="store_true",
+                        help="every session uploads the same files (default: different files per session)")
+    parser.add_argument("--timeout", type=float, default=SESSION_TIMEOUT_S, help="seconds per script run")
+    parser.add_argument("--cache-dir", help="HUSKY_CACHE_DIR for the run (default: a temporary directory)")
+    parser.add_argument("--csv", help="also write the report to this CSV file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="husky-loadtest-") as scratch:
+        # Set before the workers start: the caches read it on import
+        os.environ["HUSKY_CACHE_DIR"] = args.cache_dir or scratch
+        report = load_test(args.apps, args.sessions, args.rows, args.seed, args.same_data, args.timeout,
+                           on_level=lambda row: print(f"{row['App']} x{row['Sessions']}: p50 {row['p50 s']}s, "
+                                                      f"{row['Errors']} errors", flush=True))
+
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.max_colwidth", 60):
+        print(report.to_string(index=False))
+    if args.csv:
+        report.to_csv(args.csv, index=False)
+    return 1 if report["Errors"].any() else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,135 @@
+"""Character-trigram candidate index for fuzzy name lookups.
+
+Brute-force ``process.extractOne(name, name_list)`` scores every reference
+name. ``TrigramIndex`` instead keeps an inverted index (trigram -> reference
+names containing it) and ranks references by IDF-weighted cosine similarity
+of their trigram sets; only the top ``k`` candidates are re-scored with the
+real scorer. Trigrams that occur in more than ``max_df`` of the references
+(" co", "ing", ...) carry almost no signal and are skipped at query time, so
+the work per lookup depends on how rare a name's trigrams are rather than on
+the size of the reference list.
+
+Candidates are ordered by their first position in ``name_list`` before
+re-scoring, so ties resolve exactly like the brute-force path. Use
+``measure_recall`` to check how often the index finds the brute-force answer.
+"""
+
+import time
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+
+def trigrams(name: str):
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    def __init__(self, name_list, k: int = 50, max_df: float = 0.05, scorer=fuzz.ratio):
+        self.k = k
+        self.scorer = scorer
+        # Distinct non-empty names, remembered by first position in name_list
+        first = {}
+        for pos, name in enumerate(name_list):
+            if name and name not in first:
+                first[name] = pos
+        self.names = list(first)
+        self.first_pos = np.fromiter(first.values(), dtype=np.int64, count=len(first))
+
+        vocab, gram_ids, owners = {}, [], []
+        for i, name in enumerate(self.names):
+            for gram in trigrams(name):
+                gram_ids.append(vocab.setdefault(gram, len(vocab)))
+                owners.append(i)
+        self.vocab = vocab
+        gram_ids = np.asarray(gram_ids, dtype=np.int64)
+        owners = np.asarray(owners, dtype=np.int64)
+
+        # CSR postings: references containing gram g are postings[offsets[g]:offsets[g + 1]]
+        order = np.argsort(gram_ids, kind="stable")
+        self.postings = owners[order]
+        counts = np.bincount(gram_ids, minlength=len(vocab))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+        n = max(len(self.names), 1)
+        self.idf = np.log((1 + n) / (1 + counts)) + 1.0
+        self.max_postings = max(int(max_df * n), 1)
+        # L2 norm of every reference's (binary tf * idf) vector
+        self.norms = np.sqrt(np.bincount(owners, weights=self.idf[gram_ids] ** 2, minlength=len(self.names)))
+
+    def __len__(self):
+        return len(self.names)
+
+    def candidates(self, name: str):
+        """Indices into ``self.names`` of the ``k`` most similar references."""
+        ids = [self.vocab[g] for g in trigrams(name) if g in self.vocab]
+        if not ids:
+            return np.empty(0, dtype=np.int64)
+        ids = np.asarray(ids, dtype=np.int64)
+        sizes = self.offsets[ids + 1] - self.offsets[ids]
+        keep = sizes <= self.max_postings
+        if not keep.any():
+            keep = sizes == sizes.min()  # only common grams: fall back to the rarest
+        ids = ids[keep]
+
+        hits = np.concatenate([self.postings[self.offsets[g]:self.offsets[g + 1]] for g in ids])
+        weights = np.repeat(self.idf[ids] ** 2, self.offsets[ids + 1] - self.offsets[ids])
+        refs, inverse = np.unique(hits, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights) / self.norms[refs]
+        if len(refs) > self.k:
+            refs = refs[np.argpartition(-scores, self.k - 1)[:self.k]]
+        return refs
+
+    def extract_one(self, name: str):
+        """``(best_name, score, position)`` among the candidates, like ``process.extractOne``."""
+        refs = self.candidates(name)
+        if not len(refs):
+            return None
+        refs = refs[np.argsort(self.first_pos[refs])]
+        best = process.extractOne(name, [self.names[i] for i in refs], scorer=self.scorer)
+        if best is None:
+            return None
+        return best[0], best[1], int(self.first_pos[refs[best[2]]])
+
+
+def measure_recall(index: TrigramIndex, queries, name_list, threshold: float = 0, sample: int = 300, seed: int = 0):
+    """Compare index lookups with brute force on a sample of ``queries``.
+
+    A query counts as recalled when both paths agree on the matched name (or
+    both find nothing at or above ``threshold``). Returns a dict with the
+    recall, the average per-query latency of each path and the raw
+    ``(brute, index)`` results, so ``recall_at`` can re-evaluate another
+    threshold without scoring again.
+    """
+    queries = [q for q in dict.fromkeys(queries) if q]
+    if len(queries) > sample:
+        rng = np.random.default_rng(seed)
+        queries = [queries[i] for i in rng.choice(len(queries), sample, replace=False)]
+
+    t0 = time.perf_counter()
+    brute = [process.extractOne(q, name_list, scorer=index.scorer) for q in queries]
+    t1 = time.perf_counter()
+    indexed = [index.extract_one(q) for q in queries]
+    t2 = time.perf_counter()
+
+    n = max(len(queries), 1)
+    report = {
+        "queries": len(queries),
+        "brute_ms": 1000 * (t1 - t0) / n,
+        "index_ms": 1000 * (t2 - t1) / n,
+        "results": list(zip(brute, indexed)),
+    }
+    report["recall"] = recall_at(report, threshold)
+    return report
+
+
+def recall_at(report, threshold: float) -> float:
+    """Share of the sampled queries where index and brute force agree at ``threshold``."""
+    def outcome(best):
+        return best[0] if best and best[1] >= threshold else None
+
+    results = report["results"]
+    if not results:
+        return 1.0
+    return sum(outcome(b) == outcome(i) for b, i in results) / len(results)
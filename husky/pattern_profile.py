@@ -0,0 +1,135 @@
+"""Per-pattern profiling of the IMM model patterns (regex.xlsx).
+
+``extract_model`` tries every pattern in order on every description, so one
+slow pattern slows the whole run, and a pattern with catastrophic
+backtracking can hang it. ``profile_patterns`` compiles every pattern, times
+each one on a sample of descriptions and reports:
+
+* hits: descriptions the pattern matches with capture groups
+* first match: descriptions where it is the pattern ``extract_model`` uses
+* shadowed: it hits, but an earlier pattern always wins
+* total and worst per-description time
+
+``re`` cannot be interrupted, so the searches run in a child process. A
+pattern that runs past ``timeout_s`` on the sample has the child killed and
+is reported as timed out; profiling carries on with the next pattern.
+"""
+
+import multiprocessing
+import time
+
+import numpy as np
+import pandas as pd
+
+from husky.imm import compile_patterns, model_text
+
+BUDGET_MS = 5.0  # worst time a pattern may take on one description
+TIMEOUT_S = 10.0  # total time a pattern may take on the whole sample
+SAMPLE = 2000
+
+STATUS_OK = "ok"
+STATUS_INVALID = "invalid"
+STATUS_NO_GROUPS = "no capture groups"
+STATUS_SLOW = "over budget"
+STATUS_TIMEOUT = "timed out"
+DISABLED = (STATUS_INVALID, STATUS_TIMEOUT)  # never used in a run
+
+
+def _profile_worker(jobs, texts, conn):
+    for k, pattern in jobs:
+        compiled = compile_patterns([pattern])[0][0]
+        hits, worst = [], 0.0
+        t_start = time.perf_counter()
+        for i, text in enumerate(texts):
+            t0 = time.perf_counter()
+            match = compiled.search(text)
+            worst = max(worst, time.perf_counter() - t0)
+            if match and match.groups():
+                hits.append(i)
+        conn.send((k, hits, time.perf_counter() - t_start, worst))
+    conn.close()
+
+
+def _run_guarded(jobs, texts, timeout_s):
+    """``{position: (hits, total_s, worst_s)}``; positions missing from it timed out."""
+    results = {}
+    ctx = multiprocessing.get_context()
+    while jobs:
+        parent, child = ctx.Pipe(duplex=False)
+        proc = ctx.Process(target=_profile_worker, args=(jobs, texts, child), daemon=True)
+        proc.start()
+        child.close()
+        done = 0
+        while done < len(jobs):
+            if not parent.poll(timeout_s):
+                break
+            try:
+                k, hits, total, worst = parent.recv()
+            except EOFError:
+                break
+            results[k] = (hits, total, worst)
+            done += 1
+        proc.kill()
+        proc.join()
+        parent.close()
+        jobs = jobs[done + 1:]  # skip the pattern that timed out (or crashed the child)
+    return results
+
+
+def sample_texts(descriptions, sample=SAMPLE, seed=0):
+    """Distinct upper-cased descriptions, as ``extract_model`` sees them."""
+    texts = list(dict.fromkeys(model_text(d) for d in descriptions))
+    if len(texts) > sample:
+        rng = np.random.default_rng(seed)
+        texts = [texts[i] for i in sorted(rng.choice(len(texts), sample, replace=False))]
+    return texts
+
+
+def profile_patterns(machine_patterns, descriptions, budget_ms=BUDGET_MS, sample=SAMPLE,
+                     timeout_s=TIMEOUT_S, seed=0):
+    """One report row per pattern, in file order."""
+    texts = sample_texts(descriptions, sample, seed)
+    errors = {i: message for i, _, message in compile_patterns(machine_patterns)[1]}
+    jobs = [(i, p) for i, p in enumerate(machine_patterns) if i not in errors]
+    results = _run_guarded(jobs, texts, timeout_s)
+
+    # The pattern extract_model would use for each sampled description
+    first = np.full(len(texts), len(machine_patterns))
+    for k in sorted(results, reverse=True):
+        first[results[k][0]] = k
+    wins = np.bincount(first, minlength=len(machine_patterns) + 1)
+
+    rows = []
+    for i, pattern in enumerate(machine_patterns):
+        hits, total, worst = results.get(i, ([], 0.0, 0.0))
+        if i in errors:
+            status = f"{STATUS_INVALID}: {errors[i]}"
+        elif i not in results:
+            status = STATUS_TIMEOUT
+        elif compile_patterns([pattern])[0][0].groups == 0:
+            status = STATUS_NO_GROUPS
+        elif 1000 * worst > budget_ms:
+            status = STATUS_SLOW
+        else:
+            status = STATUS_OK
+        rows.append({
+            "#": i + 1,
+            "Pattern": pattern,
+            "Status": status,
+            "Hits": len(hits),
+            "First match": int(wins[i]),
+            "Shadowed": bool(hits) and wins[i] == 0,
+            "Total ms": round(1000 * total, 2),
+            "Worst ms": round(1000 * worst, 3),
+        })
+    report = pd.DataFrame(rows, columns=["#", "Pattern", "Status", "Hits", "First match", "Shadowed",
+                                         "Total ms", "Worst ms"])
+    report.attrs["sample"] = len(texts)
+    return report
+
+
+def enabled_patterns(report, disable_slow=False):
+    """Patterns to run with: drops invalid and timed-out ones (and over-budget ones if asked)."""
+    status = report["Status"].str.split(":").str[0]
+    disabled = status.isin(DISABLED) | (disable_slow & (status == STATUS_SLOW))
+    return report.loc[~disabled, "Pattern"].tolist()
@@ -0,0 +1,130 @@
+"""Run several tools on one in-memory DataFrame.
+
+The stage list lives in ``pipeline.json`` next to this module. Each stage
+names a ``module:function`` taking the frame as its first argument, the
+resources it needs (``inputs``: argument name -> resource name), fixed
+``params``, the stages it must run ``after`` and the columns it ``produces``.
+
+Stages are grouped into levels: a stage runs once everything it comes after
+has finished. Stages of the same level see the same input frame and run
+concurrently in worker processes; their produced columns are then merged
+back, aligned row by row, each placed after the column it followed in the
+stage's own result. The first stage of a level decides the row order (e.g.
+the clustering sort), so nothing is written to or read from Excel in between.
+"""
+
+import importlib
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+PIPELINE_PATH = Path(__file__).with_name("pipeline.json")
+ROW_ID = "__pipeline_row"
+
+
+class Stage:
+    def __init__(self, spec):
+        self.name = spec["name"]
+        self.label = spec.get("label", self.name)
+        self.function = spec["function"]
+        self.params = spec.get("params", {})
+        self.inputs = spec.get("inputs", {})
+        self.after = spec.get("after", [])
+        self.produces = spec.get("produces", [])
+
+    def missing_resources(self, resources):
+        return [name for name in self.inputs.values() if resources.get(name) is None]
+
+    def __repr__(self):
+        return f"Stage({self.name!r})"
+
+
+def load_stages(path=PIPELINE_PATH):
+    with open(path, encoding="utf-8") as f:
+        stages = [Stage(spec) for spec in json.load(f)["stages"]]
+    names = {stage.name for stage in stages}
+    for stage in stages:
+        unknown = set(stage.after) - names
+        if unknown:
+            raise ValueError(f"Stage '{stage.name}' runs after unknown stage(s) {sorted(unknown)}")
+    return stages
+
+
+def plan_levels(stages):
+    """Stages grouped into levels that can run concurrently, in config order."""
+    selected = {stage.name for stage in stages}
+    done, levels, pending = set(), [], list(stages)
+    while pending:
+        level = [s for s in pending if all(dep in done or dep not in selected for dep in s.after)]
+        if not level:
+            raise ValueError(f"Circular 'after' dependencies between {[s.name for s in pending]}")
+        levels.append(level)
+        done.update(s.name for s in level)
+        pending = [s for s in pending if s not in level]
+    return levels
+
+
+def _run_stage(function, df, kwargs):
+    module, name = function.split(":")
+    func = getattr(importlib.import_module(module), name)
+    t0 = time.perf_counter()
+    out = func(df, **kwargs)
+    if ROW_ID not in out.columns or len(out) != len(df):
+        raise ValueError(f"{function} must keep every row and column of its input")
+    return out, time.perf_counter() - t0
+
+
+def _merge(base, result, columns):
+    """Copy ``columns`` from ``result`` into ``base`` (rows aligned on ROW_ID)."""
+    aligned = result.set_index(ROW_ID).reindex(base[ROW_ID])
+    out = base.copy()
+    order = result.columns.tolist()
+    for col in columns:
+        if col not in result.columns:
+            continue
+        values = aligned[col].to_numpy()
+        if col in out.columns:
+            out[col] = values
+            continue
+        anchor = next((c for c in reversed(order[:order.index(col)]) if c in out.columns), None)
+        out.insert(out.columns.get_loc(anchor) + 1 if anchor is not None else len(out.columns), col, values)
+    return out
+
+
+def run_pipeline(df, stages, resources, max_workers=None, on_stage=None, on_level=None):
+    """Run ``stages`` on ``df``; returns ``(result, {stage name: seconds})``.
+
+    ``on_level(stages)`` is called before each level starts and
+    ``on_stage(stage, seconds)`` as each stage finishes.
+    """
+    for stage in stages:
+        missing = stage.missing_resources(resources)
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' needs {', '.join(missing)}")
+
+    df = df.reset_index(drop=True)
+    df.insert(len(df.columns), ROW_ID, range(len(df)))
+    timings = {}
+
+    for level in plan_levels(stages):
+        if on_level is not None:
+            on_level(level)
+        jobs = [(s.function, {**s.params, **{arg: resources[res] for arg, res in s.inputs.items()}}) for s in level]
+        if len(level) == 1:
+            results = [_run_stage(level[0].function, df, jobs[0][1])]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers or len(level)) as pool:
+                futures = [pool.submit(_run_stage, function, df, kwargs) for function, kwargs in jobs]
+                results = [future.result() for future in futures]
+
+        merged = results[0][0]
+        for stage, (out, seconds) in zip(level, results):
+            if out is not merged:
+                merged = _merge(merged, out, stage.produces)
+            timings[stage.name] = seconds
+            if on_stage is not None:
+                on_stage(stage, seconds)
+        df = merged
+
+    return df.drop(columns=ROW_ID), timings
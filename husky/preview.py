@@ -0,0 +1,135 @@
+"""Paginated preview of a result frame, sliced on the server.
+
+``st.dataframe(df)`` on a full result sends every row to the browser. The
+preview sends one page: search, filter and sort run on the server, their
+row order is kept in the session memory for the current settings, and only
+``page_size`` rows are rendered. Summary counts (filled / blank per new
+column, match rate, top values) are computed once per result.
+
+The helpers below are plain pandas; ``render_preview`` takes the Streamlit
+module as an argument so the package itself does not import it.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+PAGE_SIZE = 100
+TOP_VALUES = 3
+FILTER_CHOICES = 200  # most frequent values offered in the filter box
+NO_FILTER = "(no filter)"
+NO_SORT = "(file order)"
+
+
+def blank_mask(series: pd.Series) -> pd.Series:
+    """Missing or empty / whitespace-only cells."""
+    if pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+        return series.isna()
+    text = series.astype(object)
+    return text.isna() | (text.astype(str).str.strip() == "")
+
+
+def summary_counts(df: pd.DataFrame, columns) -> pd.DataFrame:
+    """Filled / blank counts, match rate, distinct values and top values of ``columns``."""
+    rows = []
+    for col in columns:
+        if col not in df.columns:
+            continue
+        blank = blank_mask(df[col])
+        filled = df.loc[~blank, col]
+        top = filled.astype(object).value_counts().head(TOP_VALUES)
+        rows.append({
+            "Column": col,
+            "Filled": int((~blank).sum()),
+            "Blank": int(blank.sum()),
+            "Match rate": f"{(~blank).mean():.1%}" if len(df) else "",
+            "Distinct": int(filled.nunique()),
+            "Top values": ", ".join(f"{value} ({n:,})" for value, n in top.items()),
+        })
+    return pd.DataFrame(rows, columns=["Column", "Filled", "Blank", "Match rate", "Distinct", "Top values"])
+
+
+def search_mask(df: pd.DataFrame, text: str) -> np.ndarray:
+    """Rows where any text column contains ``text`` (case-insensitive)."""
+    mask = np.zeros(len(df), dtype=bool)
+    needle = text.strip().lower()
+    if not needle:
+        return ~mask
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Search the categories once, then pick rows by category code
+            hits = pd.Series(series.cat.categories.astype(str)).str.lower().str.contains(needle, regex=False)
+            mask |= np.isin(series.cat.codes.to_numpy(), np.flatnonzero(hits.to_numpy()))
+        elif series.dtype == object or pd.api.types.is_string_dtype(series.dtype):
+            hits = series.astype(str).str.lower().str.contains(needle, regex=False) & series.notna()
+            mask |= hits.to_numpy(dtype=bool)
+    return mask
+
+
+def view_positions(df: pd.DataFrame, search="", filter_column=None, filter_values=(), sort_column=None,
+                   ascending=True) -> np.ndarray:
+    """Row positions matching the search and filter, in the requested order."""
+    keep = search_mask(df, search) if search else np.ones(len(df), dtype=bool)
+    if filter_column is not None and filter_values:
+        keep &= df[filter_column].astype(object).isin(list(filter_values)).to_numpy()
+    positions = np.flatnonzero(keep)
+    if sort_column is not None:
+        order = df[sort_column].iloc[positions].reset_index(drop=True)
+        if isinstance(order.dtype, pd.CategoricalDtype):
+            order = order.astype(object)
+        order = order.sort_values(ascending=ascending, kind="stable", na_position="last",
+                                  key=lambda s: s.astype(str) if s.dtype == object else s).index.to_numpy()
+        positions = positions[order]
+    return positions
+
+
+def page_slice(df: pd.DataFrame, positions: np.ndarray, page: int, page_size=PAGE_SIZE) -> pd.DataFrame:
+    start = (page - 1) * page_size
+    return df.iloc[positions[start:start + page_size]]
+
+
+def render_preview(st, memory, df: pd.DataFrame, name: str, key, new_columns=(), page_size=PAGE_SIZE):
+    """Summary counts plus one page of ``df`` with search, filter and sort widgets.
+
+    ``key`` identifies the result (e.g. ``frame_fingerprint(df)``); the
+    summary and the current row order are stored under ``name`` in the
+    session ``memory``.
+    """
+    summary = memory.get(f"{name}: summary")
+    if summary is None or summary["key"] != key:
+        summary = {"key": key, "counts": summary_counts(df, new_columns)}
+        memory[f"{name}: summary"] = summary
+    if len(summary["counts"]):
+        st.dataframe(summary["counts"], use_container_width=True, hide_index=True)
+
+    columns = [str(col) for col in df.columns]
+    search_col, filter_col, values_col, sort_col = st.columns([3, 2, 3, 2])
+    search = search_col.text_input("🔎 Search", key=f"{name}_search")
+    filter_column = filter_col.selectbox("Filter column", [NO_FILTER] + columns, key=f"{name}_filter")
+    filter_values = []
+    if filter_column != NO_FILTER:
+        column = df.columns[columns.index(filter_column)]
+        choices = df[column].astype(object).value_counts().head(FILTER_CHOICES).index.tolist()
+        filter_values = values_col.multiselect("Values", choices, default=[], key=f"{name}_values")
+    sort_column = sort_col.selectbox("Sort by", [NO_SORT] + columns, key=f"{name}_sort")
+    ascending = sort_col.checkbox("Ascending", value=True, key=f"{name}_ascending")
+
+    settings = (key, search, filter_column, tuple(map(str, filter_values)), sort_column, ascending)
+    view = memory.get(f"{name}: view")
+    if view is None or view["settings"] != settings:
+        view = {"settings": settings, "positions": view_positions(
+            df, search,
+            df.columns[columns.index(filter_column)] if filter_column != NO_FILTER else None, filter_values,
+            df.columns[columns.index(sort_column)] if sort_column != NO_SORT else None, ascending)}
+        memory[f"{name}: view"] = view
+    positions = view["positions"]
+
+    pages = max(1, math.ceil(len(positions) / page_size))
+    page = st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, value=1, key=f"{name}_page")
+    page = min(int(page), pages)
+    st.dataframe(page_slice(df, positions, page, page_size), use_container_width=True)
+    first = (page - 1) * page_size
+    st.caption(f"Rows {min(first + 1, len(positions)):,}–{min(first + page_size, len(positions)):,} "
+               f"of {len(positions):,} matching ({len(df):,} in total)")
@@ -0,0 +1,473 @@
+"""Frozen copies of the original tool code, used as oracles by husky/equivalence.py.
+
+These are the implementations the tools shipped with before any engine work,
+kept verbatim apart from being lifted out of the Streamlit scripts (closures
+over ``db`` / ``machine_patterns`` became parameters). Do not optimize or fix
+anything here: a faster engine is only adopted when it matches these outputs.
+"""
+
+import re
+import unicodedata
+
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+
+# === Clean_Up_Shipper_and_Consignee.py ===
+def clean_brand_name(name):
+    if pd.isna(name):
+        return ""
+    name = str(name)
+    name = unicodedata.normalize("NFKD", name)
+    name = name.encode("ascii", "ignore").decode("utf-8")
+    name = name.lower()
+    name = re.sub(r'[^a-z0-9 ]', '', name)
+    name = re.sub(r'\b(inc|ltd|corp|co|company|limited|group|plc|gmbh|sa|bv|canada|austria|division of .*)\b', '', name)
+    name = re.sub(r'\s+', ' ', name).strip()
+    return name
+
+
+def extract_brand(name):
+    words = name.split()
+    return words[0] if words else ""
+
+
+priority_brands = {
+    'ARBURG': 'ARBURG',
+    'SERAC': 'SERAC',
+    'KHS': 'KHS',
+    'KRONES': 'KRONES',
+    'SHIBUYA': 'SHIBUYA',
+    'SIDEL': 'SIDEL',
+    'BMB': 'BMB',
+    'SIPA': 'SIPA',
+    'ENGEL': 'ENGEL',
+    'NETSTAL': 'NETSTAL',
+    'SACMI': 'SACMI',
+    'HUAYAN': 'HUAYAN',
+    'DEMAG': 'Sumitomo (SHI) Demag',
+    'SUMITOMO': 'Sumitomo (SHI) Demag',
+    'SIAPI':'SIAPI',
+    'Nissei':'Nissei ASB',
+    'ASB':'Nissei ASB',
+    'SAPI':'SIAPI'
+}
+
+
+def apply_priority(name):
+    upper_name = str(name).upper()
+    for keyword, result in priority_brands.items():
+        if keyword in upper_name:
+            return result
+    return None  # No override
+
+
+def cluster_names(df, entity_col, cleaned_col, brand_col, final_col):
+    df[cleaned_col] = df[entity_col].fillna('').apply(clean_brand_name)
+    df[brand_col] = df[cleaned_col].apply(extract_brand)
+
+    results = []
+    for brand, group in df.groupby(brand_col):
+        group = group.sort_values(cleaned_col).reset_index(drop=True)
+        master_list = []
+        cleaned_names = []
+
+        for index, row in group.iterrows():
+            current_original = row[entity_col]
+            current_clean = row[cleaned_col]
+
+            # Priority rule check
+            priority_match = apply_priority(current_original)
+            if priority_match:
+                cleaned_names.append(priority_match)
+                continue
+
+            found_match = False
+            best_score = 0
+            best_master_original = None
+
+            for master_original, master_clean in master_list:
+                score = fuzz.token_set_ratio(master_clean, current_clean)
+                if score > 80 and score > best_score:
+                    best_score = score
+                    best_master_original = master_original
+                    found_match = True
+
+            if found_match:
+                cleaned_names.append(best_master_original)
+            else:
+                cleaned_names.append(current_original)
+                master_list.append((current_original, current_clean))
+
+        group[final_col] = cleaned_names
+        results.append(group)
+
+    return pd.concat(results, ignore_index=True)
+
+
+# === Account_clean_up.py (steps 1-6) ===
+def clean_account_name(name):
+    if pd.isna(name):
+        return ""
+    name = unicodedata.normalize("NFKD", str(name))
+    name = name.encode("ascii", "ignore").decode("utf-8")
+    name = name.lower()
+    name = re.sub(r'[^\w\s]', '', name)
+    name = re.sub(r'\b(inc|llc|ltd|co|corporation|company|limited|group|plc|gmbh|sa|bv|global|sarl|sro|kg|ltda|s de rl|operations|applied to life|automotive)\b', '', name)
+    name = re.sub(r'\s+', ' ', name).strip()
+    return name
+
+
+def classify_sou(sou):
+    if pd.isna(sou): return "OTHER"
+    sou = sou.lower()
+    if "hot runners" in sou or "hrc" in sou:
+        return "HOT RUNNERS"
+    elif "beverage" in sou or "packaging" in sou:
+        return "PACKAGING"
+    elif "msp" in sou or "csm" in sou:
+        return "OTHER PACKAGING"
+    return "OTHER"
+
+
+def cleanup_accounts(df):
+    df = df.reset_index(drop=True)
+
+    # Step 1: Clean names
+    df['Cleaned Name'] = df['Account Name'].apply(clean_account_name)
+
+    # Step 2: SOU category
+    df['SOU Category'] = df['SOU'].apply(classify_sou)
+
+    # Step 3: Group names by fuzzy match
+    group_names = [''] * len(df)
+    assigned = set()
+
+    for i in range(len(df)):
+        if i in assigned:
+            continue
+        base_name = df.loc[i, 'Cleaned Name']
+        base_sou = df.loc[i, 'SOU Category']
+        base_prefix = " ".join(base_name.split()[:2])
+        group_names[i] = base_prefix
+        assigned.add(i)
+
+        for j in range(i + 1, len(df)):
+            if j in assigned:
+                continue
+            if df.loc[j, 'SOU Category'] != base_sou:
+                continue
+            score = fuzz.token_set_ratio(base_name, df.loc[j, 'Cleaned Name'])
+            if score > 85:
+                group_names[j] = base_prefix
+                assigned.add(j)
+
+    df['Account Group Name Cleaned'] = group_names
+
+    # Step 4: Deduplicate by Cleaned Name + Country
+    deduped = []
+    skip = set()
+
+    for i in range(len(df)):
+        if i in skip:
+            continue
+        current = df.iloc[i]
+        current_name = current['Cleaned Name']
+        current_country = current['Country']
+        similar = [i]
+
+        for j in range(i + 1, len(df)):
+            if df.iloc[j]['Country'] != current_country:
+                continue
+            score = fuzz.token_set_ratio(current_name, df.iloc[j]['Cleaned Name'])
+            if score > 90:
+                similar.append(j)
+                skip.add(j)
+
+        group = df.iloc[similar]
+        customers = group[group['Business Type'] == 'Customer']
+        best = customers.iloc[0] if not customers.empty else group.iloc[0]
+        deduped.append(best)
+
+    final_df = pd.DataFrame(deduped)
+
+    # Step 5: Reorder columns
+    preferred_start = [
+        'Account Name',
+        'Account Group Name Cleaned',
+        'Business Type',
+        'Country',
+        'SOU Category',
+        'SOU',
+        'Owner'
+    ]
+    front = [col for col in preferred_start if col in final_df.columns]
+    others = [col for col in final_df.columns if col not in front]
+    final_df = final_df[front + others]
+
+    # Step 6: Drop unwanted system columns
+    cols_to_drop = ['(Do Not Modify) Account', '(Do Not Modify) Row Checksum']
+    final_df = final_df.drop(columns=[col for col in cols_to_drop if col in final_df.columns])
+    return final_df
+
+
+# === Match_Website.py ===
+COMMON_SUFFIXES = {
+    "inc","inc.","ltd","ltd.","llc","llc.","co","co.","corp","corp.",
+    "corporation","company","limited","sa","ag","bv","pty","pte","kg","kgaa",
+    "gmbh","plc","srl","oy","ab","aps","sasu","sas","spa","spzoo","sro",
+    "bvba","nv","kft","kk","kabushiki","kaisha","pte.","ltd.","pty","ltd"
+}
+
+
+def normalize_name(s: str) -> str:
+    if pd.isna(s):
+        return ""
+    s = str(s).lower()
+    s = re.sub(r"[^a-z0-9\s]", " ", s)
+    s = re.sub(r"\s+", " ", s).strip()
+    words = [w for w in s.split() if w not in COMMON_SUFFIXES]
+    return " ".join(words).strip()
+
+
+def first4prefix(name: str) -> str:
+    return normalize_name(name).replace(" ", "")[:4]
+
+
+def build_reference_maps(ref_df: pd.DataFrame, col_company: str, col_website: str):
+    ref_df = ref_df.copy()
+    ref_df["_norm"] = ref_df[col_company].apply(normalize_name)
+    ref_df["_prefix4"] = ref_df[col_company].apply(first4prefix)
+
+    # exact normalized -> website (first non-null)
+    exact_map = {}
+    for _, r in ref_df.iterrows():
+        nm = r["_norm"]
+        web = r[col_website]
+        if nm and pd.notna(web) and nm not in exact_map:
+            exact_map[nm] = str(web)
+
+    # prefix buckets for fallback
+    prefix_map = {}
+    for _, r in ref_df.iterrows():
+        p4 = r["_prefix4"]
+        if not p4:
+            continue
+        web = str(r[col_website]) if pd.notna(r[col_website]) else ""
+        prefix_map.setdefault(p4, []).append((r["_norm"], web))
+
+    # for fuzzy
+    name_list = ref_df["_norm"].tolist()
+    website_by_norm = {}
+    for _, r in ref_df.iterrows():
+        nm = r["_norm"]
+        web = r[col_website]
+        if nm and pd.notna(web) and nm not in website_by_norm:
+            website_by_norm[nm] = str(web)
+
+    return exact_map, prefix_map, name_list, website_by_norm
+
+
+def match_fuzzy_then_prefix(target_name: str, exact_map, prefix_map, name_list, website_by_norm, threshold: int):
+    nm = normalize_name(target_name)
+    if not nm:
+        return None
+
+    # 1) Exact normalized
+    if nm in exact_map:
+        return exact_map[nm]
+
+    # 2) Fuzzy (ordered letters) >= threshold
+    best = process.extractOne(nm, name_list, scorer=fuzz.ratio)
+    if best:
+        best_name, score, _ = best
+        if score >= threshold:
+            web = website_by_norm.get(best_name)
+            if web:
+                return web
+
+    # 3) First 4 letters fallback
+    p4 = first4prefix(target_name)
+    if p4 and p4 in prefix_map:
+        candidates = prefix_map[p4]  # list of (norm_name, website)
+        # choose best by similarity to break ties
+        best_web, best_score = None, -1
+        for cnorm, web in candidates:
+            score = fuzz.ratio(nm, cnorm)
+            if score > best_score and web:
+                best_web, best_score = web, score
+        if best_web:
+            return best_web
+
+    # no match
+    return None
+
+
+def add_company_website(target_df: pd.DataFrame,
+                        ref_df: pd.DataFrame,
+                        target_company_col: str,
+                        ref_company_col: str,
+                        ref_website_col: str,
+                        threshold: int = 70) -> pd.DataFrame:
+
+    exact_map, prefix_map, name_list, website_by_norm = build_reference_maps(
+        ref_df, ref_company_col, ref_website_col
+    )
+
+    out = target_df.copy()
+    # compute websites
+    websites = []
+    for _, name in out[target_company_col].items():
+        websites.append(
+            match_fuzzy_then_prefix(name, exact_map, prefix_map, name_list, website_by_norm, threshold)
+        )
+
+    # insert Company Website right after Company Name
+    out.insert(out.columns.get_loc(target_company_col) + 1, "Company Website", websites)
+
+    return out
+
+
+# === Matching_Classification_Tool.py ===
+def clean_crm_name(name):
+    if pd.isna(name): return ''
+    name = name.lower()
+    name = re.sub(r'[^\w\s]', '', name)
+    name = re.sub(r'\b(inc|llc|ltd|co|corporation|company|limited|group|division|plc|gmbh|sa|bv|global|sarl|sro|kg|ltda|operations|applied to life|automotive|packaging)\b', '', name)
+    name = re.sub(r'\s+', ' ', name).strip()
+    return name
+
+
+def get_prefix(name):
+    return re.sub(r'\s+', '', name)[:4]
+
+
+def get_threshold(name_len):
+    return 88 if name_len <= 12 else 80 if name_len <= 20 else 70
+
+
+def match_business_types(db, lookup):
+    """'Business Type Matched' per lookup row; ``lookup`` needs 'Company name' (and 'Buying country')."""
+    db = db.copy()
+    lookup = lookup.copy()
+    db['Cleaned Account Name'] = db['Account Name'].apply(clean_crm_name)
+    db['Cleaned Group Name'] = db['Account Group Name Cleaned'].apply(clean_crm_name)
+    db['Cleaned Name'] = db['Cleaned Account Name']
+    db['Prefix'] = db['Cleaned Account Name'].apply(get_prefix)
+
+    lookup['Cleaned Company Name'] = lookup['Company name'].apply(clean_crm_name)
+    lookup['Prefix'] = lookup['Cleaned Company Name'].apply(get_prefix)
+
+    def match_business_type(cleaned_name, country, prefix):
+        if not prefix.strip():
+            return "Not in CRM"
+
+        # Allow fallback matching even if prefix not in CRM
+
+        best_score = 0
+        best_type = None
+        same_country_type = None
+        other_region_customer = False
+        threshold = get_threshold(len(cleaned_name))
+
+        for _, row in db.iterrows():
+            if prefix != row['Prefix']:
+                continue
+            db_country = str(row['Country']).strip().lower()
+            db_type = str(row['Business Type']).strip()
+            scores = [
+                fuzz.token_set_ratio(cleaned_name, row['Cleaned Account Name']),
+                fuzz.token_set_ratio(cleaned_name, row['Cleaned Group Name']),
+                fuzz.token_set_ratio(cleaned_name, row['Cleaned Name'])
+            ]
+            score = max(scores)
+
+            if score >= 90 and (not country or db_country == country):
+                return db_type
+            if score >= 90 and db_country != country and db_type == "Customer":
+                other_region_customer = True
+            if score >= threshold and db_country == country and same_country_type is None:
+                same_country_type = db_type
+            if score > best_score:
+                best_score = score
+                best_type = db_type
+
+        if same_country_type:
+            return same_country_type
+        if other_region_customer:
+            return "Not in CRM (Customer in other region)"
+        if best_score >= (threshold - 5):
+            return "Other"
+        return "Not in CRM"
+
+    return lookup.apply(
+        lambda row: match_business_type(
+            row['Cleaned Company Name'],
+            str(row['Buying country']).strip().lower() if 'Buying country' in row else "",
+            row['Prefix']
+        ), axis=1
+    )
+
+
+# === Filling_line_Tool.py ===
+# Lowercased version of application keywords for reliable matching
+application_keywords_raw = [
+    'water', 'milk', 'beer', 'juice', 'soft drink', 'carbonated', 'tea', 'coffee', 'energy drink',
+    'wine', 'soda', 'syrup', 'yogurt', 'liquid', 'beverage', 'dairy', 'cocktail', 'liqueur',
+    'mineral', 'spring', 'flavored', 'seltzer',
+    'молока', 'вода', 'сок', 'пиво'
+    , 'напиток', 'газированный','ГАЗИРОВАННЫХ',"НАПИТКОВ "
+    'agua', 'leche', 'cerveza', 'zumo', 'bebida', 'gaseosa',
+    'süt', 'bira', 'meyve suyu', 'içecek',
+    'paani', 'doodh', 'juice', 'sharab', 'cold drink'
+]
+application_keywords = [kw.lower() for kw in application_keywords_raw]
+
+def detect_application(text):
+    text = str(text).lower()
+    for keyword in application_keywords:
+        if keyword in text:
+            return keyword
+    return ""
+
+
+def match_products(data_df, match_df):
+    data_df = data_df.copy()
+    data_df["Product"] = ""
+    data_df["Product Line"] = ""
+
+    for _, row in match_df.iterrows():
+        pattern = str(row["Pattern"]).strip().upper()
+        line = str(row["Lines"]).strip()
+        mask = (data_df["Product Line"] == "") & data_df["Product Description"].str.upper().str.contains(pattern, na=False)
+        data_df.loc[mask, "Product"] = pattern
+        data_df.loc[mask, "Product Line"] = line
+    return data_df
+
+
+# === IMM_Clean_Up_Shipper_and_Consignee.py ===
+def extract_model(description, machine_patterns):
+    text = str(description).upper().replace("  ", " ")
+    for pattern in machine_patterns:
+        try:
+            match = re.search(pattern, text)
+        except re.error:
+            continue
+        if match:
+            groups = match.groups()
+            if not groups:
+                continue
+            series = groups[0].strip().title()
+            parts = [g.strip() for g in groups[1:] if g and g.strip()]
+            if not parts:
+                return series
+            if len(parts) == 1:
+                part = parts[0]
+                if "/" in part:
+                    return f"{series} {'-'.join(part.split('/'))}"
+                split_parts = re.findall(r'\d+[A-Z]?|\d{3,5}', part)
+                return f"{series} {'-'.join(split_parts)}" if split_parts else f"{series} {part}"
+            else:
+                cleaned_parts = [re.sub(r"\s+", "", p) for p in parts]
+                return f"{series} {'-'.join(cleaned_parts)}"
+    return ""
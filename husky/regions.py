@@ -0,0 +1,62 @@
+"""Buyer country -> region mapping shared by the tools."""
+
+import difflib
+
+import pandas as pd
+
+from husky.dtypes import map_distinct
+from husky.text import normalize
+
+
+def build_region_dict(region_df: pd.DataFrame, dropna: bool = True) -> dict:
+    """Normalized country -> region lookup from a file with 'Country' and 'Region' columns."""
+    region_df = region_df.copy()
+    region_df.columns = [str(col).strip() for col in region_df.columns]
+    region_df = region_df[['Country', 'Region']]
+    if dropna:
+        region_df = region_df.dropna()
+    return {normalize(country): region for country, region in zip(region_df['Country'], region_df['Region'])}
+
+
+# === Fuzzy match with priority rules ===
+def fuzzy_match_region(buyer_country, region_dict):
+    if pd.isna(buyer_country):
+        return ""
+
+    norm_buyer = normalize(buyer_country)
+    upper_buyer = str(buyer_country).upper()
+
+    # Priority keyword rules
+    if "KINGDOM" in upper_buyer:
+        return "West Europe"
+    if "OF AM" in upper_buyer or "UNITED STATES" in upper_buyer:
+        return "North America"
+    if "EMIRATES" in upper_buyer:
+        return "Middle East"
+
+    # Fuzzy match
+    matches = difflib.get_close_matches(norm_buyer, region_dict.keys(), n=1, cutoff=0.8)
+    if matches:
+        return region_dict[matches[0]]
+
+    # Match first 5 characters
+    for key in region_dict:
+        if norm_buyer[:5] == key[:5]:
+            return region_dict[key]
+
+    return ""
+
+
+def match_regions(countries: pd.Series, region_dict: dict) -> pd.Series:
+    """Region for every row, matched once per distinct country."""
+    return map_distinct(countries, lambda country: fuzzy_match_region(country, region_dict))
+
+
+def add_buyer_region(df: pd.DataFrame, region_dict: dict,
+                     country_col: str = "Buyer Country", region_col: str = "Buyer Region") -> pd.DataFrame:
+    """Copy of ``df`` with ``region_col`` placed right after ``country_col``."""
+    out = df.copy()
+    if region_col in out.columns:
+        out = out.drop(columns=region_col)
+    out.insert(out.columns.get_loc(country_col) + 1, region_col, match_regions(out[country_col], region_dict))
+    return out
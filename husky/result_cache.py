@@ -0,0 +1,61 @@
+"""Disk cache of finished tool outputs.
+
+A run is identified by the tool, the code version (a hash of the tool script
+and the shared ``husky`` package), the content hash of every input file with
+its sheet / header row, and the parameters that change the output. Rerunning
+a tool with the same inputs and settings returns the stored xlsx instead of
+recomputing it. Least recently used outputs are removed once the cache grows
+past ``HUSKY_RESULT_CACHE_MB``.
+"""
+
+import os
+from functools import lru_cache
+from pathlib import Path
+
+from husky.disk_cache import DiskCache, content_hash, file_bytes, make_key
+
+MAX_BYTES = int(os.environ.get("HUSKY_RESULT_CACHE_MB", "1024")) * 1024 * 1024
+PACKAGE_DIR = Path(__file__).parent
+
+RESULT_CACHE_HIT = "⚡ Served from cache — same input file(s), settings and code version as an earlier run"
+
+_cache = DiskCache("results", MAX_BYTES, suffix=".xlsx")
+
+
+@lru_cache(maxsize=None)
+def _hash_sources(paths_and_mtimes):
+    return content_hash(b"".join(Path(path).read_bytes() for path, _ in paths_and_mtimes))
+
+
+def code_version(tool_path) -> str:
+    """Hash of the tool script plus every module and rule file in ``husky``."""
+    paths = [Path(tool_path)] + sorted(PACKAGE_DIR.glob("*.py")) + sorted(PACKAGE_DIR.glob("*.json"))
+    return _hash_sources(tuple((str(p), p.stat().st_mtime_ns) for p in paths))
+
+
+def result_key(tool_path, inputs, params) -> str:
+    """Cache key for one run.
+
+    ``inputs`` is a list of ``(file, sheet, header)``; ``file`` may be None
+    for an optional upload that was left empty.
+    """
+    hashed = [(content_hash(file_bytes(f)) if f is not None else None, sheet, header) for f, sheet, header in inputs]
+    return make_key("result", Path(tool_path).name, code_version(tool_path), hashed, params)
+
+
+def has_result(key) -> bool:
+    return _cache.get(key) is not None
+
+
+def get_result(key):
+    path = _cache.get(key)
+    if path is None:
+        return None
+    return path.read_bytes()
+
+
+def put_result(key, data: bytes):
+    try:
+        _cache.put(key, lambda tmp: Path(tmp).write_bytes(data))
+    except OSError:
+        pass  # a full or read-only cache directory must not fail the run
@@ -0,0 +1,172 @@
+"""Declarative keyword rules compiled into vectorized column masks.
+
+Rule tables live in ``rules.json`` next to this module. Each rule set is an
+ordered list of rules; the first rule whose conditions all hold decides the
+row (first match wins), otherwise the rule set's ``default`` is used.
+
+Example rule set::
+
+    "sou_category": {
+        "case": "lower",
+        "default": "OTHER",
+        "rules": [
+            {"result": "HOT RUNNERS", "when": {"SOU": {"contains": ["hot runners", "hrc"]}}}
+        ]
+    }
+
+Supported conditions per column: ``contains`` (any keyword is a substring),
+``equals`` (any value), ``empty`` (true/false), ``same_prefix``
+(``{"column": ..., "length": n}``) and the numeric comparisons ``lt``, ``le``,
+``gt``, ``ge``. A rule returns either a fixed ``result`` or the normalized
+value of ``result_column``.
+
+A rule set made only of one-column ``contains`` rules can also be compiled
+into a single matcher (``keyword_lookup``), for mapping many distinct values
+at once.
+"""
+
+import json
+import operator
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+RULES_PATH = Path(__file__).with_name("rules.json")
+
+_COMPARISONS = {"lt": operator.lt, "le": operator.le, "gt": operator.gt, "ge": operator.ge}
+_CONDITIONS = {"contains", "equals", "empty", "same_prefix", *_COMPARISONS}
+
+
+class RuleSet:
+    def __init__(self, name, spec):
+        self.name = name
+        self.default = spec.get("default", "")
+        self.case = spec.get("case")
+        self.strip = spec.get("strip", False)
+        self.columns = spec.get("columns", {})
+        self.spec = spec
+        self.rules = [self._compile(rule) for rule in spec["rules"]]
+
+    def _compile(self, rule):
+        if ("result" in rule) == ("result_column" in rule):
+            raise ValueError(f"Rule set '{self.name}': each rule needs exactly one of 'result' / 'result_column'")
+        conditions = []
+        for column, tests in rule.get("when", {}).items():
+            unknown = set(tests) - _CONDITIONS
+            if unknown:
+                raise ValueError(f"Rule set '{self.name}': unknown condition(s) {sorted(unknown)} on '{column}'")
+            for kind, arg in tests.items():
+                if kind == "contains":
+                    arg = re.compile("|".join(re.escape(str(k)) for k in arg))
+                conditions.append((column, kind, arg))
+        return conditions, rule.get("result"), rule.get("result_column")
+
+    def _column(self, df, column, alias):
+        """Normalized values of one logical column, mirroring ``str(row.get(col, default))``."""
+        spec = self.columns.get(column, {})
+        actual = alias.get(column, column)
+        default = spec.get("default", "")
+        values = df[actual] if actual in df.columns else pd.Series(default, index=df.index)
+        if spec.get("numeric"):
+            return pd.to_numeric(values, errors="coerce")
+        values = values.astype(str)
+        if spec.get("strip", self.strip):
+            values = values.str.strip()
+        case = spec.get("case", self.case)
+        if case == "upper":
+            values = values.str.upper()
+        elif case == "lower":
+            values = values.str.lower()
+        return values
+
+    def apply(self, df, columns=None):
+        """Evaluate the rule set over ``df`` and return one result per row.
+
+        ``columns`` maps logical column names used in the rule table to the
+        actual column names of ``df`` (e.g. ``{"Name": "Buyer"}``).
+        """
+        alias = columns or {}
+        cache = {}
+
+        def col(name):
+            if name not in cache:
+                cache[name] = self._column(df, name, alias)
+            return cache[name]
+
+        out = np.full(len(df), self.default, dtype=object)
+        decided = np.zeros(len(df), dtype=bool)
+        for conditions, result, result_column in self.rules:
+            mask = ~decided
+            for column, kind, arg in conditions:
+                if not mask.any():
+                    break
+                values = col(column)
+                if kind == "contains":
+                    hit = values.str.contains(arg, regex=True)
+                elif kind == "equals":
+                    hit = values.isin(arg)
+                elif kind == "empty":
+                    hit = (values == "") if arg else (values != "")
+                elif kind == "same_prefix":
+                    n = arg.get("length", 4)
+                    hit = values.str[:n] == col(arg["column"]).str[:n]
+                else:
+                    hit = _COMPARISONS[kind](values, arg)
+                mask &= hit.to_numpy(dtype=bool, na_value=False)
+            if result_column is None:
+                out[mask] = result
+            else:
+                out[mask] = col(result_column).to_numpy(dtype=object)[mask]
+            decided |= mask
+        return pd.Series(out, index=df.index, dtype=object)
+
+    def keyword_lookup(self, column):
+        """``values -> results``, the same as ``apply`` on a one-column frame, with one regex pass per value.
+
+        Only for rule sets whose rules are all a single ``contains`` test on
+        ``column`` with a fixed ``result``. Every keyword goes into one
+        lookahead alternation in rule order: at each position it reports the
+        first listed keyword starting there, so the earliest rule among the
+        keywords reported anywhere is the rule ``apply`` would pick.
+        """
+        keywords, rank = [], {}
+        for i, rule in enumerate(self.spec["rules"]):
+            tests = rule.get("when", {})
+            if "result" not in rule or list(tests) != [column] or list(tests[column]) != ["contains"]:
+                raise ValueError(f"Rule set '{self.name}': rule {i + 1} is not a single 'contains' test on '{column}'")
+            for keyword in map(str, tests[column]["contains"]):
+                keywords.append(keyword)
+                rank.setdefault(keyword, i)
+        matcher = re.compile("(?=(" + "|".join(re.escape(k) for k in keywords) + "))")
+        results = [rule["result"] for rule in self.spec["rules"]]
+
+        def lookup(values):
+            values = self._column(pd.DataFrame({column: pd.Series(list(values), dtype=object)}), column, {})
+            return [results[min(rank[k] for k in hits)] if hits else self.default
+                    for hits in values.str.findall(matcher)]
+
+        return lookup
+
+
+@lru_cache(maxsize=None)
+def _load(path, mtime):
+    with open(path, encoding="utf-8") as f:
+        spec = json.load(f)
+    return {name: RuleSet(name, body) for name, body in spec.items()}
+
+
+def load_rules(path=RULES_PATH):
+    """Compile every rule set in ``path``; recompiled only when the file changes."""
+    path = str(path)
+    return _load(path, os.path.getmtime(path))
+
+
+def get_ruleset(name, path=RULES_PATH):
+    rules = load_rules(path)
+    if name not in rules:
+        raise KeyError(f"Rule set '{name}' not found in {path}")
+    return rules[name]
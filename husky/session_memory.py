@@ -0,0 +1,233 @@
+"""Per-session memory manager for the Streamlit tools.
+
+Each session keeps its scores, batch results and stage checkpoints in
+``st.session_state``. ``SessionMemory`` stores them with their size and
+last use:
+
+* once the session holds more than ``HUSKY_SESSION_MB`` in memory, the
+  least recently used entries are pickled to the session's spill directory
+  and loaded back on their next ``get``;
+* entries unused for ``HUSKY_SESSION_IDLE_MIN`` minutes are dropped (a tool
+  then recomputes them, as on a first run);
+* ``download`` returns a callable for ``st.download_button(data=...)``: the
+  file is built on the first click, written to the spill directory and
+  served from disk afterwards, so no output copy stays in memory.
+
+Streamlit runs that callable on its own thread, next to the script run that
+follows the click, so every access to the entries holds the session's lock.
+
+Spill directories of sessions idle for longer than the idle limit are
+removed when a new session starts.
+"""
+
+import os
+import pickle
+import shutil
+import sys
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from husky.disk_cache import CACHE_ROOT, make_key
+
+MAX_BYTES = int(os.environ.get("HUSKY_SESSION_MB", "512")) * 1024 * 1024
+MAX_IDLE_S = float(os.environ.get("HUSKY_SESSION_IDLE_MIN", "120")) * 60
+SPILL_ROOT = CACHE_ROOT / "sessions"
+
+STATE_KEY = "husky_memory"
+SESSION_ID_KEY = "husky_session_id"
+LOCK_KEY = "husky_memory_lock"
+
+
+def value_size(value, _seen=None) -> int:
+    """Approximate in-memory size in bytes (frames deep, containers recursively)."""
+    seen = _seen if _seen is not None else set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (bytes, bytearray, str)):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(value_size(k, seen) + value_size(v, seen) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(value_size(v, seen) for v in value)
+    if hasattr(value, "__dict__"):
+        return sys.getsizeof(value) + value_size(vars(value), seen)
+    return sys.getsizeof(value)
+
+
+def _remove_idle_sessions(max_idle_s):
+    if not SPILL_ROOT.exists():
+        return
+    cutoff = time.time() - max_idle_s
+    for directory in SPILL_ROOT.iterdir():
+        try:
+            if directory.stat().st_mtime < cutoff:
+                shutil.rmtree(directory, ignore_errors=True)
+        except FileNotFoundError:
+            continue
+
+
+class SessionMemory:
+    def __init__(self, state, max_bytes=MAX_BYTES, max_idle_s=MAX_IDLE_S):
+        if SESSION_ID_KEY not in state:
+            state[SESSION_ID_KEY] = uuid.uuid4().hex
+            _remove_idle_sessions(max_idle_s)
+        self.entries = state.setdefault(STATE_KEY, {})
+        self.lock = state.setdefault(LOCK_KEY, threading.RLock())
+        self.directory = SPILL_ROOT / state[SESSION_ID_KEY]
+        self.max_bytes = max_bytes
+        self.max_idle_s = max_idle_s
+        self.expire()
+
+    # --- dict-style access (``Stages`` uses it as its store) ---
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __getitem__(self, name):
+        if name not in self.entries:
+            raise KeyError(name)
+        return self.get(name)
+
+    def __setitem__(self, name, value):
+        self.put(name, value)
+
+    def get(self, name, default=None):
+        with self.lock:
+            return self._get(name, default)
+
+    def _get(self, name, default):
+        entry = self.entries.get(name)
+        if entry is None or entry["kind"] == "download":
+            return default
+        if entry["value"] is None:
+            try:
+                with open(entry["path"], "rb") as f:
+                    entry["value"] = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                self.pop(name)
+                return default
+            os.remove(entry["path"])
+            entry["path"] = None
+        entry["used"] = time.time()
+        self.trim(keep=name)
+        return entry["value"]
+
+    def put(self, name, value):
+        size = value_size(value)
+        with self.lock:
+            self.pop(name)
+            self.entries[name] = {"kind": "value", "value": value, "path": None, "bytes": size, "used": time.time()}
+            self.trim(keep=name)
+
+    def pop(self, name):
+        with self.lock:
+            entry = self.entries.pop(name, None)
+        if entry is not None and entry["path"] is not None:
+            try:
+                os.remove(entry["path"])
+            except FileNotFoundError:
+                pass
+
+    # --- eviction ---
+    def resident_bytes(self) -> int:
+        with self.lock:
+            return sum(e["bytes"] for e in self.entries.values() if e["kind"] == "value" and e["value"] is not None)
+
+    def disk_bytes(self) -> int:
+        with self.lock:
+            return sum(e["bytes"] for e in self.entries.values() if e["path"] is not None)
+
+    def expire(self):
+        """Drop entries unused for longer than the idle limit."""
+        cutoff = time.time() - self.max_idle_s
+        with self.lock:
+            for name in [n for n, e in self.entries.items() if e["used"] < cutoff]:
+                self.pop(name)
+
+    def trim(self, keep=None):
+        """Spill least recently used entries (except ``keep``) until the session fits its budget."""
+        with self.lock:
+            self._trim(keep)
+
+    def _trim(self, keep):
+        resident = self.resident_bytes()
+        if resident <= self.max_bytes:
+            return
+        candidates = sorted((e["used"], n) for n, e in self.entries.items()
+                            if n != keep and e["kind"] == "value" and e["value"] is not None)
+        for _, name in candidates:
+            if resident <= self.max_bytes:
+                break
+            resident -= self.entries[name]["bytes"]
+            self.spill(name)
+
+    def _path(self, name, suffix):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        os.utime(self.directory)  # the directory's mtime marks the session as active
+        return self.directory / f"{make_key(name)[:32]}{suffix}"
+
+    def spill(self, name):
+        with self.lock:
+            entry = self.entries[name]
+            path = self._path(name, ".pkl")
+            try:
+                with open(path, "wb") as f:
+                    pickle.dump(entry["value"], f, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                path.unlink(missing_ok=True)
+                self.pop(name)  # not picklable or disk full: drop it, the tool recomputes it
+                return
+            entry["value"] = None
+            entry["path"] = str(path)
+
+    # --- downloads ---
+    def download(self, name, key, build):
+        """``data=`` callable for ``st.download_button``: built on first click, then read from disk.
+
+        ``key`` identifies the content (e.g. the run key); a new key replaces
+        the stored file. ``build`` runs outside the lock, so the page stays
+        usable while a large file is written.
+        """
+        def data():
+            with self.lock:
+                entry = self.entries.get(name)
+                if entry is not None and entry["key"] == key and os.path.exists(entry["path"]):
+                    entry["used"] = time.time()
+                    with open(entry["path"], "rb") as f:
+                        return f.read()
+            content = build()
+            with self.lock:
+                self.pop(name)
+                path = self._path(name, ".download")
+                path.write_bytes(content)
+                self.entries[name] = {"kind": "download", "key": key, "value": None, "path": str(path),
+                                      "bytes": len(content), "used": time.time()}
+            return content
+        return data
+
+    # --- reporting ---
+    def summary(self) -> pd.DataFrame:
+        now = time.time()
+        with self.lock:
+            entries = sorted(self.entries.items(), key=lambda item: -item[1]["used"])
+        return pd.DataFrame([{
+            "Entry": name,
+            "Where": "memory" if e["value"] is not None else "disk",
+            "MB": round(e["bytes"] / 1024 / 1024, 2),
+            "Idle (min)": round((now - e["used"]) / 60, 1),
+        } for name, e in entries],
+            columns=["Entry", "Where", "MB", "Idle (min)"])
+
+    def report(self) -> str:
+        return (f"🧠 Session memory: {self.resident_bytes() / 1024 / 1024:.1f} MB of "
+                f"{self.max_bytes / 1024 / 1024:.0f} MB in memory, {self.disk_bytes() / 1024 / 1024:.1f} MB on disk "
+                f"({len(self.entries)} entries; idle entries dropped after {self.max_idle_s / 60:.0f} min)")
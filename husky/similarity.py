@@ -0,0 +1,220 @@
+"""Pairwise similarity scores computed once and re-thresholded cheaply.
+
+The grouping loops in the tools compare names pairwise and keep a pair when
+its score clears a fixed cutoff (80 / 85 / 90). ``PairScores`` runs the
+scorer once over every pair inside each block with ``process.cdist`` and keeps
+only the pairs scoring at least ``floor`` as a sparse, CSR-style structure.
+Any cutoff >= ``floor`` can then be applied by replaying the loop over the
+stored pairs, with no further scorer calls; the result is identical to
+scoring the pairs on the fly.
+
+Scores are stored as float32: ratio scores are multiples of 100 / (total
+length), far coarser than float32 resolution, so comparisons against the
+integer cutoffs come out the same as with the scorer's float64 result.
+
+``sparse_scores`` is the bulk kernel underneath: it scores queries against
+choices with ``process.cdist`` (all cores) in row tiles sized to stay within
+``HUSKY_SIMILARITY_MB`` and keeps only the scores at or above a cutoff, or
+the ``top_k`` best per query, so no dense query x choice matrix is built.
+The budget covers the score tile and the per-cell arrays made while
+selecting from it (the cutoff mask, the argsort of a tile), not the kept
+scores themselves.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import process
+
+MEMORY_MB = float(os.environ.get("HUSKY_SIMILARITY_MB", "256"))
+
+
+def tile_rows(n_choices, cell_bytes=8, memory_mb=MEMORY_MB):
+    """Query rows per tile so that ``cell_bytes`` per query x choice cell fit in ``memory_mb``."""
+    return max(1, int(memory_mb * 1024 * 1024 // (max(n_choices, 1) * cell_bytes)))
+
+
+def sparse_scores(queries, choices, scorer, cutoff=0, top_k=None, memory_mb=MEMORY_MB, dtype=np.float64,
+                  workers=-1):
+    """``(rows, cols, scores)`` of ``scorer(queries[row], choices[col])`` >= ``cutoff``.
+
+    With ``top_k`` only the ``top_k`` best choices per query are kept, ties
+    going to the earlier choice (as ``process.extractOne`` picks). Queries
+    are scored one tile of ``tile_rows`` rows at a time; ``workers=-1`` uses
+    every core.
+    """
+    queries, choices = list(queries), list(choices)
+    rows, cols, scores = [], [], []
+    itemsize = np.dtype(dtype).itemsize
+    if top_k is None or top_k >= len(choices):
+        cell_bytes = itemsize + 1  # scores + the boolean cutoff mask
+    elif top_k == 1:
+        cell_bytes = itemsize  # argmax needs no per-cell array
+    else:
+        cell_bytes = itemsize + 8  # scores + their int64 argsort
+    step = tile_rows(len(choices), cell_bytes, memory_mb)
+    for start in range(0, len(queries) if choices else 0, step):
+        tile = process.cdist(queries[start:start + step], choices, scorer=scorer, score_cutoff=cutoff,
+                             dtype=dtype, workers=workers)
+        if top_k is not None and top_k < tile.shape[1]:
+            if top_k == 1:
+                best = tile.argmax(axis=1)[:, None]  # the first maximum, as the stable sort below
+            else:
+                # Stable ascending sort of the reversed rows, read backwards: descending with ties
+                # to the earlier choice, without a negated copy of the tile (nor overflow on unsigned scores)
+                ranked = np.argsort(tile[:, ::-1], axis=1, kind="stable")
+                best = tile.shape[1] - 1 - ranked[:, :-top_k - 1:-1]
+                del ranked
+            r = np.repeat(np.arange(len(tile)), top_k)
+            c = best.ravel()
+            keep = tile[r, c] >= cutoff
+            r, c = r[keep], c[keep]
+        else:
+            r, c = np.nonzero(tile >= cutoff)
+        rows.append(r + start)
+        cols.append(c)
+        scores.append(tile[r, c])
+        del tile  # free it before the next tile is scored
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=dtype)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(scores)
+
+
+def expand_pairs(a, b, codes, positions):
+    """Every ``(i, j)`` with ``codes[i] == a`` and ``codes[j] == b``, per ``(a, b)`` pair.
+
+    Returns ``(pair index, i, j)``; the positions of each code are taken in
+    their order in ``positions``.
+    """
+    order = np.argsort(codes, kind="stable")
+    grouped = positions[order]
+    counts = np.bincount(codes, minlength=int(codes.max()) + 1 if len(codes) else 0)
+    starts = np.cumsum(counts) - counts
+    per_pair = counts[a] * counts[b]
+    pair = np.repeat(np.arange(len(a)), per_pair)
+    offset = np.arange(int(per_pair.sum())) - np.repeat(np.cumsum(per_pair) - per_pair, per_pair)
+    width = counts[b][pair]
+    i = grouped[starts[a][pair] + offset // width]
+    j = grouped[starts[b][pair] + offset % width]
+    return pair, i, j
+
+
+class PairScores:
+    """Symmetric sparse scores: ``neighbours(i)`` lists every j (ascending) with score >= floor."""
+
+    def __init__(self, n, rows, cols, scores, floor):
+        self.n = n
+        self.floor = floor
+        order = np.lexsort((cols, rows))
+        self.cols = cols[order].astype(np.int32)
+        self.scores = scores[order].astype(np.float32)
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=n))]).astype(np.int64)
+
+    def __len__(self):
+        return len(self.cols) // 2
+
+    @property
+    def nbytes(self):
+        return self.cols.nbytes + self.scores.nbytes + self.offsets.nbytes
+
+    def neighbours(self, i, cutoff=None):
+        """``(j, score)`` arrays for row ``i``; with ``cutoff`` only scores > cutoff."""
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        cols, scores = self.cols[lo:hi], self.scores[lo:hi]
+        if cutoff is not None:
+            keep = scores > cutoff
+            cols, scores = cols[keep], scores[keep]
+        return cols, scores
+
+    def components(self, cutoff):
+        """Connected component of every row over the pairs scoring above ``cutoff``.
+
+        Each row gets the smallest position in its component. Labels are
+        propagated along the edges with pointer jumping, so the work is a few
+        vectorized passes over the edges rather than a scan per row.
+        """
+        rows = np.repeat(np.arange(self.n), np.diff(self.offsets))
+        keep = self.scores > cutoff
+        rows, cols = rows[keep], self.cols[keep].astype(np.int64)
+        labels = np.arange(self.n)
+        while True:
+            low = np.minimum(labels[rows], labels[cols])
+            hooked = labels.copy()
+            np.minimum.at(hooked, labels[rows], low)
+            np.minimum.at(hooked, labels[cols], low)
+            while True:
+                jumped = hooked[hooked]
+                if np.array_equal(jumped, hooked):
+                    break
+                hooked = jumped
+            if np.array_equal(hooked, labels):
+                return labels
+            labels = hooked
+
+    def later(self, i, cutoff):
+        cols, _ = self.neighbours(i, cutoff)
+        return cols[cols > i]
+
+    def earlier(self, i, cutoff):
+        cols, scores = self.neighbours(i, cutoff)
+        keep = cols < i
+        return cols[keep], scores[keep]
+
+    @classmethod
+    def within_blocks(cls, names, blocks, scorer, floor, memory_mb=MEMORY_MB, workers=-1, checkpoint=None,
+                      on_progress=None):
+        """Score every pair of positions that share a block.
+
+        ``blocks`` is an iterable of position arrays (e.g. the values of
+        ``category_blocks``); pairs across blocks are never compared. Blocks
+        may overlap; a pair found in several blocks is kept once. Each
+        distinct name of a block is scored once (``sparse_scores``) and the
+        scores are then expanded to every pair of rows carrying those names.
+
+        With a ``checkpoint`` (husky/checkpoint.py) the pairs found so far are
+        saved block by block and a rerun resumes after the last saved block.
+        """
+        n = len(names)
+        blocks = list(blocks)
+        found_pairs = []  # (i, j, scores) per block, i < j
+        if checkpoint is not None:
+            _, saved = checkpoint.load()
+            if saved is not None and len(saved) <= len(blocks):
+                found_pairs = saved
+            checkpoint.resumed = len(found_pairs)
+        for b in range(len(found_pairs), len(blocks)):
+            positions = np.asarray(blocks[b], dtype=np.int64)
+            found_pairs.append(cls._block_pairs(names, positions, scorer, floor, memory_mb, workers))
+            if checkpoint is not None:
+                checkpoint.save(len(found_pairs), found_pairs, force=len(found_pairs) == len(blocks))
+            if on_progress is not None:
+                on_progress(len(found_pairs), len(blocks))
+
+        rows, cols, scores = [], [], []
+        for i, j, found in filter(None, found_pairs):
+            rows += [i, j]
+            cols += [j, i]
+            scores += [found, found]
+        if rows:
+            rows, cols, scores = np.concatenate(rows), np.concatenate(cols), np.concatenate(scores)
+            # Overlapping blocks (multi-key blocking) find some pairs more than once
+            _, first = np.unique(rows * n + cols, return_index=True)
+            if len(first) < len(rows):
+                rows, cols, scores = rows[first], cols[first], scores[first]
+        else:
+            rows, cols, scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+        return cls(n, rows, cols, scores, floor)
+
+    @staticmethod
+    def _block_pairs(names, positions, scorer, floor, memory_mb, workers):
+        """``(i, j, scores)`` of the pairs i < j inside one block (None for a block of one)."""
+        if len(positions) < 2:
+            return None
+        codes, uniques = pd.factorize(pd.Series([names[p] for p in positions], dtype=object))
+        a, b, s = sparse_scores(uniques.tolist(), uniques.tolist(), scorer, floor, memory_mb=memory_mb,
+                                workers=workers)
+        # scorer(earlier row, later row) - the order the loops compare in - for both directions
+        pair, i, j = expand_pairs(a, b, codes, positions)
+        keep = i < j
+        return i[keep], j[keep], s[pair[keep]]
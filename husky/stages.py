@@ -0,0 +1,65 @@
+"""Named pipeline stages checkpointed in session state.
+
+A stage's key is a fingerprint of its name, its own inputs (file content
+hashes, sheets, settings) and the keys of the stages it reads from. ``run``
+returns the stored result while that key is unchanged and recomputes it
+otherwise; because downstream keys include upstream keys, a change reruns
+the stage it touches and everything after it, and nothing before it.
+
+Stage results are shared with later runs, so stage functions must return
+new objects and callers must copy before modifying them.
+"""
+
+import time
+
+import pandas as pd
+
+from husky.disk_cache import content_hash, file_bytes, make_key
+
+
+def file_fingerprint(file):
+    """Content hash of an upload (None when the optional upload is empty)."""
+    return content_hash(file_bytes(file)) if file is not None else None
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """Content hash of a frame (values, index and column names)."""
+    rows = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    return make_key(content_hash(rows.tobytes()), [str(c) for c in df.columns])
+
+
+class Stages:
+    def __init__(self, store, version=""):
+        self.store = store  # e.g. st.session_state.setdefault("crm_stages", {})
+        self.version = version
+        self.keys = {}
+        self.computed = []
+        self.reused = []
+        self.seconds = {}
+
+    def key(self, name, inputs=(), after=()):
+        """The key ``run`` gives this stage (e.g. to name its on-disk checkpoint before it runs)."""
+        return make_key("stage", self.version, name, list(inputs), [self.keys[a] for a in after])
+
+    def run(self, name, function, inputs=(), after=()):
+        """Result of ``function()``, recomputed only when ``inputs`` or an ``after`` stage changed."""
+        key = self.key(name, inputs, after)
+        self.keys[name] = key
+        entry = self.store.get(name)
+        if entry is not None and entry["key"] == key:
+            self.reused.append(name)
+            return entry["value"]
+        t0 = time.perf_counter()
+        value = function()
+        self.seconds[name] = time.perf_counter() - t0
+        self.store[name] = {"key": key, "value": value}
+        self.computed.append(name)
+        return value
+
+    def report(self) -> str:
+        parts = []
+        if self.reused:
+            parts.append("♻️ Reused: " + ", ".join(self.reused))
+        if self.computed:
+            parts.append("🔄 Recomputed: " + ", ".join(f"{n} ({self.seconds[n]:.2f}s)" for n in self.computed))
+        return " · ".join(parts)
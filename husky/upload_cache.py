@@ -0,0 +1,103 @@
+"""Parquet cache of uploaded workbook sheets, shared between the tools.
+
+The first tool to read a sheet parses the xlsx and stores the result as
+Parquet, keyed by (file content hash, sheet, header row). Every later read of
+the same sheet — from any tool or session — loads the Parquet file instead,
+optionally reading only the requested columns.
+
+Sheets Parquet cannot represent faithfully (mixed-type object columns,
+unusual column labels) are simply not cached and are parsed as before.
+"""
+
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from husky.disk_cache import DiskCache, content_hash, file_bytes, make_key
+
+MAX_BYTES = int(os.environ.get("HUSKY_UPLOAD_CACHE_MB", "2048")) * 1024 * 1024
+FORMAT_VERSION = 1
+
+# How ``load_sheet`` got the sheet
+FROM_CACHE = "from cache"
+CACHED = "parsed and cached"
+NOT_CACHED = "parsed, not cached"
+
+_cache = DiskCache("uploads", MAX_BYTES, suffix=".parquet")
+
+
+def _sheet_key(data: bytes, sheet_name, header) -> str:
+    return make_key("sheet", FORMAT_VERSION, content_hash(data), sheet_name, header)
+
+
+def _write(df: pd.DataFrame, path):
+    # Parquet needs unique string column names; keep the originals (e.g. int
+    # year columns) in the file metadata and restore them on read.
+    labels = list(df.columns)
+    if not all(isinstance(c, (str, int, float, bool)) for c in labels):
+        raise TypeError("unsupported column labels")
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(df.set_axis([f"c{i}" for i in range(len(labels))], axis=1), preserve_index=False)
+    meta = dict(table.schema.metadata or {})
+    meta[b"husky_columns"] = json.dumps(labels).encode("utf-8")
+    pq.write_table(table.replace_schema_metadata(meta), path)
+
+
+def _read(path, columns=None) -> pd.DataFrame:
+    import pyarrow.parquet as pq
+
+    labels = json.loads(pq.read_schema(path).metadata[b"husky_columns"])
+    wanted = range(len(labels)) if columns is None else [labels.index(c) for c in columns if c in labels]
+    df = pd.read_parquet(path, columns=[f"c{i}" for i in wanted])
+    df = df.set_axis([labels[i] for i in wanted], axis=1)
+    # Parquet nulls come back as None in text columns; read_excel gives NaN
+    for i, dtype in enumerate(df.dtypes):
+        if dtype == object:
+            col = df.iloc[:, i]
+            df.iloc[:, i] = col.where(col.notna(), np.nan)
+    return df
+
+
+def sheet_names(file):
+    return pd.ExcelFile(io.BytesIO(file_bytes(file))).sheet_names
+
+
+def load_sheet(file, sheet_name, header=0, columns=None):
+    """Read one sheet of an uploaded workbook, going through the Parquet cache.
+
+    Returns ``(df, status)``, ``status`` being ``FROM_CACHE``, ``CACHED``
+    or ``NOT_CACHED`` (the sheet cannot be stored as Parquet, or the cache
+    directory is read-only or full). ``columns`` limits the result to those
+    columns (missing names are ignored).
+    """
+    data = file_bytes(file)
+    key = _sheet_key(data, sheet_name, header)
+    path = _cache.get(key)
+    if path is not None:
+        try:
+            return _read(path, columns), FROM_CACHE
+        except Exception:
+            path.unlink(missing_ok=True)
+
+    df = pd.read_excel(io.BytesIO(data), sheet_name=sheet_name, header=header)
+    status = CACHED
+    try:
+        _cache.put(key, lambda tmp: _write(df, tmp))
+    except Exception:
+        status = NOT_CACHED  # serve the parsed frame uncached
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    return df, status
+
+
+def cache_caption(status, sheet_name) -> str:
+    if status == FROM_CACHE:
+        return f"⚡ Sheet **{sheet_name}** loaded from the shared Parquet cache"
+    if status == CACHED:
+        return f"📄 Sheet **{sheet_name}** parsed from Excel and cached for the other tools"
+    return f"📄 Sheet **{sheet_name}** parsed from Excel (not cached: not storable as Parquet or cache unavailable)"
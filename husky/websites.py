@@ -0,0 +1,203 @@
+"""Company website matching for Match_Website.py.
+
+Matching order per target name: exact normalized name, then the best fuzzy
+(``fuzz.ratio``) reference name at or above the threshold, then the closest
+reference sharing the first 4 letters. ``score_targets`` computes the
+threshold-independent candidates once; ``apply_threshold`` picks the website.
+"""
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+from husky.ngram_index import TrigramIndex, measure_recall
+from husky.similarity import sparse_scores
+from husky.text import clean_column, first4prefix, normalize_name
+
+# Brute force gives the original matches; the trigram index is faster but approximate (opt-in)
+FUZZY_MODES = ("brute force", "trigram index")
+
+
+def build_reference_maps(ref_df: pd.DataFrame, col_company: str, col_website: str, engine: str = "python"):
+    ref_df = ref_df.copy()
+    ref_df["_norm"] = clean_column(ref_df[col_company], "website", engine)
+    ref_df["_prefix4"] = clean_column(ref_df[col_company], "prefix4", engine)
+
+    # exact normalized -> website (first non-null)
+    exact_map = {}
+    for _, r in ref_df.iterrows():
+        nm = r["_norm"]
+        web = r[col_website]
+        if nm and pd.notna(web) and nm not in exact_map:
+            exact_map[nm] = str(web)
+
+    # prefix buckets for fallback
+    prefix_map = {}
+    for _, r in ref_df.iterrows():
+        p4 = r["_prefix4"]
+        if not p4:
+            continue
+        web = str(r[col_website]) if pd.notna(r[col_website]) else ""
+        prefix_map.setdefault(p4, []).append((r["_norm"], web))
+
+    # for fuzzy
+    name_list = ref_df["_norm"].tolist()
+    website_by_norm = {}
+    for _, r in ref_df.iterrows():
+        nm = r["_norm"]
+        web = r[col_website]
+        if nm and pd.notna(web) and nm not in website_by_norm:
+            website_by_norm[nm] = str(web)
+
+    return exact_map, prefix_map, name_list, website_by_norm
+
+
+def target_candidates(nm: str, p4: str, exact_map, prefix_map, name_list, website_by_norm,
+                      index: TrigramIndex = None, fuzzy_best: dict = None):
+    """Threshold-independent results of each matching step for one normalized name.
+
+    Returns (exact website, best fuzzy website, its score, first-4-letters
+    website); ``pick_website`` applies the threshold. ``fuzzy_best`` holds
+    precomputed ``extractOne``-style results by name (see ``best_matches``).
+    """
+    if not nm:
+        return None, None, -1.0, None
+
+    # 1) Exact normalized
+    if nm in exact_map:
+        return exact_map[nm], None, -1.0, None
+
+    # 2) Fuzzy (ordered letters): best candidate, cutoff applied later
+    fuzzy_web, fuzzy_score = None, -1.0
+    if index is not None:
+        best = index.extract_one(nm)
+    elif fuzzy_best is not None:
+        best = fuzzy_best.get(nm)
+    else:
+        best = process.extractOne(nm, name_list, scorer=fuzz.ratio)
+    if best:
+        best_name, fuzzy_score, _ = best
+        fuzzy_web = website_by_norm.get(best_name) or None
+
+    # 3) First 4 letters fallback
+    prefix_web = None
+    if p4 and p4 in prefix_map:
+        candidates = prefix_map[p4]  # list of (norm_name, website)
+        # choose best by similarity to break ties
+        best_web, best_score = None, -1
+        for cnorm, web in candidates:
+            score = fuzz.ratio(nm, cnorm)
+            if score > best_score and web:
+                best_web, best_score = web, score
+        prefix_web = best_web or None
+
+    return None, fuzzy_web, fuzzy_score, prefix_web
+
+
+def best_matches(names, name_list, scorer=fuzz.ratio):
+    """``process.extractOne`` result for each of ``names``, scored in bulk (``sparse_scores``, top 1)."""
+    names = list(dict.fromkeys(names))
+    rows, cols, scores = sparse_scores(names, name_list, scorer, top_k=1)
+    return {names[r]: (name_list[c], s, int(c)) for r, c, s in zip(rows.tolist(), cols.tolist(), scores.tolist())}
+
+
+def pick_website(candidates, threshold: int):
+    exact, fuzzy_web, fuzzy_score, prefix_web = candidates
+    if exact is not None:
+        return exact
+    if fuzzy_web and fuzzy_score >= threshold:
+        return fuzzy_web
+    return prefix_web
+
+
+def match_fuzzy_then_prefix(target_name: str, exact_map, prefix_map, name_list, website_by_norm, threshold: int,
+                            nm: str = None, p4: str = None, index: TrigramIndex = None):
+    # nm / p4 may be passed in when the target column was normalized up front;
+    # with an index only its top-k candidates are scored instead of all of name_list
+    if nm is None:
+        nm = normalize_name(target_name)
+    if p4 is None:
+        p4 = first4prefix(target_name)
+    candidates = target_candidates(nm, p4, exact_map, prefix_map, name_list, website_by_norm, index)
+    return pick_website(candidates, threshold)
+
+
+CANDIDATE_COLUMNS = ["exact", "fuzzy_web", "fuzzy_score", "prefix"]
+
+
+def score_targets(target_df: pd.DataFrame,
+                  ref_df: pd.DataFrame,
+                  target_company_col: str,
+                  ref_company_col: str,
+                  ref_website_col: str,
+                  engine: str = "python",
+                  fuzzy_mode: str = "brute force",
+                  top_k: int = 50,
+                  recall_sample: int = 0) -> pd.DataFrame:
+    """Per target row, the candidates of every matching step (see ``target_candidates``).
+
+    Computed once; ``apply_threshold`` then gives the websites for any threshold.
+    """
+    exact_map, prefix_map, name_list, website_by_norm = build_reference_maps(
+        ref_df, ref_company_col, ref_website_col, engine
+    )
+    index = TrigramIndex(name_list, k=top_k) if fuzzy_mode == "trigram index" else None
+
+    norms = clean_column(target_df[target_company_col], "website", engine)
+    prefixes = clean_column(target_df[target_company_col], "prefix4", engine)
+    # brute force: every name reaching the fuzzy step is scored against the references in one bulk pass
+    fuzzy_best = None
+    if index is None:
+        fuzzy_best = best_matches([nm for nm in norms if nm and nm not in exact_map], name_list)
+    # distinct (name, prefix) pairs are scored once
+    lookup = {}
+    for key in zip(norms, prefixes):
+        if key not in lookup:
+            lookup[key] = target_candidates(*key, exact_map, prefix_map, name_list, website_by_norm, index,
+                                            fuzzy_best)
+    scores = pd.DataFrame([lookup[key] for key in zip(norms, prefixes)], columns=CANDIDATE_COLUMNS,
+                          index=target_df.index)
+
+    # recall of the index vs brute force on targets that reach the fuzzy step
+    if index is not None and recall_sample:
+        fuzzy_targets = [nm for nm in norms if nm and nm not in exact_map]
+        scores.attrs["fuzzy_recall"] = measure_recall(index, fuzzy_targets, name_list, sample=recall_sample)
+    return scores
+
+
+def apply_threshold(scores: pd.DataFrame, threshold: int) -> pd.Series:
+    """Website per target: exact, else fuzzy when its score >= threshold, else the prefix fallback."""
+    fuzzy_ok = scores["fuzzy_web"].notna().to_numpy() & (scores["fuzzy_score"].to_numpy() >= threshold)
+    websites = np.where(scores["exact"].notna(), scores["exact"],
+                        np.where(fuzzy_ok, scores["fuzzy_web"], scores["prefix"]))
+    return pd.Series(websites, index=scores.index, dtype=object)
+
+
+def match_counts(scores: pd.DataFrame, threshold: int) -> dict:
+    exact = scores["exact"].notna()
+    fuzzy = ~exact & scores["fuzzy_web"].notna() & (scores["fuzzy_score"] >= threshold)
+    prefix = ~exact & ~fuzzy & scores["prefix"].notna()
+    return {"Exact": int(exact.sum()), "Fuzzy": int(fuzzy.sum()), "First 4 letters": int(prefix.sum()),
+            "No match": int((~exact & ~fuzzy & ~prefix).sum())}
+
+
+def add_company_website(target_df: pd.DataFrame,
+                        ref_df: pd.DataFrame,
+                        target_company_col: str,
+                        ref_company_col: str,
+                        ref_website_col: str,
+                        threshold: int = 70,
+                        engine: str = "python",
+                        fuzzy_mode: str = "brute force",
+                        top_k: int = 50,
+                        recall_sample: int = 0,
+                        scores: pd.DataFrame = None) -> pd.DataFrame:
+    # ``scores`` from an earlier score_targets call skips straight to the threshold
+    if scores is None:
+        scores = score_targets(target_df, ref_df, target_company_col, ref_company_col, ref_website_col,
+                               engine, fuzzy_mode, top_k, recall_sample)
+
+    out = target_df.copy()
+    # insert Company Website right after Company Name
+    out.insert(out.columns.get_loc(target_company_col) + 1, "Company Website", apply_threshold(scores, threshold))
+    return out
@@ -0,0 +1,84 @@
+"""Company x year value matrix built from IMM trade rows.
+
+The CRM classifier needs one row per company with one column per year.
+``year_matrix`` builds that table from the row-level IMM output ('Buyer
+Cleaned Final', 'Buyer Country', 'Year' or 'Date', 'Value') with a single
+groupby on categorical keys and an unstack, instead of a pivot made by hand
+in Excel.
+
+Years outside ``FIRST_YEAR`` .. next year (typos such as 1900 or 2099) are
+dropped and counted rather than widening the table by a column per year.
+"""
+
+import datetime
+import os
+
+import pandas as pd
+
+from husky.dtypes import map_distinct
+
+COMPANY_COLUMN = "Buyer Cleaned Final"
+COUNTRY_COLUMN = "Buyer Country"
+YEAR_COLUMN = "Year"
+DATE_COLUMN = "Date"
+VALUE_COLUMN = "Value"
+TRADE_COLUMNS = [COMPANY_COLUMN, COUNTRY_COLUMN, YEAR_COLUMN, DATE_COLUMN, VALUE_COLUMN]
+REQUIRED_COLUMNS = [COMPANY_COLUMN, VALUE_COLUMN]
+FIRST_YEAR = int(os.environ.get("HUSKY_FIRST_YEAR", "1990"))
+
+
+def _numeric(series: pd.Series) -> pd.Series:
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype(object)
+    return pd.to_numeric(series, errors="coerce")
+
+
+def year_window():
+    """``(first, last)`` plausible transaction year: ``FIRST_YEAR`` .. next year."""
+    return FIRST_YEAR, datetime.date.today().year + 1
+
+
+def transaction_years(trade: pd.DataFrame) -> pd.Series:
+    """'Year' where it is set, otherwise the year of 'Date'."""
+    years = pd.Series(float("nan"), index=trade.index)
+    if YEAR_COLUMN in trade.columns:
+        years = _numeric(trade[YEAR_COLUMN])
+    if DATE_COLUMN in trade.columns:
+        years = years.fillna(pd.to_datetime(trade[DATE_COLUMN], errors="coerce").dt.year)
+    return years
+
+
+def year_matrix(trade: pd.DataFrame) -> pd.DataFrame:
+    """'Company name', 'Country' (when known), one column per year and 'Grand Total'.
+
+    Rows without a company or a year are dropped; missing values count as 0.
+    Every year between the first and the last one gets a column, so a year
+    without shipments still counts in the classifier's per-year thresholds.
+    Rows dated outside ``FIRST_YEAR`` .. next year are dropped too, and their
+    count is kept in ``attrs["implausible_years"]``. Companies are sorted by
+    'Grand Total', largest first.
+    """
+    years = transaction_years(trade)
+    company = map_distinct(trade[COMPANY_COLUMN], lambda name: str(name).strip() if pd.notna(name) else "")
+    implausible = years.notna() & ~years.between(*year_window())
+    keep = (company != "") & years.notna() & ~implausible
+
+    keys = {"Company name": company[keep].astype("category")}
+    if COUNTRY_COLUMN in trade.columns:
+        keys["Country"] = trade.loc[keep, COUNTRY_COLUMN].astype("category")
+    keys["Year"] = years[keep].astype(int)
+    values = _numeric(trade.loc[keep, VALUE_COLUMN]).fillna(0)
+
+    totals = values.groupby([key.rename(name) for name, key in keys.items()], observed=True, dropna=False).sum()
+    if totals.empty:
+        matrix = pd.DataFrame(columns=list(keys)[:-1] + ["Grand Total"])
+        matrix.attrs["implausible_years"] = int(implausible.sum())
+        return matrix
+    matrix = totals.unstack("Year", fill_value=0)
+    matrix = matrix.reindex(columns=range(matrix.columns.min(), matrix.columns.max() + 1)).fillna(0)
+    matrix.columns = list(matrix.columns)
+    matrix["Grand Total"] = matrix.sum(axis=1)
+    matrix = matrix.sort_values("Grand Total", ascending=False, kind="stable").reset_index()
+    matrix = matrix.astype({name: object for name in list(keys)[:-1]})
+    matrix.attrs["implausible_years"] = int(implausible.sum())
+    return matrix